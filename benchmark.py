@@ -0,0 +1,765 @@
+"""
+Performance benchmarks for the data pipeline
+
+Usage:
+    python benchmark.py ingestion --rows 200000 --page-size 1000
+    python benchmark.py indicators --rows 1000000 3000000
+    python benchmark.py parse --pages 200
+    python benchmark.py pipeline --rows 200000 --symbols 4
+    python benchmark.py stages --pages 200
+    python benchmark.py export --rows 100000 500000 1000000
+    python benchmark.py online --updates 100000
+    python benchmark.py storage --rows 100000
+    python benchmark.py prepare --rows 3000000
+    python benchmark.py suite --output results.json
+
+The pipeline and stage benchmarks fetch from a local stand-in for the Binance
+REST API (MockBinanceServer) serving synthetic candles, so they measure this
+code rather than the network. They, and the ingestion benchmark, need a local
+PostgreSQL reachable with the settings from DatabaseConfig; they work in a
+throwaway schema that is dropped afterwards. The export benchmark uses a
+temporary SQLite database and runs every size in a fresh process so peak RSS
+is measured per size. The online benchmark is purely in-process. The storage
+benchmark runs the same write/read round trip, with correctness checks,
+against every KlineStore backend available (PostgreSQL is skipped when it
+cannot be reached). The prepare benchmark times walk-forward dataset preparation
+on a synthetic feature matrix, also in-process.
+
+Every command accepts --output PATH to write its results, together with the
+commit and library versions, as JSON for comparison across commits.
+"""
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+import pandas as pd
+import psycopg2
+from config import DatabaseConfig
+from klineSchema import BRIN_INDEX_SQL, SCHEMA_SQL
+from dataCollection import CryptoDataCollector
+from tfDataExporter import TFDataExporter
+from storage import PostgresStore, SQLiteStore, ParquetStore, KLINE_COLUMNS, KLINE_RECORD
+from onlineFeatures import OnlineFeatureService
+from utils import feature_matrix, sliding_windows
+from datasetPrep import WindowView, range_moments, walk_forward_splits
+from binanceClient import parse_klines, klines_to_dataframe
+from rateLimiter import REQUEST_WEIGHTS
+
+
+BENCH_SCHEMA = 'kline_bench'
+
+
+def synthetic_klines(n, interval_minutes=1, start='2020-01-01', seed=0):
+    """Generate a random-walk kline DataFrame shaped like CryptoDataCollector.get_klines output"""
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, n)) * close
+    volume = rng.gamma(2.0, 5.0, n)
+
+    return pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=n, freq=f'{interval_minutes}min'),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': volume,
+        'quote_volume': volume * close,
+        'trades': rng.integers(100, 5000, n),
+    })
+
+
+def synthetic_kline_payload(n, interval_minutes=1, seed=0):
+    """Build a /klines JSON payload (lists of ints and decimal strings) for n candles"""
+    df = synthetic_klines(n, interval_minutes=interval_minutes, seed=seed)
+    open_times = df['timestamp'].to_numpy(dtype='datetime64[ms]').astype(np.int64).tolist()
+    interval_ms = interval_minutes * 60000
+    return [
+        [t, f"{o:.8f}", f"{h:.8f}", f"{l:.8f}", f"{c:.8f}", f"{v:.8f}", t + interval_ms - 1,
+         f"{q:.8f}", int(n_trades), f"{v / 2:.8f}", f"{q / 2:.8f}", "0"]
+        for t, o, h, l, c, v, q, n_trades in zip(
+            open_times, df['open'], df['high'], df['low'], df['close'], df['volume'],
+            df['quote_volume'], df['trades'])
+    ]
+
+
+def _reset_bench_schema(db_config, drop_only=False):
+    """(Re)create the throwaway schema holding the managed kline_data and last_updates"""
+    conn = psycopg2.connect(**db_config.get_connection_dict())
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        if not drop_only:
+            cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}; SET search_path = {BENCH_SCHEMA}")
+            cursor.execute(SCHEMA_SQL)
+            cursor.execute(BRIN_INDEX_SQL)
+    conn.close()
+
+
+def benchmark_ingestion(rows=200000, page_size=1000):
+    """
+    Compare rows/sec of the multi-row INSERT path against the COPY + upsert path
+
+    Both paths go through CryptoDataCollector.store_page, so every page also
+    advances the last_updates watermark in the same transaction.
+    """
+    db_config = DatabaseConfig()
+    df = synthetic_klines(rows)
+    pages = [df.iloc[i:i + page_size] for i in range(0, rows, page_size)]
+
+    results = {}
+    for method in ('insert', 'copy'):
+        _reset_bench_schema(db_config)
+        collector = CryptoDataCollector()
+        collector.db_config.DB_SCHEMA = BENCH_SCHEMA
+
+        start = time.perf_counter()
+        for page in pages:
+            collector.store_page(page, 'BENCHUSDT', '1m', method=method)
+        elapsed = time.perf_counter() - start
+        collector.close()
+
+        results[method] = rows / elapsed
+        print(f"{method:>6}: {rows} rows in {elapsed:.2f}s -> {results[method]:,.0f} rows/sec")
+
+    _reset_bench_schema(db_config, drop_only=True)
+    print(f"COPY speedup: {results['copy'] / results['insert']:.1f}x")
+    return results
+
+
+def _measure(func, *args):
+    """Run func and return (wall seconds, peak traced bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def benchmark_indicators(sizes=(1000000, 3000000)):
+    """Compare wall time and peak memory of the 'ta' and 'numpy' indicator backends"""
+    results = {}
+    for rows in sizes:
+        df = synthetic_klines(rows).set_index('timestamp')
+        for backend in ('ta', 'numpy'):
+            exporter = TFDataExporter(indicator_backend=backend)
+            elapsed, peak = _measure(exporter.add_technical_indicators, df)
+            results[f"{backend}_{rows}"] = {'seconds': elapsed, 'peak_mb': peak / 2**20}
+            print(f"{backend:>6} {rows:>9} rows: {elapsed:.2f}s, peak {peak / 2**20:,.0f} MB")
+    return results
+
+
+def _legacy_parse_klines(payload):
+    """The DataFrame-of-strings parsing get_klines used before parse_klines"""
+    columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
+              'close_time', 'quote_volume', 'trades', 'taker_buy_base',
+              'taker_buy_quote', 'ignore']
+    df = pd.DataFrame(payload, columns=columns)
+    numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'quote_volume']
+    df[numeric_columns] = df[numeric_columns].astype(float)
+    df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
+    df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
+    return df
+
+
+def benchmark_parse(pages=200, page_size=1000):
+    """Per-page parse time and peak allocations of the legacy and typed kline parsers"""
+    payload = synthetic_kline_payload(page_size)
+    parsers = {
+        'legacy': _legacy_parse_klines,
+        'typed': lambda p: klines_to_dataframe(parse_klines(p)),
+    }
+
+    results = {}
+    for name, parser in parsers.items():
+        parser(payload)  # warm up
+        start = time.perf_counter()
+        for _ in range(pages):
+            parser(payload)
+        per_page = (time.perf_counter() - start) / pages
+        _, peak = _measure(parser, payload)
+        results[name] = {'ms_per_page': per_page * 1000, 'peak_kb': peak / 1024}
+        print(f"{name:>6}: {per_page * 1000:.2f} ms/page, peak {peak / 1024:,.0f} KB per {page_size}-candle page")
+    return results
+
+
+
+class _MockBinanceHandler(BaseHTTPRequestHandler):
+    """Serves /klines, /trades, /aggTrades and /ticker/24hr from pre-encoded synthetic data"""
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, body):
+        headers = {'Content-Type': 'application/json', 'X-MBX-USED-WEIGHT-1M': '0'}
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        data = self.server.data
+
+        if url.path.endswith('/klines'):
+            rows = data['klines']
+            limit = min(int(params.get('limit', 500)), 1000)
+            if 'startTime' in params:
+                first = max(0, math.ceil((int(params['startTime']) - data['start_ms']) / data['step_ms']))
+            else:
+                first = max(0, len(rows) - limit)
+            last = min(len(rows), first + limit)
+            if 'endTime' in params:
+                last = min(last, (int(params['endTime']) - data['start_ms']) // data['step_ms'] + 1)
+            self._send_json(b'[' + b','.join(rows[first:max(first, last)]) + b']')
+        elif url.path.endswith('/aggTrades'):
+            # One aggregate trade per candle, id = candle index, half a step after its open
+            rows = data['agg_trades']
+            limit = min(int(params.get('limit', 500)), 1000)
+            if 'fromId' in params:
+                first = int(params['fromId'])
+            elif 'startTime' in params:
+                first = max(0, math.ceil((int(params['startTime']) - data['start_ms'] - data['step_ms'] // 2)
+                                         / data['step_ms']))
+            else:
+                first = max(0, len(rows) - limit)
+            last = min(len(rows), first + limit)
+            if 'endTime' in params:
+                last = min(last, (int(params['endTime']) - data['start_ms'] - data['step_ms'] // 2)
+                           // data['step_ms'] + 1)
+            self._send_json(b'[' + b','.join(rows[max(0, first):max(first, last)]) + b']')
+        elif url.path.endswith('/trades'):
+            limit = min(int(params.get('limit', 500)), 1000)
+            self._send_json(b'[' + b','.join(data['trades'][:limit]) + b']')
+        elif url.path.endswith('/ticker/24hr'):
+            # One symbol gives an object; a symbols=[...] list or no parameter (whole market) a list
+            if 'symbol' in params:
+                self._send_json(json.dumps({**data['ticker'], 'symbol': params['symbol']}).encode())
+            else:
+                symbols = json.loads(params['symbols']) if 'symbols' in params else data['market_symbols']
+                self._send_json(json.dumps([{**data['ticker'], 'symbol': symbol} for symbol in symbols],
+                                           separators=(',', ':')).encode())
+        else:
+            self.send_error(404)
+
+
+def _serve_mock(rows, interval_minutes, start, port_queue):
+    """Process target: build the synthetic responses, then serve them forever"""
+    # A forked child inherits CryptoDataCollector's shutdown handlers; terminate() must stop it
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    start_ms = int(pd.Timestamp(start).value // 10**6)
+    payload = synthetic_kline_payload(rows, interval_minutes=interval_minutes)
+    last = payload[-1]
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _MockBinanceHandler)
+    server.daemon_threads = True
+    server.data = {
+        'start_ms': start_ms,
+        'step_ms': interval_minutes * 60000,
+        'klines': [json.dumps(row, separators=(',', ':')).encode() for row in payload],
+        'trades': [
+            json.dumps({'id': i, 'price': last[4], 'qty': '0.01000000', 'quoteQty': '300.00000000',
+                        'time': last[0] + i, 'isBuyerMaker': bool(i % 2), 'isBestMatch': True},
+                       separators=(',', ':')).encode()
+            for i in range(1000)
+        ],
+        'agg_trades': [
+            json.dumps({'a': i, 'p': row[4], 'q': row[5], 'f': 3 * i, 'l': 3 * i + 2,
+                        'T': start_ms + i * interval_minutes * 60000 + interval_minutes * 30000,
+                        'm': bool(i % 2), 'M': True}, separators=(',', ':')).encode()
+            for i, row in enumerate(payload)
+        ],
+        'ticker': {'symbol': 'BENCHUSDT', 'lastPrice': last[4], 'openPrice': last[1], 'highPrice': last[2],
+                   'lowPrice': last[3], 'weightedAvgPrice': last[4], 'priceChangePercent': '0.000',
+                   'bidPrice': last[4], 'askPrice': last[4], 'volume': last[5], 'quoteVolume': last[7],
+                   'count': last[8], 'openTime': last[0] - 86400000 + 1, 'closeTime': last[6]},
+        'market_symbols': [f"BENCH{i:04d}USDT" for i in range(2000)],
+    }
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockBinanceServer:
+    """
+    Local stand-in for the Binance REST API, run in a separate process
+
+    Every symbol gets the same `rows` synthetic candles starting at `start`;
+    /klines honours startTime, endTime and limit, so CryptoDataCollector
+    backfills it exactly as it would the real API. Running in its own process
+    keeps the server's CPU time out of the measurements.
+
+    Usage:
+        with MockBinanceServer(rows=100000) as server:
+            collector = CryptoDataCollector(base_url=server.base_url)
+    """
+
+    def __init__(self, rows, interval_minutes=1, start='2020-01-01'):
+        self.rows = rows
+        self.interval_minutes = interval_minutes
+        self.start = start
+        self.base_url = None
+        self._process = None
+
+    def __enter__(self):
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve_mock, args=(self.rows, self.interval_minutes, self.start, port_queue), daemon=True)
+        self._process.start()
+        self.base_url = f"http://127.0.0.1:{port_queue.get(timeout=120)}/api/v3"
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+
+def _bench_collector(base_url):
+    """CryptoDataCollector pointed at the mock server and the throwaway schema, rate limit lifted"""
+    collector = CryptoDataCollector(weight_limit=10**9, base_url=base_url)
+    collector.db_config.DB_SCHEMA = BENCH_SCHEMA
+    return collector
+
+
+def benchmark_pipeline(rows=200000, symbols=4, workers=4):
+    """
+    End-to-end backfill throughput: fetch, parse, store and watermark for several symbols
+
+    Runs CryptoDataCollector.collect_many against the mock server, with `rows`
+    candles in total split evenly over `symbols` 1m symbols.
+    """
+    db_config = DatabaseConfig()
+    per_symbol = rows // symbols
+    jobs = [(f"BENCH{i}USDT", '1m', '2020-01-01') for i in range(symbols)]
+
+    with MockBinanceServer(per_symbol) as server:
+        _reset_bench_schema(db_config)
+        collector = _bench_collector(server.base_url)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # one progress line per page otherwise
+            collector.collect_many(jobs, max_workers=workers)
+        elapsed = time.perf_counter() - start
+
+        with collector._transaction() as cursor:
+            cursor.execute("SELECT count(*) FROM kline_data")
+            stored = cursor.fetchone()[0]
+        collector.close()
+    _reset_bench_schema(db_config, drop_only=True)
+
+    result = {'rows': stored, 'symbols': symbols, 'workers': workers,
+              'seconds': elapsed, 'rows_per_sec': stored / elapsed}
+    print(f"pipeline: {stored} rows for {symbols} symbols with {workers} workers in {elapsed:.2f}s "
+          f"-> {result['rows_per_sec']:,.0f} rows/sec")
+    return result
+
+
+def benchmark_stages(pages=200, page_size=1000):
+    """
+    Per-page latency of each backfill stage, run one after the other
+
+    The stages mirror collect_data/store_page, split so each can be timed:
+    fetch (HTTP round trip), parse (JSON decode and parse_klines), store
+    (COPY and merge into kline_data) and watermark (last_updates upsert and
+    commit).
+    """
+    db_config = DatabaseConfig()
+    timings = {stage: [] for stage in ('fetch', 'parse', 'store', 'watermark')}
+
+    with MockBinanceServer(pages * page_size) as server:
+        _reset_bench_schema(db_config)
+        collector = _bench_collector(server.base_url)
+        start_time = int(pd.Timestamp('2020-01-01').value // 10**6)
+
+        for _ in range(pages):
+            params = {'symbol': 'BENCHUSDT', 'interval': '1m', 'startTime': start_time, 'limit': page_size}
+            t0 = time.perf_counter()
+            response = collector.client.get('klines', params, REQUEST_WEIGHTS['klines'])
+            t1 = time.perf_counter()
+            df = klines_to_dataframe(parse_klines(response.json()))
+            t2 = time.perf_counter()
+            collector.store.prepare_range(df['timestamp'].iloc[0], df['timestamp'].iloc[-1])
+            with collector._transaction() as cursor:
+                cursor.execute(collector.store.copy_klines_sql(cursor, df, 'BENCHUSDT', '1m'))
+                t3 = time.perf_counter()
+                cursor.execute(collector.store.last_time_sql(cursor, 'BENCHUSDT', '1m', df['timestamp'].iloc[-1],
+                                                             monotonic=True))
+            t4 = time.perf_counter()
+
+            for stage, seconds in zip(timings, (t1 - t0, t2 - t1, t3 - t2, t4 - t3)):
+                timings[stage].append(seconds * 1000)
+            start_time = int(df['timestamp'].iloc[-1].value // 10**6) + 60000
+        collector.close()
+    _reset_bench_schema(db_config, drop_only=True)
+
+    results = {}
+    for stage, ms in timings.items():
+        results[stage] = {'mean_ms': float(np.mean(ms)), 'p50_ms': float(np.percentile(ms, 50)),
+                          'p95_ms': float(np.percentile(ms, 95))}
+        print(f"{stage:>9}: mean {results[stage]['mean_ms']:.2f} ms, p50 {results[stage]['p50_ms']:.2f} ms, "
+              f"p95 {results[stage]['p95_ms']:.2f} ms per {page_size}-candle page")
+    return results
+
+
+def benchmark_online(updates=100000, sequence_length=60):
+    """
+    Per-candle latency of OnlineFeatureService against recomputing from history
+
+    Times update() and window() for every candle of a synthetic series, then
+    the batch path a live loop would otherwise run per candle
+    (add_technical_indicators and create_sequences over the same candles),
+    and checks the final online window against the batch feature rows.
+    """
+    df = synthetic_klines(updates)
+    columns = [df[col].to_numpy() for col in ('timestamp', 'open', 'high', 'low', 'close',
+                                              'volume', 'quote_volume', 'trades')]
+    service = OnlineFeatureService(sequence_length=sequence_length)
+    update_us, window_us = [], []
+    for timestamp, *values in zip(*columns):
+        values = [float(v) for v in values]
+        t0 = time.perf_counter_ns()
+        service.update('BENCHUSDT', '1m', timestamp, *values)
+        t1 = time.perf_counter_ns()
+        service.window('BENCHUSDT', '1m')
+        t2 = time.perf_counter_ns()
+        update_us.append((t1 - t0) / 1000)
+        window_us.append((t2 - t1) / 1000)
+
+    exporter = TFDataExporter(indicator_backend='numpy')
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        features = exporter.add_technical_indicators(df.set_index('timestamp'))
+        exporter.create_sequences(features, sequence_length=sequence_length, dtype=np.float32)
+    batch_seconds = time.perf_counter() - start
+    # create_sequences leaves out the newest row (it has no target), so compare with the feature rows
+    newest = feature_matrix(features, dtype=np.float32)[-sequence_length:]
+    matches = bool(np.allclose(service.window('BENCHUSDT', '1m'), newest, rtol=1e-4))
+
+    results = {}
+    for name, us in (('update', update_us), ('window', window_us)):
+        results[name] = {'mean_us': float(np.mean(us)), 'p50_us': float(np.percentile(us, 50)),
+                         'p99_us': float(np.percentile(us, 99))}
+        print(f"{name:>7}: mean {results[name]['mean_us']:.1f} us, p50 {results[name]['p50_us']:.1f} us, "
+              f"p99 {results[name]['p99_us']:.1f} us per candle")
+    results['batch_recompute_seconds'] = batch_seconds
+    results['window_matches_batch'] = matches
+    print(f"  batch: {batch_seconds:.2f}s to recompute {updates} candles; last windows match: {matches}")
+    return results
+
+
+def benchmark_prepare(rows=3000000, features=33, sequence_length=60, n_folds=5, batch_size=256):
+    """
+    Cost of walk-forward dataset preparation next to one plain pass over the base matrix
+
+    Times the statistics pass of every fold together (range_moments), one
+    full-matrix copy for scale, and gathering normalised against raw
+    batches, so the overhead of lazy normalisation per batch is visible.
+    """
+    rng = np.random.default_rng(0)
+    matrix = np.cumsum(rng.standard_normal((rows, features), dtype=np.float32), axis=0) + 1000
+    windows, targets = sliding_windows(matrix, sequence_length, target_idx=3)
+
+    start = time.perf_counter()
+    folds = walk_forward_splits(len(windows), sequence_length, n_folds)
+    moments = range_moments(matrix, [(fold['train'].start, fold['train'].stop + sequence_length) for fold in folds])
+    views = [WindowView(windows[fold['train']], targets[fold['train']], 3, 'zscore', mean, std)
+             for fold, (mean, std) in zip(folds, moments)]
+    prepare_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matrix.copy()
+    copy_seconds = time.perf_counter() - start
+
+    results = {'rows': rows, 'windows': len(windows), 'prepare_seconds': prepare_seconds,
+               'matrix_copy_seconds': copy_seconds}
+    train = views[-1]
+    raw = WindowView(train.windows, train.targets, 3)
+    for name, view in (('raw', raw), ('zscore', train)):
+        start = time.perf_counter()
+        batches = 0
+        for _ in view.iter_batches(batch_size, shuffle=True, seed=0):
+            batches += 1
+            if batches == 2000:
+                break
+        results[f"{name}_batches_per_sec"] = batches / (time.perf_counter() - start)
+
+    print(f"prepare: {n_folds} folds over {len(windows):,} windows in {prepare_seconds:.2f}s "
+          f"(one matrix copy: {copy_seconds:.2f}s)")
+    print(f"batches: raw {results['raw_batches_per_sec']:,.0f}/s, "
+          f"zscore {results['zscore_batches_per_sec']:,.0f}/s of {batch_size} windows")
+    return results
+
+
+def _check_store(store, df, page_size):
+    """
+    Backend-independent checks of a KlineStore, run on an empty store
+
+    Pages are written newest first and one is written twice, so upserts must
+    not duplicate rows and the watermark must never move backwards. Returns
+    write and read rows/sec.
+    """
+    pages = [df.iloc[i:i + page_size].reset_index(drop=True) for i in range(0, len(df), page_size)]
+    last = df['timestamp'].iloc[-1]
+
+    assert not store.has_klines('BENCHUSDT', '1m'), "store is not empty"
+    store.prepare_range(df['timestamp'].iloc[0], last)
+    start = time.perf_counter()
+    for page in reversed(pages):
+        store.write_page(page, 'BENCHUSDT', '1m')
+    write_seconds = time.perf_counter() - start
+    store.write_page(pages[len(pages) // 2], 'BENCHUSDT', '1m')
+
+    assert store.last_timestamp('BENCHUSDT', '1m') == last, "watermark moved backwards"
+    assert store.kline_version('BENCHUSDT', '1m')[1] == len(df), "duplicate or missing rows"
+
+    start = time.perf_counter()
+    chunks = store.iter_chunks('BENCHUSDT', '1m', KLINE_RECORD, chunk_rows=page_size * 10, count=True)
+    n = next(chunks)
+    rows = np.concatenate(list(chunks))
+    read_seconds = time.perf_counter() - start
+    assert n == len(rows) == len(df), "count does not match the rows read"
+    assert (rows['timestamp'] == df['timestamp'].to_numpy().astype('datetime64[ms]')).all(), "rows out of order"
+    for name in KLINE_COLUMNS[1:]:
+        assert np.array_equal(rows[name], df[name].to_numpy()), f"{name} did not round-trip"
+
+    lo, hi = df['timestamp'].iloc[len(df) // 3], df['timestamp'].iloc[2 * len(df) // 3]
+    window = np.concatenate(list(store.iter_chunks('BENCHUSDT', '1m', KLINE_RECORD, lo, hi)))
+    assert len(window) == 2 * len(df) // 3 - len(df) // 3, "[start, end) range read the wrong rows"
+
+    store.set_last_timestamp('BENCHUSDT', '1m', lo)
+    assert store.last_timestamp('BENCHUSDT', '1m') == lo, "watermark was not overwritten"
+    assert not store.has_klines('OTHERUSDT', '1m') and store.last_timestamp('OTHERUSDT', '1m') is None
+    return {'write_rows_per_sec': len(df) / write_seconds, 'read_rows_per_sec': len(df) / read_seconds}
+
+
+def benchmark_storage(rows=100000, page_size=1000):
+    """
+    Write/read throughput of every KlineStore backend, checked for identical results
+
+    SQLite and Parquet stores live in a temporary directory, PostgreSQL in
+    the throwaway schema. Any backend that does not round-trip the data
+    exactly raises AssertionError.
+    """
+    df = synthetic_klines(rows)
+    results = {}
+    db_config = DatabaseConfig()
+    db_config.DB_SCHEMA = BENCH_SCHEMA
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {'sqlite': lambda: SQLiteStore(os.path.join(tmp, 'bench.db')),
+                  'parquet': lambda: ParquetStore(os.path.join(tmp, 'parquet')),
+                  'postgresql': lambda: PostgresStore(db_config)}
+        for name, make_store in stores.items():
+            try:
+                if name == 'postgresql':
+                    _reset_bench_schema(db_config)
+                store = make_store()
+            except (ImportError, psycopg2.OperationalError) as e:
+                print(f"{name:>10}: skipped ({type(e).__name__}: {str(e).strip()})")
+                continue
+            try:
+                results[name] = _check_store(store, df, page_size)
+            finally:
+                store.close()
+            print(f"{name:>10}: write {results[name]['write_rows_per_sec']:>11,.0f} rows/sec, "
+                  f"read {results[name]['read_rows_per_sec']:>11,.0f} rows/sec, round trip OK")
+        if 'postgresql' in results:
+            _reset_bench_schema(db_config, drop_only=True)
+    return results
+
+
+def _peak_rss_mb():
+    """
+    Peak resident set size of this process in MB
+
+    VmHWM is read on Linux because ru_maxrss survives exec() and would report
+    the parent's peak for a freshly spawned worker.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _export_worker(database_path, symbol, sequence_length, backend, dtype=None):
+    """Run export_to_numpy once in this process and report wall time and peak RSS as JSON"""
+    exporter = TFDataExporter(database_path=database_path, indicator_backend=backend, dtype=dtype)
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = exporter.export_to_numpy(symbol, '1m', sequence_length=sequence_length)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': elapsed, 'baseline_rss_mb': baseline, 'peak_rss_mb': _peak_rss_mb(),
+                      'windows': len(X), 'features': X.shape[2]}))
+
+
+def benchmark_export(sizes=(100000, 500000, 1000000), sequence_length=60, backend='numpy', dtype=None):
+    """
+    export_to_numpy wall time and peak RSS for several dataset sizes
+
+    Each size is stored under its own symbol in a temporary SQLite database
+    and exported in a fresh interpreter, so one size's peak cannot hide
+    another's. dtype is passed to TFDataExporter as its dtype policy.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, 'bench.db')
+        store = SQLiteStore(database_path)
+        for rows in sizes:
+            store.write_page(synthetic_klines(rows), f"BENCH{rows}", '1m')
+
+        for rows in sizes:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), 'export-worker', '--database', database_path,
+                 '--symbol', f"BENCH{rows}", '--sequence-length', str(sequence_length), '--backend', backend]
+                + (['--dtype', dtype] if dtype else []),
+                capture_output=True, text=True, check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results[str(rows)] = result
+            print(f"export {rows:>9} rows: {result['seconds']:.2f}s, peak RSS {result['peak_rss_mb']:,.0f} MB "
+                  f"(baseline {result['baseline_rss_mb']:,.0f} MB), {result['windows']} windows")
+    return results
+
+
+def run_metadata():
+    """Commit, time and library versions recorded next to every result"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def write_results(path, benchmark, results, args):
+    """Write results as JSON, with the arguments used and run metadata"""
+    parameters = {key: value for key, value in vars(args).items() if key not in ('benchmark', 'output')}
+    with open(path, 'w') as f:
+        json.dump({'benchmark': benchmark, 'parameters': parameters, 'meta': run_metadata(),
+                   'results': results}, f, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pipeline performance benchmarks')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--output', help='Write the results to this JSON file')
+
+    ingestion = subparsers.add_parser('ingestion', parents=[common], help='kline_data ingestion rows/sec')
+    ingestion.add_argument('--rows', type=int, default=200000)
+    ingestion.add_argument('--page-size', type=int, default=1000)
+
+    indicators = subparsers.add_parser('indicators', parents=[common], help='ta vs numpy indicator backends')
+    indicators.add_argument('--rows', type=int, nargs='+', default=[1000000, 3000000])
+
+    parse = subparsers.add_parser('parse', parents=[common], help='kline payload parsing time and allocations')
+    parse.add_argument('--pages', type=int, default=200)
+
+    pipeline = subparsers.add_parser('pipeline', parents=[common], help='end-to-end backfill rows/sec')
+    pipeline.add_argument('--rows', type=int, default=200000)
+    pipeline.add_argument('--symbols', type=int, default=4)
+    pipeline.add_argument('--workers', type=int, default=4)
+
+    stages = subparsers.add_parser('stages', parents=[common], help='per-stage backfill latency')
+    stages.add_argument('--pages', type=int, default=200)
+
+    export = subparsers.add_parser('export', parents=[common], help='export_to_numpy wall time and peak RSS')
+    export.add_argument('--rows', type=int, nargs='+', default=[100000, 500000, 1000000])
+    export.add_argument('--sequence-length', type=int, default=60)
+    export.add_argument('--backend', choices=['ta', 'numpy'], default='numpy')
+    export.add_argument('--dtype', choices=['float32', 'float64'], help='TFDataExporter dtype policy')
+
+    online = subparsers.add_parser('online', parents=[common], help='online feature update latency')
+    online.add_argument('--updates', type=int, default=100000)
+    online.add_argument('--sequence-length', type=int, default=60)
+
+    storage = subparsers.add_parser('storage', parents=[common], help='KlineStore backends round trip and rows/sec')
+    storage.add_argument('--rows', type=int, default=100000)
+    storage.add_argument('--page-size', type=int, default=1000)
+
+    prepare = subparsers.add_parser('prepare', parents=[common], help='walk-forward dataset preparation cost')
+    prepare.add_argument('--rows', type=int, default=3000000)
+    prepare.add_argument('--sequence-length', type=int, default=60)
+
+    subparsers.add_parser('suite', parents=[common], help='pipeline, stages, parse, export and online with defaults')
+
+    worker = subparsers.add_parser('export-worker', help='(internal) one export_to_numpy run for export')
+    worker.add_argument('--database', required=True)
+    worker.add_argument('--symbol', required=True)
+    worker.add_argument('--sequence-length', type=int, default=60)
+    worker.add_argument('--backend', default='numpy')
+    worker.add_argument('--dtype')
+
+    args = parser.parse_args()
+
+    if args.benchmark == 'ingestion':
+        results = benchmark_ingestion(rows=args.rows, page_size=args.page_size)
+    elif args.benchmark == 'indicators':
+        results = benchmark_indicators(sizes=args.rows)
+    elif args.benchmark == 'parse':
+        results = benchmark_parse(pages=args.pages)
+    elif args.benchmark == 'pipeline':
+        results = benchmark_pipeline(rows=args.rows, symbols=args.symbols, workers=args.workers)
+    elif args.benchmark == 'stages':
+        results = benchmark_stages(pages=args.pages)
+    elif args.benchmark == 'export':
+        results = benchmark_export(sizes=args.rows, sequence_length=args.sequence_length, backend=args.backend,
+                                   dtype=args.dtype)
+    elif args.benchmark == 'online':
+        results = benchmark_online(updates=args.updates, sequence_length=args.sequence_length)
+    elif args.benchmark == 'storage':
+        results = benchmark_storage(rows=args.rows, page_size=args.page_size)
+    elif args.benchmark == 'prepare':
+        results = benchmark_prepare(rows=args.rows, sequence_length=args.sequence_length)
+    elif args.benchmark == 'suite':
+        results = {
+            'pipeline': benchmark_pipeline(),
+            'stages': benchmark_stages(),
+            'parse': benchmark_parse(),
+            'export': benchmark_export(),
+            'online': benchmark_online(),
+        }
+    else:
+        _export_worker(args.database, args.symbol, args.sequence_length, args.backend, args.dtype)
+        sys.exit()
+
+    if args.output:
+        write_results(args.output, args.benchmark, results, args)
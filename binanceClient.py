@@ -0,0 +1,216 @@
+import logging
+import random
+import time
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from rateLimiter import WeightRateLimiter
+import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limited, IP banned (temporarily) and server errors
+RETRY_STATUS = {418, 429, 500, 502, 503, 504}
+
+# Positions of the value columns in a /klines row
+KLINE_FLOAT_FIELDS = {
+    'open': 1, 'high': 2, 'low': 3, 'close': 4, 'volume': 5,
+    'quote_volume': 7, 'taker_buy_base': 9, 'taker_buy_quote': 10,
+}
+
+
+def parse_klines(payload):
+    """
+    Parse a /klines JSON payload into typed NumPy columns in one pass
+
+    The rows are transposed once with zip(); every value column is then built
+    directly from its tuple of decimal strings, with no intermediate DataFrame
+    or per-column casting.
+
+    Returns:
+        dict of column name -> array: timestamp and close_time as int64 ms,
+        prices and volumes as float64, trades as int64
+    """
+    if not payload:
+        columns = {'timestamp': np.empty(0, dtype=np.int64), 'close_time': np.empty(0, dtype=np.int64),
+                   'trades': np.empty(0, dtype=np.int64)}
+        columns.update({name: np.empty(0) for name in KLINE_FLOAT_FIELDS})
+        return columns
+
+    fields = list(zip(*payload))
+    columns = {
+        'timestamp': np.array(fields[0], dtype=np.int64),
+        'close_time': np.array(fields[6], dtype=np.int64),
+        'trades': np.array(fields[8], dtype=np.int64),
+    }
+    for name, index in KLINE_FLOAT_FIELDS.items():
+        columns[name] = np.array(fields[index], dtype=np.float64)
+    return columns
+
+
+def klines_to_dataframe(columns):
+    """
+    Wrap parsed kline columns in the DataFrame layout returned by get_klines
+
+    The arrays are adopted as-is (timestamps are reinterpreted, not converted)
+    so building the frame does not copy the page again.
+    """
+    return pd.DataFrame({
+        'timestamp': columns['timestamp'].view('datetime64[ms]'),
+        'open': columns['open'],
+        'high': columns['high'],
+        'low': columns['low'],
+        'close': columns['close'],
+        'volume': columns['volume'],
+        'close_time': columns['close_time'].view('datetime64[ms]'),
+        'quote_volume': columns['quote_volume'],
+        'trades': columns['trades'],
+        'taker_buy_base': columns['taker_buy_base'],
+        'taker_buy_quote': columns['taker_buy_quote'],
+    }, copy=False)
+
+
+# /aggTrades keys -> typed column name and dtype, in storage order
+AGG_TRADE_FIELDS = {
+    'a': ('agg_id', np.int64),
+    'p': ('price', np.float64),
+    'q': ('qty', np.float64),
+    'f': ('first_trade_id', np.int64),
+    'l': ('last_trade_id', np.int64),
+    'T': ('time', np.int64),
+    'm': ('is_buyer_maker', np.bool_),
+}
+
+
+def parse_agg_trades(payload):
+    """
+    Parse an /aggTrades JSON payload into typed NumPy columns
+
+    Returns:
+        dict of column name -> array: ids and time (ms) as int64, price and
+        qty as float64, is_buyer_maker as bool
+    """
+    return {
+        name: np.array([trade[key] for trade in payload], dtype=dtype)
+        for key, (name, dtype) in AGG_TRADE_FIELDS.items()
+    }
+
+
+# /ticker/24hr keys -> typed column name and dtype, in storage order
+TICKER_FIELDS = {
+    'symbol': ('symbol', object),
+    'lastPrice': ('last_price', np.float64),
+    'openPrice': ('open_price', np.float64),
+    'highPrice': ('high_price', np.float64),
+    'lowPrice': ('low_price', np.float64),
+    'weightedAvgPrice': ('weighted_avg_price', np.float64),
+    'priceChangePercent': ('price_change_percent', np.float64),
+    'bidPrice': ('bid_price', np.float64),
+    'askPrice': ('ask_price', np.float64),
+    'volume': ('volume', np.float64),
+    'quoteVolume': ('quote_volume', np.float64),
+    'count': ('trades', np.int64),
+    'openTime': ('open_time', np.int64),
+    'closeTime': ('close_time', np.int64),
+}
+
+
+def parse_tickers(payload):
+    """
+    Parse a /ticker/24hr payload (one object or a list of them) into typed NumPy columns
+
+    Returns:
+        dict of column name -> array: symbol as object, prices and volumes
+        as float64, trade count and open/close times (ms) as int64
+    """
+    if isinstance(payload, dict):
+        payload = [payload]
+    return {
+        name: np.array([ticker[key] for ticker in payload], dtype=dtype)
+        for key, (name, dtype) in TICKER_FIELDS.items()
+    }
+
+
+class BinanceClient:
+    """
+    Shared HTTP client for the Binance REST API
+
+    One requests.Session with a pooled adapter keeps connections alive across
+    threads, responses are requested gzip-compressed, and every request goes
+    through the weight-based rate limiter. 429/418 and 5xx responses are
+    retried with exponential backoff that honours Retry-After; rate-limit
+    responses also pause the limiter so every other thread backs off too.
+    """
+
+    def __init__(self, base_url="https://api.binance.com/api/v3", rate_limiter=None,
+                 pool_size=32, max_retries=5, backoff=0.5, max_backoff=60, timeout=10):
+        self.base_url = base_url
+        self.rate_limiter = rate_limiter or WeightRateLimiter()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    def _retry_delay(self, attempt, response=None):
+        """Seconds to wait before the next attempt"""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * (0.5 + random.random() / 2)  # jitter so threads don't retry in lockstep
+
+    def get(self, path, params=None, weight=1):
+        """
+        GET `path` (relative to base_url) once the rate limiter grants its weight
+
+        Raises requests.exceptions.RequestException once the retries are exhausted.
+        """
+        url = f"{self.base_url}/{path}"
+        params = params or {}
+        labels = {'endpoint': path, 'symbol': params.get('symbol', ''), 'interval': params.get('interval', '')}
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(weight)
+            metrics.REQUEST_WEIGHT.inc(weight, endpoint=path)
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, status='error', **labels)
+                if attempt == self.max_retries:
+                    raise
+                metrics.HTTP_RETRIES.inc(endpoint=path, reason=type(e).__name__)
+                time.sleep(self._retry_delay(attempt))
+                continue
+
+            metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, status=response.status_code, **labels)
+            self.rate_limiter.update_from_headers(response.headers)
+            used = response.headers.get('X-MBX-USED-WEIGHT-1M') or response.headers.get('X-MBX-USED-WEIGHT')
+            if used is not None:
+                metrics.USED_WEIGHT.set(int(used))
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                delay = self._retry_delay(attempt, response)
+                metrics.HTTP_RETRIES.inc(endpoint=path, reason=response.status_code)
+                metrics.log_event(logger, logging.WARNING, 'request_retry', endpoint=path, status=response.status_code,
+                                  attempt=attempt + 1, delay_seconds=round(delay, 3))
+                if response.status_code in (418, 429):
+                    self.rate_limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
@@ -12,15 +12,24 @@ class DatabaseConfig:
         self.DB_PASSWORD = os.getenv('DB_PASSWORD')
         self.DB_HOST = os.getenv('DB_HOST', 'localhost')  # default to localhost
         self.DB_PORT = os.getenv('DB_PORT', '5432')      # default to 5432
+        self.DB_SCHEMA = os.getenv('DB_SCHEMA')          # optional search_path override
+        self.DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+        self.DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '10'))
 
     def get_connection_string(self):
         return f"postgresql://{self.DB_USER}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
     def get_connection_dict(self):
-        return {
+        params = {
             'dbname': self.DB_NAME,
             'user': self.DB_USER,
             'password': self.DB_PASSWORD,
             'host': self.DB_HOST,
             'port': self.DB_PORT
-        }
\ No newline at end of file
+        }
+        # Timestamps are stored as timestamptz and exchanged as naive UTC
+        options = ['-c timezone=UTC']
+        if self.DB_SCHEMA:
+            options.append(f"-c search_path={self.DB_SCHEMA}")
+        params['options'] = ' '.join(options)
+        return params
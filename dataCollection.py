@@ -1,23 +1,42 @@
 import pandas as pd
 import time
 from datetime import datetime, timedelta
-import sqlite3
-from pathlib import Path
 import signal
 import requests
-import os
+import json
 from utils import interval_to_minutes
 from config import DatabaseConfig
-import psycopg2
-from psycopg2.extras import execute_values
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from rateLimiter import WeightRateLimiter, REQUEST_WEIGHTS, ticker_24hr_weight
+from binanceClient import BinanceClient, parse_klines, klines_to_dataframe, parse_tickers
+from klineAggregator import KlineAggregator, BASE_INTERVAL, bucket_start
+from storage import PostgresStore
+import logging
+import metrics
 
 
 
 
+logger = logging.getLogger(__name__)
+
 class CryptoDataCollector:
-    def __init__(self):
-        self.base_url = "https://api.binance.com/api/v3"
+    def __init__(self, weight_limit=6000, base_url="https://api.binance.com/api/v3", derived_intervals=(),
+                 store=None):
         self.db_config = DatabaseConfig()
+        # Where pages and watermarks are written (storage.KlineStore); PostgreSQL by default
+        self.store = store if store is not None else PostgresStore(self.db_config)
+        # Coarser intervals rebuilt from every stored 1m page instead of being fetched
+        self.derived_intervals = list(derived_intervals)
+        if self.derived_intervals and not isinstance(self.store, PostgresStore):
+            raise ValueError("Derived intervals are built in SQL and need the PostgreSQL store")
+        self.aggregator = KlineAggregator(self)
+        # Owns kline_data/last_updates and creates monthly partitions before writes (PostgreSQL only)
+        self.schema = getattr(self.store, 'schema', None)
+        # Callbacks run with (df, symbol, interval) after every committed page
+        self._page_listeners = []
+        # Shared by every collection thread so concurrent jobs stay inside the weight budget
+        self.rate_limiter = WeightRateLimiter(weight_limit=weight_limit)
+        self.client = BinanceClient(base_url, rate_limiter=self.rate_limiter)
         
         self.is_running = True
         signal.signal(signal.SIGINT, self._handle_shutdown)
@@ -28,74 +47,51 @@ class CryptoDataCollector:
         print("\nShutdown signal received. Cleaning up...")
         self.is_running = False
 
-    def get_connection_dict(self):
-        return {
-            'dbname': self.DB_NAME,
-            'user': self.DB_USER,
-            'password': self.DB_PASSWORD,
-            'host': self.DB_HOST,
-            'port': self.DB_PORT
-        }
-    
     def stop_collecting(self):
         """Method to manually stop collection"""
         self.is_running = False
         print("Stopping data collection...")
         
 
+    def _transaction(self, symbol='', interval=''):
+        """
+        Run the enclosed statements in one transaction of the store's pooled connections
+
+        Commits on success, rolls back and re-raises on error. Only SQL
+        backends support it; see KlineStore.transaction. symbol and interval
+        label the commit latency of writes made for one pair.
+        """
+        return self.store.transaction(symbol=symbol, interval=interval)
+
+    def close(self):
+        """Close every pooled database and HTTP connection"""
+        self.client.close()
+        self.store.close()
+
+    def _record_error(self, stage, error, symbol='', interval='', **fields):
+        """Count an error by stage and pair and log it as a structured event"""
+        metrics.ERRORS.inc(stage=stage, symbol=symbol, interval=interval)
+        metrics.log_event(logger, logging.ERROR, f"{stage}_error", symbol=symbol, interval=interval,
+                                  error=f"{type(error).__name__}: {error}", **fields)
+
     def get_last_update_time(self, symbol, interval):
         """Get the timestamp of the last stored data point"""
         try:
-            conn = psycopg2.connect(**self.db_config.get_connection_dict())
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT last_timestamp 
-                FROM last_updates 
-                WHERE symbol = %s AND interval = %s
-            ''', (symbol, interval))
-            
-            result = cursor.fetchone()
-            conn.close()
-            if result:
-                return pd.to_datetime(result[0])
-            else:
-                return None
+            # Stores return naive UTC; the collector works in naive UTC throughout
+            return self.store.last_timestamp(symbol, interval)
         except Exception as e:
-            print(f"Error getting last update time: {e}")
+            self._record_error('watermark_read', e, symbol, interval)
             return None
 
-
     def update_last_time(self, symbol, interval, timestamp):
         """Update the last stored timestamp"""
         try:
-            conn = psycopg2.connect(**self.db_config.get_connection_dict())
-            cursor = conn.cursor()
-            
-            # Convert timestamp to string if it's a datetime object
-            if isinstance(timestamp, pd.Timestamp):
-                timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            
-            cursor.execute('''
-                INSERT INTO 
-                    last_updates (symbol, interval, last_timestamp)
-                VALUES 
-                    (%s, %s, %s)
-                ON CONFLICT 
-                    (symbol, interval)
-                DO UPDATE SET 
-                    last_timestamp = excluded.last_timestamp;
-                
-            ''', (symbol, interval, timestamp))
-            
-            conn.commit()
-            conn.close()
-            
+            self.store.set_last_timestamp(symbol, interval, timestamp)
         except Exception as e:
-            print(f"Error updating last time: {e}")
+            self._record_error('watermark_write', e, symbol, interval)
 
 
-    def get_klines(self, symbol, interval, start_time=None, limit=1000):
+    def get_klines(self, symbol, interval, start_time=None, limit=1000, end_time=None):
         """
         Fetch kline/candlestick data for a specific trading pair
         
@@ -104,9 +100,8 @@ class CryptoDataCollector:
         - interval: str, candle interval (1m, 3m, 5m, 15m, 30m, 1h, 2h, 4h, 6h, 8h, 12h, 1d, 3d, 1w, 1M)
         - start_time: int, timestamp in milliseconds (optional)
         - limit: int, number of records to fetch (max 1000)
+        - end_time: int, timestamp in milliseconds of the last candle to include (optional)
         """
-        endpoint = f"{self.base_url}/klines"
-        
         params = {
             'symbol': symbol.upper(),
             'interval': interval,
@@ -115,30 +110,19 @@ class CryptoDataCollector:
         
         if start_time:
             params['startTime'] = start_time
+        if end_time:
+            params['endTime'] = end_time
             
         try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
-            
-            # Convert the response to a DataFrame
-            columns = ['timestamp', 'open', 'high', 'low', 'close', 'volume',
-                      'close_time', 'quote_volume', 'trades', 'taker_buy_base',
-                      'taker_buy_quote', 'ignore']
-            
-            df = pd.DataFrame(response.json(), columns=columns)
-            
-            # Convert numeric columns
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume', 'quote_volume']
-            df[numeric_columns] = df[numeric_columns].astype(float)
-            
-            # Convert timestamps to datetime
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df['close_time'] = pd.to_datetime(df['close_time'], unit='ms')
+            response = self.client.get('klines', params, REQUEST_WEIGHTS['klines'])
             
+            # Parse straight into typed columns, then wrap them in a DataFrame
+            df = klines_to_dataframe(parse_klines(response.json()))
+            metrics.ROWS_PARSED.inc(len(df), symbol=params['symbol'], interval=interval)
             return df
             
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching data: {e}")
+            self._record_error('fetch', e, params['symbol'], interval)
             return None
             
     def get_recent_trades(self, symbol, limit=1000):
@@ -149,16 +133,13 @@ class CryptoDataCollector:
         - symbol: str, trading pair (e.g., 'BTCUSDT')
         - limit: int, number of records to fetch (max 1000)
         """
-        endpoint = f"{self.base_url}/trades"
-        
         params = {
             'symbol': symbol.upper(),
             'limit': limit
         }
         
         try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
+            response = self.client.get('trades', params, REQUEST_WEIGHTS['trades'])
             
             df = pd.DataFrame(response.json())
             
@@ -172,7 +153,7 @@ class CryptoDataCollector:
             return df
             
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching trades: {e}")
+            self._record_error('fetch_trades', e, params['symbol'])
             return None
 
     def get_24h_ticker(self, symbol):
@@ -182,103 +163,163 @@ class CryptoDataCollector:
         Parameters:
         - symbol: str, trading pair (e.g., 'BTCUSDT')
         """
-        endpoint = f"{self.base_url}/ticker/24hr"
-        
         params = {
             'symbol': symbol.upper()
         }
         
         try:
-            response = requests.get(endpoint, params=params)
-            response.raise_for_status()
+            response = self.client.get('ticker/24hr', params, REQUEST_WEIGHTS['ticker/24hr'])
             return response.json()
             
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching 24h ticker: {e}")
+            self._record_error('fetch_ticker', e, params['symbol'])
             return None
 
-    def store_kline_data(self, df, symbol, interval):
-        """Store new kline data in the database"""
-        if df is None or df.empty:
-            return
+    def get_24h_tickers(self, symbols=None):
+        """
+        Fetch 24-hour statistics for many symbols in a single request
+        
+        Parameters:
+        - symbols: list of str, trading pairs; None fetches every symbol on the exchange
+        
+        Returns:
+            dict of typed columns (see parse_tickers), or None if the request failed
+        """
+        params = {}
+        if symbols is not None:
+            params['symbols'] = json.dumps([symbol.upper() for symbol in symbols], separators=(',', ':'))
         
         try:
-            conn = psycopg2.connect(**self.db_config.get_connection_dict())
-            cursor = conn.cursor()
-
-            # Create copy and select needed columns first
-            df_to_store = df[['timestamp', 'open', 'high', 'low', 'close', 'volume', 
-                            'quote_volume', 'trades']].copy()
-            
-            # Then convert timestamp to string
-            df_to_store['timestamp'] = df_to_store['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
-
-            # More aggressive type conversion
-            df_to_store = df_to_store.apply(lambda x: x.astype(object) if x.name != 'timestamp' else x)
-            
-            # Convert the DataFrame to a list of tuples with explicit type conversion
-            rows = []
-            for _, row in df_to_store.iterrows():
-                row_data = (
-                    str(row['timestamp']),
-                    float(row['open']),
-                    float(row['high']),
-                    float(row['low']),
-                    float(row['close']),
-                    int(row['volume']),
-                    float(row['quote_volume']),
-                    int(row['trades'])
-                )
-                rows.append(row_data)
+            weight = ticker_24hr_weight(None if symbols is None else len(symbols))
+            response = self.client.get('ticker/24hr', params, weight)
+            return parse_tickers(response.json())
             
-            
-            # Add symbol and interval columns
-            df_to_store['symbol'] = symbol
-            df_to_store['interval'] = interval
-
-            records = df_to_store.to_records(index=False)
-            data = list(records)
+        except requests.exceptions.RequestException as e:
+            self._record_error('fetch_ticker', e)
+            return None
 
-            # Insert the data
-            insert_query = f"INSERT INTO kline_data ({','.join(df_to_store.columns)}) VALUES %s"
-            execute_values(cursor, insert_query, data, page_size=1000)
+    def store_kline_data(self, df, symbol, interval, method='copy'):
+        """
+        Store new kline data in the database
 
-            conn.commit()
-            conn.close()
+        Parameters:
+        - df: DataFrame returned by get_klines
+        - symbol: str, trading pair (e.g., 'BTCUSDT')
+        - interval: str, kline interval (e.g., '1h')
+        - method: str, 'copy' for COPY + upsert, 'insert' for the plain multi-row INSERT
+        """
+        if df is None or df.empty:
+            return
+        
+        try:
+            self.store.prepare_range(df['timestamp'].iloc[0], df['timestamp'].iloc[-1])
+            self.store.write_page(df, symbol, interval, watermark=False, method=method)
+            metrics.ROWS_INSERTED.inc(len(df), symbol=symbol, interval=interval)
         except Exception as e:
-            print(f"Error storing data: {e}")
+            self._record_error('store', e, symbol, interval)
 
-    def collect_data(self, symbol, interval, start_date=None, sleep_time=10):
+    def store_page(self, df, symbol, interval, method='copy'):
         """
-        Continuously collect data for a symbol/interval pair
+        Store a page of klines and advance the last_updates watermark atomically
         
+        The rows and the watermark are written inside a single transaction (on
+        the SQL stores), so a crash can never leave the watermark out of sync
+        with kline_data. Errors
+        are raised so the caller can retry the page. For 1m pages, the candles
+        of every derived interval the page touches are rebuilt in the same
+        transaction.
+
         Parameters:
+        - df: DataFrame returned by get_klines
         - symbol: str, trading pair (e.g., 'BTCUSDT')
         - interval: str, kline interval (e.g., '1h')
-        - start_date: datetime object or string 'YYYY-MM-DD'
-        - sleep_time: int, seconds to wait between requests
+        - method: str, 'copy' for COPY + upsert, 'insert' for the plain multi-row INSERT
+          (PostgreSQL; other stores use their own bulk path)
         """
-        print(f"Starting data collection for {symbol} ({interval})")
-        print("Press Ctrl+C to stop collecting...")
+        if df is None or df.empty:
+            return
+
+        first_timestamp = df['timestamp'].iloc[0]
+        last_timestamp = df['timestamp'].iloc[-1]
+        derive = interval == BASE_INTERVAL and self.derived_intervals
+        if derive:
+            # Derived candles open at their bucket start, possibly in an earlier month
+            first_timestamp = min([first_timestamp] + [bucket_start(first_timestamp, derived)
+                                                       for derived in self.derived_intervals])
+        self.store.prepare_range(first_timestamp, last_timestamp)
+        options = {'method': method}
+        if derive:
+            options['extra_sql'] = lambda cursor: self.aggregator.page_sql(cursor, df, symbol, self.derived_intervals)
+        with metrics.STORE_SECONDS.time(symbol=symbol, interval=interval) as timer:
+            self.store.write_page(df, symbol, interval, **options)
+
+        # Lag is measured from the close of the newest candle (timestamps are naive UTC)
+        candle_close = pd.Timestamp(last_timestamp).value / 1e9 + interval_to_minutes(interval) * 60
+        metrics.ROWS_INSERTED.inc(len(df), symbol=symbol, interval=interval)
+        metrics.LAG_SECONDS.observe(candle_close, symbol=symbol, interval=interval)
+        metrics.log_event(logger, logging.INFO, 'page_stored', symbol=symbol, interval=interval, rows=len(df),
+                                  last_timestamp=str(last_timestamp), store_seconds=round(timer.elapsed, 4),
+                                  lag_seconds=round(metrics.LAG_SECONDS.value(symbol=symbol, interval=interval), 1))
+
+        for listener in self._page_listeners:
+            try:
+                listener(df, symbol, interval)
+            except Exception as e:
+                self._record_error('page_listener', e, symbol, interval)
+
+    def add_page_listener(self, callback):
+        """
+        Call callback(df, symbol, interval) after every page store_page commits
+
+        Used to feed in-process consumers such as OnlineFeatureService.
+        Listener errors are recorded and never fail the page.
+        """
+        self._page_listeners.append(callback)
 
+    def _resolve_start_time(self, symbol, interval, start_date=None):
+        """
+        Work out the first candle to request for a symbol/interval pair
+
+        Returns the start time in milliseconds, or None if start_date is invalid
+        """
         last_update = self.get_last_update_time(symbol, interval)
         if start_date and not last_update:
             try:
                 start_time = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
-                print(f"Starting from date: {start_date}")
+                print(f"Starting {symbol} ({interval}) from date: {start_date}")
             except ValueError as e:
                 print(f"Invalid date format. Please use 'YYYY-MM-DD'. Error: {e}")
-                return
+                return None
         elif last_update:
             # Continue from last update if it exists
             interval_ms = interval_to_minutes(interval) * 60 * 1000
             start_time = int(last_update.timestamp() * 1000) + interval_ms
-            print(f"Continuing from last update: {last_update}")
+            print(f"Continuing {symbol} ({interval}) from last update: {last_update}")
         else:
             # Default to current time minus 1000 intervals if no start date or last update
             interval_minutes = interval_to_minutes(interval)
             start_time = int((datetime.now() - timedelta(minutes=interval_minutes * 1000)).timestamp() * 1000)
-            print(f"Starting from {interval_minutes * 1000} minutes ago")
+            print(f"Starting {symbol} ({interval}) from {interval_minutes * 1000} minutes ago")
+        return start_time
+
+    def collect_data(self, symbol, interval, start_date=None, sleep_time=10):
+        """
+        Continuously collect data for a symbol/interval pair
+        
+        Pages are requested back to back; pacing comes from the shared
+        weight-based rate limiter rather than a fixed sleep.
+
+        Parameters:
+        - symbol: str, trading pair (e.g., 'BTCUSDT')
+        - interval: str, kline interval (e.g., '1h')
+        - start_date: datetime object or string 'YYYY-MM-DD'
+        - sleep_time: int, seconds to back off after an error
+        """
+        print(f"Starting data collection for {symbol} ({interval})")
+
+        start_time = self._resolve_start_time(symbol, interval, start_date)
+        if start_time is None:
+            return
         
         while self.is_running:
             try:
@@ -286,26 +327,50 @@ class CryptoDataCollector:
                 new_data = self.get_klines(symbol, interval, start_time=start_time)
                 
                 if new_data is not None and not new_data.empty:
-                    # Store the new data
-                    self.store_kline_data(new_data, symbol, interval)
-                    print(f"{datetime.now()}: Collected {len(new_data) if new_data is not None else 0} new records for {symbol}")
-                    self.update_last_time(symbol, interval, new_data['timestamp'].iloc[-1])
+                    # Store the new data together with its watermark
+                    self.store_page(new_data, symbol, interval)
+                    print(f"{datetime.now()}: Collected {len(new_data) if new_data is not None else 0} new records for {symbol} ({interval})")
 
                     interval_minutes = interval_to_minutes(interval)
                     start_time = int((new_data['timestamp'].iloc[-1] + timedelta(minutes=interval_minutes)).timestamp() * 1000)
                 else:
-                    print("No new data available")
+                    print(f"No new data available for {symbol} ({interval})")
                     break
                 
-                
-                # Sleep to respect rate limits
-                time.sleep(sleep_time)
-                
             except Exception as e:
-                print(f"Error collecting data: {e}")
+                self._record_error('collect', e, symbol, interval)
                 if self.is_running:  # Only sleep if we're not shutting down
                     time.sleep(sleep_time)
         
-        print("Data collection stopped gracefully")
-    
-    
\ No newline at end of file
+        print(f"Data collection stopped gracefully for {symbol} ({interval})")
+
+    def collect_many(self, jobs, max_workers=8, sleep_time=10):
+        """
+        Backfill several symbol/interval pairs concurrently
+        
+        Each job runs `collect_data` in its own worker thread. All workers share
+        this collector's rate limiter, so the combined request rate follows the
+        Binance weight budget no matter how many jobs are running.
+
+        Parameters:
+        - jobs: iterable of (symbol, interval, start_date) tuples
+        - max_workers: int, maximum number of jobs fetched at the same time
+        - sleep_time: int, seconds a job backs off after an error
+        """
+        jobs = list(jobs)
+        print(f"Starting concurrent collection of {len(jobs)} jobs with {max_workers} workers")
+        print("Press Ctrl+C to stop collecting...")
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.collect_data, symbol, interval, start_date, sleep_time): (symbol, interval)
+                for symbol, interval, start_date in jobs
+            }
+            for future in as_completed(futures):
+                symbol, interval = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    self._record_error('job', e, symbol, interval)
+
+        print("All collection jobs finished")
@@ -0,0 +1,209 @@
+import operator
+import numpy as np
+
+
+# Rows read per block by the statistics pass
+MOMENT_ROWS = 1 << 16
+
+# Feature columns on the price scale, rescaled to the window's last close in 'relative' mode
+PRICE_LEVEL_COLUMNS = [
+    'open', 'high', 'low', 'close', 'sma_7', 'sma_21', 'sma_50', 'ema_12', 'ema_26',
+    'bb_high', 'bb_mid', 'bb_low',
+]
+
+NORMALIZATIONS = (None, 'zscore', 'relative')
+
+
+def walk_forward_splits(n_windows, sequence_length, n_folds=5, val_windows=None, test_windows=None,
+                        train_windows=None):
+    """
+    Walk-forward train/validation/test ranges of window indices
+
+    Every fold is laid out as train | gap | val | gap | test, in time order,
+    and each fold moves forward by test_windows, so the folds' test ranges
+    tile the end of the data. The gaps are sequence_length windows wide: a
+    window reads sequence_length rows and targets the next one, so without
+    them the first validation (or test) windows would contain rows the last
+    training windows were trained to predict.
+
+    Args:
+        n_windows: Number of windows (rows - sequence_length)
+        sequence_length: Length of the windows, and of the gaps
+        n_folds: Number of folds
+        val_windows, test_windows: Size of every validation and test range.
+            Both default to (n_windows - 2 * sequence_length) // (n_folds + 4),
+            which leaves the first fold about three ranges of training data
+        train_windows: Size of a rolling training range; None trains every
+            fold on all windows before it (expanding)
+
+    Returns:
+        List of {'train': slice, 'val': slice, 'test': slice}, oldest fold first
+    """
+    block = (n_windows - 2 * sequence_length) // (n_folds + 4)
+    val_windows = val_windows if val_windows is not None else block
+    test_windows = test_windows if test_windows is not None else block
+    if val_windows <= 0 or test_windows <= 0:
+        raise ValueError(f"{n_windows} windows are too few for {n_folds} walk-forward folds")
+
+    folds = []
+    for fold in range(n_folds):
+        test_stop = n_windows - (n_folds - 1 - fold) * test_windows
+        test_start = test_stop - test_windows
+        val_stop = test_start - sequence_length
+        val_start = val_stop - val_windows
+        train_stop = val_start - sequence_length
+        train_start = 0 if train_windows is None else max(train_stop - train_windows, 0)
+        if train_stop <= train_start:
+            raise ValueError(f"{n_windows} windows leave no training data for fold {fold}")
+        folds.append({'train': slice(train_start, train_stop), 'val': slice(val_start, val_stop),
+                      'test': slice(test_start, test_stop)})
+    return folds
+
+
+def range_moments(matrix, ranges, chunk_rows=MOMENT_ROWS):
+    """
+    Column means and standard deviations of several row ranges in one streaming pass
+
+    The matrix is read once, a block of rows at a time, up to the end of the
+    last range. Running sums of the rows and their squares (in float64, taken
+    around the first row to avoid cancellation) are snapshotted at every
+    range boundary, so the moments of each [start, stop) are differences of
+    two snapshots; any number of overlapping ranges costs a single pass.
+
+    Args:
+        matrix: 2D array (rows x features)
+        ranges: Iterable of (start, stop) row ranges
+
+    Returns:
+        List of (mean, std) float64 arrays, one per range. Constant columns
+        get a std of 1 so they normalise to 0 instead of nan.
+    """
+    ranges = list(ranges)
+    points = sorted({point for bounds in ranges for point in bounds})
+    reference = matrix[0].astype(np.float64)
+    s1 = np.zeros(matrix.shape[1])
+    s2 = np.zeros(matrix.shape[1])
+    sums = {}
+
+    def accumulate(rows):
+        s1[:] += rows.sum(axis=0)
+        s2[:] += np.einsum('ij,ij->j', rows, rows)
+
+    next_point = 0
+    for start in range(0, points[-1], chunk_rows):
+        stop = min(start + chunk_rows, points[-1])
+        block = matrix[start:stop].astype(np.float64) - reference
+        cut = start
+        while next_point < len(points) and points[next_point] <= stop:
+            accumulate(block[cut - start:points[next_point] - start])
+            cut = points[next_point]
+            sums[cut] = (s1.copy(), s2.copy())
+            next_point += 1
+        accumulate(block[cut - start:])
+    for point in points[next_point:]:
+        sums[point] = (s1.copy(), s2.copy())  # only 0 when the last range is empty
+
+    moments = []
+    for start, stop in ranges:
+        n = max(stop - start, 1)
+        d1 = (sums[stop][0] - sums[start][0]) / n
+        d2 = (sums[stop][1] - sums[start][1]) / n
+        std = np.sqrt(np.maximum(d2 - d1 * d1, 0))
+        std[std == 0] = 1
+        moments.append((reference + d1, std))
+    return moments
+
+
+class WindowView:
+    """
+    Normalised, batch-gathered access to a range of windows
+
+    Holds views of the windows and targets (see utils.sliding_windows) and
+    normalises only what is gathered: indexing with an integer, a slice or
+    an index array copies those windows out of the base matrix and scales
+    the copy, so a view over millions of windows costs nothing until it is
+    read.
+
+    Normalisations:
+        None: raw values
+        'zscore': every column standardised with the (mean, std) of the
+            fold's training rows; the target uses the close column's
+        'relative': price-level columns (relative_idx) become their ratio
+            to the window's last close minus 1, the target the next close
+            relative to it; the other columns are z-scored as above
+    """
+
+    def __init__(self, windows, targets, target_idx, normalization=None, mean=None, std=None,
+                 relative_idx=()):
+        if normalization not in NORMALIZATIONS:
+            raise ValueError(f"Unknown normalization: {normalization}")
+        self.windows = windows
+        self.targets = targets
+        self.target_idx = target_idx
+        self.normalization = normalization
+        self.mean = mean
+        self.std = std
+        self.relative_idx = np.asarray(relative_idx, dtype=np.intp)
+        if normalization is not None:
+            # Cast once so gathered float32 batches stay float32
+            self._mean = mean.astype(windows.dtype)
+            self._scale = (1 / std).astype(windows.dtype)
+            if normalization == 'relative':
+                # Price-level columns are rescaled instead of standardised
+                self._mean[self.relative_idx] = 0
+                self._scale[self.relative_idx] = 1
+
+    def __len__(self):
+        return len(self.windows)
+
+    @property
+    def shape(self):
+        return self.windows.shape
+
+    def __getitem__(self, idx):
+        """
+        (X, y) of the windows selected by a slice or an index array, normalised
+
+        An integer index gives one (sequence_length, features) window and a
+        scalar target.
+        """
+        if not isinstance(idx, slice) and np.ndim(idx) == 0:
+            X, y = self[np.array([operator.index(idx)])]
+            return X[0], y[0]
+
+        X = self.windows[idx]
+        if isinstance(idx, slice):
+            X = X.copy()  # basic slicing returns a view of the read-only window view
+        y = self.targets[idx].copy()
+        if self.normalization is None:
+            return X, y
+
+        if self.normalization == 'relative':
+            anchor = X[:, -1, self.target_idx].copy()
+            X[:, :, self.relative_idx] /= anchor[:, None, None]
+            X[:, :, self.relative_idx] -= 1
+            y /= anchor
+            y -= 1
+        else:
+            y -= self._mean[self.target_idx]
+            y *= self._scale[self.target_idx]
+        X -= self._mean
+        X *= self._scale
+        return X, y
+
+    def denormalize_targets(self, y, idx):
+        """Map normalised targets (e.g. predictions) of the windows at idx back to prices"""
+        y = np.asarray(y, dtype=np.float64)
+        if self.normalization == 'zscore':
+            return y * self.std[self.target_idx] + self.mean[self.target_idx]
+        if self.normalization == 'relative':
+            return (y + 1) * self.windows[idx, -1, self.target_idx]
+        return y
+
+    def iter_batches(self, batch_size=256, shuffle=True, seed=None):
+        """Yield normalised (X, y) mini-batches, in random order with shuffle"""
+        rng = np.random.default_rng(seed)
+        order = rng.permutation(len(self)) if shuffle else np.arange(len(self))
+        for start in range(0, len(order), batch_size):
+            # Sorted indices keep the gather reading the base matrix front to back
+            yield self[np.sort(order[start:start + batch_size])]
@@ -0,0 +1,40 @@
+"""
+Build a sharded training corpus for many symbol/interval pairs in parallel
+
+Usage:
+    python exportCorpus.py --symbol BTCUSDT ETHUSDT --interval 1h 4h --output corpus/
+    python exportCorpus.py --symbol BTCUSDT --interval 1m --format tfrecord --workers 8
+"""
+import argparse
+from tfDataExporter import TFDataExporter, CORPUS_FORMATS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export a sharded multi-pair training corpus')
+    parser.add_argument('--symbol', nargs='+', required=True, help='Trading pair symbol(s)')
+    parser.add_argument('--interval', nargs='+', default=['1h'], help='Trading interval(s)')
+    parser.add_argument('--output', default='corpus', help='Directory for the shards and manifest.json')
+    parser.add_argument('--format', choices=list(CORPUS_FORMATS), default='npz', help='Shard file format')
+    parser.add_argument('--database', default='crypto_data.db', help='Kline store to export from: SQLite file, postgresql or a Parquet directory')
+    parser.add_argument('--backend', choices=['ta', 'numpy'], default='numpy', help='Indicator backend')
+    parser.add_argument('--cache-dir', help='Parquet kline cache directory')
+    parser.add_argument('--feature-cache-dir', help='Reuse feature frames cached here by earlier runs')
+    parser.add_argument('--dtype', choices=['float32', 'float64'], default='float32', help='Feature dtype')
+    parser.add_argument('--sequence-length', type=int, default=60)
+    parser.add_argument('--rows-per-shard', type=int, default=100000)
+    parser.add_argument('--no-indicators', action='store_true', help='Export only the raw kline columns')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: number of CPUs)')
+    args = parser.parse_args()
+
+    exporter = TFDataExporter(args.database, indicator_backend=args.backend, cache_dir=args.cache_dir,
+                              dtype=args.dtype, feature_cache_dir=args.feature_cache_dir)
+    pairs = [(symbol, interval) for symbol in args.symbol for interval in args.interval]
+    exporter.export_corpus(
+        pairs,
+        args.output,
+        file_format=args.format,
+        rows_per_shard=args.rows_per_shard,
+        sequence_length=args.sequence_length,
+        add_indicators=not args.no_indicators,
+        max_workers=args.workers,
+    )
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for the disk tier
+    pa = pq = None
+
+
+def frame_bytes(df):
+    """Bytes held by a DataFrame's columns and index"""
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+class FeatureCache:
+    """
+    Two-tier cache of computed feature frames
+
+    Frames are kept in memory in least-recently-used order until their total
+    size exceeds max_bytes, then the oldest are dropped. With disk_dir set,
+    every frame is also written there as Parquet, so frames evicted from
+    memory, or computed by an earlier process, are read back instead of
+    recomputed. Keys must identify the data and the computation (the caller
+    includes the newest stored timestamp), so entries never go stale; old
+    versions are simply no longer asked for.
+    """
+
+    def __init__(self, max_bytes=256 * 2**20, disk_dir=None):
+        """
+        Args:
+            max_bytes: Memory budget; 0 keeps nothing in memory
+            disk_dir: Optional directory of the Parquet tier (needs pyarrow)
+        """
+        if disk_dir is not None and pa is None:
+            raise ImportError("pyarrow is required for the on-disk feature cache (pip install pyarrow)")
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir is not None else None
+        self._frames = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.disk_dir / f"{digest}.parquet"
+
+    def _remember(self, key, df):
+        """Insert into the memory tier and evict down to the budget (lock held)"""
+        size = frame_bytes(df)
+        if size > self.max_bytes:
+            return
+        if key in self._frames:
+            self._bytes -= frame_bytes(self._frames.pop(key))
+        self._frames[key] = df
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self._bytes -= frame_bytes(evicted)
+
+    def get(self, key):
+        """Cached frame for key, or None"""
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key]
+
+        if self.disk_dir is not None:
+            path = self._path(key)
+            if path.exists():
+                df = pq.read_table(path).to_pandas()
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, df)
+                return df
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, df):
+        """Store a frame in memory (budget permitting) and on disk"""
+        with self._lock:
+            self._remember(key, df)
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(key)
+            tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=True), tmp_path)
+            os.replace(tmp_path, path)
+
+    def clear(self):
+        """Drop the memory tier (the disk tier is left in place)"""
+        with self._lock:
+            self._frames.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self):
+        """Bytes currently held in memory"""
+        return self._bytes
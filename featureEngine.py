@@ -0,0 +1,483 @@
+import json
+import math
+from collections import deque
+from psycopg2.extras import execute_values
+from indicators import FEATURE_COLUMNS
+from storage import PostgresStore, open_store
+
+
+NAN = float('nan')
+
+
+def _div(a, b):
+    """Divide like numpy: x/0 gives +-inf and 0/0 gives nan instead of raising"""
+    if b == 0:
+        if a == 0 or a != a:
+            return NAN
+        return math.copysign(math.inf, a)
+    return a / b
+
+
+class _RollingWindow:
+    """
+    Mean and population std of the last `window` values, updated in O(1)
+
+    Running sums of the values and their squares add the new value and
+    subtract the one leaving the window. They are taken around a reference
+    value (the newest value at the last resync) to avoid cancellation, and
+    recomputed exactly every `window` updates, so rounding errors cannot pile
+    up; the resync costs O(window) once per window, O(1) per update.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.shift = 0.0
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self.updates = 0
+
+    def append(self, value):
+        if not self.values:
+            self.shift = value
+        elif len(self.values) == self.window:
+            leaving = self.values[0] - self.shift
+            self.s1 -= leaving
+            self.s2 -= leaving * leaving
+        self.values.append(value)
+        d = value - self.shift
+        self.s1 += d
+        self.s2 += d * d
+        self.updates += 1
+        if self.updates >= self.window:
+            self._resync()
+
+    def _resync(self):
+        self.shift = self.values[-1]
+        deviations = [v - self.shift for v in self.values]
+        self.s1 = sum(deviations)
+        self.s2 = sum(d * d for d in deviations)
+        self.updates = 0
+
+    def mean(self):
+        """Mean of the window, nan until `window` values have been seen"""
+        if len(self.values) < self.window:
+            return NAN
+        return self.shift + self.s1 / self.window
+
+    def std(self):
+        """Population std of the window, nan until `window` values have been seen"""
+        if len(self.values) < self.window:
+            return NAN
+        d1 = self.s1 / self.window
+        return math.sqrt(max(self.s2 / self.window - d1 * d1, 0.0))
+
+
+def _ema(previous, value, span):
+    """One step of an adjust=False exponential moving average"""
+    if previous is None:
+        return value
+    return previous + (value - previous) * 2 / (span + 1)
+
+
+class IndicatorState:
+    """
+    Running state of every indicator computed by TFDataExporter.add_technical_indicators
+
+    Each call to update() consumes one candle in O(1) and returns that candle's
+    indicator values, following the same conventions as the `ta` library
+    (adjust=False EMAs, Wilder smoothing for RSI/ATR, population std for the
+    Bollinger Bands). The state round-trips through to_dict()/from_dict() so it
+    can be persisted between collector runs.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.prev_close = None
+        # Consecutive equal closes up to the current candle (20 or more: flat Bollinger window)
+        self.flat_run = 0
+        # Rolling-window buffers; closes and volumes are also summed per window
+        self.closes = deque(maxlen=50)
+        self.close_windows = {window: _RollingWindow(window) for window in (7, 20, 21, 50)}
+        self.volumes = _RollingWindow(20)
+        self.highs = deque(maxlen=14)
+        self.lows = deque(maxlen=14)
+        self.stoch_ks = deque(maxlen=3)
+        self.true_ranges = []  # only kept until the ATR is seeded
+        # Recursive accumulators
+        self.ema_12 = None
+        self.ema_26 = None
+        self.macd_signal = None
+        self.macd_count = 0
+        self.avg_up = 0.0
+        self.avg_down = 0.0
+        self.atr = 0.0
+        self.obv = 0.0
+
+    def update(self, high, low, close, volume):
+        """
+        Consume one candle and return its indicator values
+
+        Returns:
+            List of values in INDICATOR_COLUMNS order (nan while warming up)
+        """
+        n = self.count
+        prev_close = self.prev_close
+        self._append_close(close)
+        self.volumes.append(volume)
+        self.highs.append(high)
+        self.lows.append(low)
+
+        # Moving averages
+        sma_7 = self.close_windows[7].mean()
+        sma_21 = self.close_windows[21].mean()
+        sma_50 = self.close_windows[50].mean()
+        self.ema_12 = _ema(self.ema_12, close, 12)
+        self.ema_26 = _ema(self.ema_26, close, 26)
+        ema_12 = self.ema_12 if n + 1 >= 12 else NAN
+        ema_26 = self.ema_26 if n + 1 >= 26 else NAN
+
+        ma_cross_7_21 = int(sma_7 > sma_21)
+        ma_cross_21_50 = int(sma_21 > sma_50)
+        price_to_sma_7 = _div(close - sma_7, sma_7)
+        price_to_sma_21 = _div(close - sma_21, sma_21)
+
+        # RSI (Wilder smoothing of gains and losses)
+        diff = close - prev_close if prev_close is not None else 0.0
+        up, down = max(diff, 0.0), max(-diff, 0.0)
+        if n == 0:
+            self.avg_up, self.avg_down = up, down
+        else:
+            self.avg_up += (up - self.avg_up) / 14
+            self.avg_down += (down - self.avg_down) / 14
+        if n + 1 < 14:
+            rsi_14 = NAN
+        elif self.avg_down == 0:
+            rsi_14 = 100.0
+        else:
+            rsi_14 = 100 - (100 / (1 + self.avg_up / self.avg_down))
+
+        # MACD: the signal EMA starts at the first valid MACD value
+        if n + 1 >= 26:
+            macd = self.ema_12 - self.ema_26
+            self.macd_signal = _ema(self.macd_signal, macd, 9)
+            self.macd_count += 1
+            macd_signal = self.macd_signal if self.macd_count >= 9 else NAN
+        else:
+            macd = macd_signal = NAN
+        macd_diff = macd - macd_signal
+
+        # Bollinger Bands; a flat window has exactly zero width, so bb_position is 0/0 like
+        # in ta instead of a ratio of rounding residues
+        if self.flat_run >= 20:
+            bb_mid, std = close, 0.0
+        else:
+            bb_mid, std = self.close_windows[20].mean(), self.close_windows[20].std()
+        bb_high = bb_mid + 2 * std
+        bb_low = bb_mid - 2 * std
+        bb_width = _div(bb_high - bb_low, bb_mid) * 100
+        bb_position = _div(close - bb_low, bb_high - bb_low)
+
+        # Volume
+        volume_sma_20 = self.volumes.mean()
+        volume_ratio = _div(volume, volume_sma_20)
+
+        # ATR: zero until seeded with the mean of the first 14 true ranges
+        if prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        if n < 13:
+            self.true_ranges.append(true_range)
+        elif n == 13:
+            self.true_ranges.append(true_range)
+            self.atr = sum(self.true_ranges) / 14
+            self.true_ranges = []
+        else:
+            self.atr = (self.atr * 13 + true_range) / 14
+        atr_14 = self.atr
+
+        # Stochastic oscillator
+        if len(self.highs) >= 14:
+            lowest, highest = min(self.lows), max(self.highs)
+            stoch_k = _div(100 * (close - lowest), highest - lowest)
+        else:
+            stoch_k = NAN
+        self.stoch_ks.append(stoch_k)
+        if len(self.stoch_ks) == 3 and not any(k != k for k in self.stoch_ks):
+            stoch_d = sum(self.stoch_ks) / 3
+        else:
+            stoch_d = NAN
+
+        # Rate of change
+        roc_5 = _div(close - self.closes[-6], self.closes[-6]) * 100 if len(self.closes) > 5 else NAN
+        roc_10 = _div(close - self.closes[-11], self.closes[-11]) * 100 if len(self.closes) > 10 else NAN
+
+        # On-balance volume
+        if prev_close is not None and close < prev_close:
+            self.obv -= volume
+        else:
+            self.obv += volume
+
+        self.prev_close = close
+        self.count += 1
+
+        return [
+            sma_7, sma_21, sma_50, ema_12, ema_26,
+            ma_cross_7_21, ma_cross_21_50, price_to_sma_7, price_to_sma_21,
+            rsi_14, macd, macd_signal, macd_diff,
+            bb_high, bb_mid, bb_low, bb_width, bb_position,
+            volume_sma_20, volume_ratio, atr_14, stoch_k, stoch_d,
+            roc_5, roc_10, self.obv,
+        ]
+
+    def _append_close(self, close):
+        """Buffer a close, add it to the window sums and extend or restart the flat run"""
+        previous = self.closes[-1] if self.closes else None
+        self.flat_run = self.flat_run + 1 if close == previous else 1
+        self.closes.append(close)
+        for window in self.close_windows.values():
+            window.append(close)
+
+    def to_dict(self):
+        """Serialise the state to JSON-compatible types (nan is stored as None)"""
+        def clean(values):
+            return [None if v != v else v for v in values]
+
+        return {
+            'count': self.count,
+            'prev_close': self.prev_close,
+            'closes': list(self.closes),
+            'volumes': list(self.volumes.values),
+            'highs': list(self.highs),
+            'lows': list(self.lows),
+            'stoch_ks': clean(self.stoch_ks),
+            'true_ranges': self.true_ranges,
+            'ema_12': self.ema_12,
+            'ema_26': self.ema_26,
+            'macd_signal': self.macd_signal,
+            'macd_count': self.macd_count,
+            'avg_up': self.avg_up,
+            'avg_down': self.avg_down,
+            'atr': self.atr,
+            'obv': self.obv,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a state saved with to_dict()"""
+        state = cls()
+        for key in ('count', 'prev_close', 'true_ranges', 'ema_12', 'ema_26', 'macd_signal',
+                    'macd_count', 'avg_up', 'avg_down', 'atr', 'obv'):
+            setattr(state, key, data[key])
+        # Replaying the buffered tails rebuilds the window sums and the flat run
+        for close in data['closes']:
+            state._append_close(close)
+        for volume in data['volumes']:
+            state.volumes.append(volume)
+        state.highs.extend(data['highs'])
+        state.lows.extend(data['lows'])
+        state.stoch_ks.extend(NAN if v is None else v for v in data['stoch_ks'])
+        return state
+
+
+def compute_features(rows, state=None):
+    """
+    Run candles through an IndicatorState and keep the fully warmed-up rows
+
+    Args:
+        rows: Iterable of (timestamp, open, high, low, close, volume, quote_volume, trades)
+        state: IndicatorState to continue from; a fresh one if None
+
+    Returns:
+        features: List of (timestamp, *FEATURE_COLUMNS) tuples, skipping rows with
+                  any nan or infinite value exactly like add_technical_indicators
+        state: The advanced IndicatorState
+    """
+    if state is None:
+        state = IndicatorState()
+
+    features = []
+    for timestamp, open_, high, low, close, volume, quote_volume, trades in rows:
+        values = state.update(float(high), float(low), float(close), float(volume))
+        if not all(math.isfinite(v) for v in values):
+            continue
+        features.append((timestamp, open_, high, low, close, volume, quote_volume, trades, *values))
+    return features, state
+
+
+class IncrementalFeatureEngine:
+    """
+    Maintains the kline_features table from newly collected kline_data rows
+
+    The indicator state of every symbol/interval pair is persisted in
+    indicator_state, so each update only reads the candles stored since the
+    previous run and appends their feature rows. Candles inserted behind the
+    state (e.g. by GapScanner.fill, see `attach`) mark it stale with
+    `invalidate`; the next update then replays the pair and rewrites the
+    features from there on.
+    """
+
+    def __init__(self, store=None):
+        """
+        Parameters:
+        - store: PostgresStore (or a location open_store accepts) whose pool the
+          engine borrows connections from; defaults to DatabaseConfig (.env)
+        """
+        self.store = open_store(store) if store is not None else PostgresStore()
+        if not isinstance(self.store, PostgresStore):
+            raise ValueError("IncrementalFeatureEngine needs a PostgreSQL store")
+
+    def ensure_tables(self, cursor):
+        """Create the feature and state tables if they do not exist yet"""
+        feature_columns = ',\n'.join(f"{col} double precision" for col in FEATURE_COLUMNS)
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS kline_features (
+                symbol text NOT NULL,
+                interval text NOT NULL,
+                timestamp timestamptz NOT NULL,
+                {feature_columns},
+                PRIMARY KEY (symbol, interval, timestamp)
+            );
+            CREATE TABLE IF NOT EXISTS indicator_state (
+                symbol text NOT NULL,
+                interval text NOT NULL,
+                last_timestamp timestamptz NOT NULL,
+                state jsonb NOT NULL,
+                stale_from timestamptz,
+                PRIMARY KEY (symbol, interval)
+            );
+            ALTER TABLE indicator_state ADD COLUMN IF NOT EXISTS stale_from timestamptz;
+        ''')
+
+        # Tables created before timestamptz hold naive UTC; the sessions run in
+        # UTC, where PostgreSQL changes the type without rewriting the table
+        cursor.execute('''
+            SELECT table_name, column_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND data_type = 'timestamp without time zone'
+              AND (table_name, column_name) IN (('kline_features', 'timestamp'),
+                                                ('indicator_state', 'last_timestamp'))
+        ''')
+        for table, column in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE timestamptz")
+            print(f"Converted {table}.{column} to timestamptz")
+
+    def invalidate(self, symbol, interval, since):
+        """
+        Mark a pair's features from `since` on as stale
+
+        Called after candles at or after `since` were inserted behind the saved
+        state. Does nothing if the state has not reached `since` yet (the next
+        update reads those candles anyway) or the tables do not exist.
+
+        Returns:
+            True if the state was marked stale
+        """
+        with self.store.transaction() as cursor:
+            cursor.execute("SELECT to_regclass('indicator_state') IS NOT NULL")
+            if not cursor.fetchone()[0]:
+                return False
+            cursor.execute('''
+                UPDATE indicator_state SET stale_from = LEAST(stale_from, %(since)s::timestamptz)
+                WHERE symbol = %(symbol)s AND interval = %(interval)s
+                  AND last_timestamp >= %(since)s::timestamptz
+            ''', {'symbol': symbol, 'interval': interval, 'since': since})
+            stale = cursor.rowcount > 0
+        if stale:
+            print(f"{symbol} ({interval}): features from {since} will be recomputed")
+        return stale
+
+    def attach(self, gap_scanner):
+        """Invalidate the features of every pair the GapScanner fills from its first filled candle"""
+        gap_scanner.add_fill_listener(self.invalidate)
+
+    def update(self, symbol, interval, chunk_size=50000):
+        """
+        Compute features for the candles stored since the last update
+
+        Reading new candles, appending feature rows and saving the indicator
+        state happen in one transaction. A stale state is dropped: the pair is
+        replayed from its first candle (EMA, OBV and ATR depend on the whole
+        history) and only the feature rows from stale_from on are rewritten.
+
+        Returns:
+            Number of feature rows appended
+        """
+        with self.store.transaction() as cursor:
+            self.ensure_tables(cursor)
+
+            cursor.execute('''
+                SELECT last_timestamp, state, stale_from
+                FROM indicator_state
+                WHERE symbol = %s AND interval = %s
+            ''', (symbol, interval))
+            result = cursor.fetchone()
+            stale_from = None
+            if result and result[2] is not None:
+                stale_from = result[2]
+                cursor.execute('''
+                    DELETE FROM kline_features
+                    WHERE symbol = %s AND interval = %s AND timestamp >= %s
+                ''', (symbol, interval, stale_from))
+                print(f"Recomputing {symbol} ({interval}) features from {stale_from}")
+                last_timestamp, state = None, IndicatorState()
+            elif result:
+                last_timestamp, state = result[0], IndicatorState.from_dict(result[1])
+            else:
+                last_timestamp, state = None, IndicatorState()
+
+            # Server-side cursor so the first run over a long history streams in chunks
+            new_rows = cursor.connection.cursor(name='new_klines')
+            new_rows.itersize = chunk_size
+            new_rows.execute('''
+                SELECT timestamp, open, high, low, close, volume, quote_volume, trades
+                FROM kline_data
+                WHERE symbol = %s AND interval = %s
+                  AND (%s::timestamptz IS NULL OR timestamp > %s::timestamptz)
+                ORDER BY timestamp
+            ''', (symbol, interval, last_timestamp, last_timestamp))
+
+            columns = ','.join(['symbol', 'interval', 'timestamp'] + FEATURE_COLUMNS)
+            appended = 0
+            while True:
+                rows = new_rows.fetchmany(chunk_size)
+                if not rows:
+                    break
+                last_timestamp = rows[-1][0]
+                features, state = compute_features(rows, state)
+                if stale_from is not None:
+                    features = [row for row in features if row[0] >= stale_from]
+                execute_values(
+                    cursor,
+                    f"INSERT INTO kline_features ({columns}) VALUES %s ON CONFLICT DO NOTHING",
+                    [(symbol, interval, *row) for row in features],
+                    page_size=1000
+                )
+                appended += len(features)
+            new_rows.close()
+
+            if last_timestamp is not None:
+                cursor.execute('''
+                    INSERT INTO indicator_state (symbol, interval, last_timestamp, state)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (symbol, interval)
+                    DO UPDATE SET last_timestamp = excluded.last_timestamp, state = excluded.state,
+                                  stale_from = NULL
+                ''', (symbol, interval, last_timestamp, json.dumps(state.to_dict())))
+
+        print(f"Appended {appended} feature rows for {symbol} ({interval})")
+        return appended
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Append technical indicator features for new candles')
+    parser.add_argument('--symbol', nargs='+', default=['BTCUSDT'], help='Trading pair symbol(s)')
+    parser.add_argument('--interval', nargs='+', default=['1h'], help='Trading interval(s)')
+    args = parser.parse_args()
+
+    engine = IncrementalFeatureEngine()
+    for symbol in args.symbol:
+        for interval in args.interval:
+            engine.update(symbol, interval)
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+import pandas as pd
+from utils import interval_to_minutes, naive_utc
+
+
+def interval_sql(interval):
+    """PostgreSQL interval literal for one candle (calendar months for 'M')"""
+    if interval.endswith('M'):
+        return f"{int(interval[:-1])} months"
+    return f"{interval_to_minutes(interval)} minutes"
+
+
+class GapScanner:
+    """
+    Finds and refills missing candles in kline_data
+
+    Gaps are found in the database with a window-function query, so only the
+    gap boundaries are returned to Python. Missing ranges are then re-fetched
+    page by page on a thread pool that shares the collector's rate limiter,
+    and upserted through CryptoDataCollector.store_page. Fill listeners
+    (e.g. IncrementalFeatureEngine.attach) learn the first filled candle of
+    every pair, so state derived from the old rows can be invalidated.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        # Callbacks run with (symbol, interval, first_filled) after fill()
+        self._fill_listeners = []
+
+    def add_fill_listener(self, callback):
+        """
+        Call callback(symbol, interval, first_filled) for every pair fill() stored candles for
+
+        first_filled is the start of the earliest page that stored candles.
+        Listener errors are recorded and never fail the fill.
+        """
+        self._fill_listeners.append(callback)
+
+    def find_gaps(self, symbol, interval, start=None, end=None):
+        """
+        Find runs of missing candles for a symbol/interval pair
+
+        Parameters:
+        - symbol: str, trading pair (e.g., 'BTCUSDT')
+        - interval: str, kline interval (e.g., '1h')
+        - start: optional str/datetime, expected first candle; a hole before the
+          first stored row is reported too
+        - end: optional str/datetime, upper bound of the scan
+
+        Returns:
+            List of (first_missing, last_missing, missing_count) tuples
+        """
+        step = interval_sql(interval)
+        start = pd.Timestamp(start).to_pydatetime() if start is not None else None
+        end = pd.Timestamp(end).to_pydatetime() if end is not None else None
+
+        with self.collector._transaction() as cursor:
+            cursor.execute('''
+                WITH scanned AS (
+                    SELECT timestamp
+                    FROM kline_data
+                    WHERE symbol = %(symbol)s AND interval = %(interval)s
+                      AND (%(start)s::timestamptz IS NULL OR timestamp >= %(start)s::timestamptz)
+                      AND (%(end)s::timestamptz IS NULL OR timestamp <= %(end)s::timestamptz)
+                ),
+                bounded AS (
+                    -- A virtual row one step before `start` exposes a leading hole
+                    SELECT timestamp FROM scanned
+                    UNION ALL
+                    SELECT %(start)s::timestamptz - %(step)s::interval WHERE %(start)s::timestamptz IS NOT NULL
+                ),
+                ordered AS (
+                    SELECT timestamp, lead(timestamp) OVER (ORDER BY timestamp) AS next_timestamp
+                    FROM bounded
+                )
+                SELECT timestamp + %(step)s::interval, next_timestamp - %(step)s::interval,
+                       round(extract(epoch FROM next_timestamp - timestamp)
+                             / extract(epoch FROM %(step)s::interval))::bigint - 1
+                FROM ordered
+                WHERE next_timestamp > timestamp + %(step)s::interval
+                ORDER BY timestamp
+            ''', {'symbol': symbol, 'interval': interval, 'start': start, 'end': end, 'step': step})
+            rows = cursor.fetchall()
+
+        return [(naive_utc(first), naive_utc(last), missing) for first, last, missing in rows]
+
+    def coverage(self, symbol, interval):
+        """
+        Summarise stored candles against the ones expected between the first and last
+
+        Returns:
+            dict with rows, expected, coverage (0-1), first and last timestamps
+        """
+        with self.collector._transaction() as cursor:
+            cursor.execute('''
+                SELECT count(*), min(timestamp), max(timestamp),
+                       extract(epoch FROM max(timestamp) - min(timestamp))
+                FROM kline_data
+                WHERE symbol = %s AND interval = %s
+            ''', (symbol, interval))
+            rows, first, last, span_seconds = cursor.fetchone()
+
+        if not rows:
+            return {'rows': 0, 'expected': 0, 'coverage': 0.0, 'first': None, 'last': None}
+
+        # Calendar months vary in length, so monthly candles are counted approximately
+        expected = int(round(float(span_seconds) / (interval_to_minutes(interval) * 60))) + 1
+        return {
+            'rows': rows,
+            'expected': expected,
+            'coverage': min(rows / expected, 1.0),
+            'first': naive_utc(first),
+            'last': naive_utc(last),
+        }
+
+    def _page_ranges(self, interval, first, last, page_size=1000):
+        """Split an inclusive gap into ranges of at most page_size candles"""
+        step = timedelta(minutes=interval_to_minutes(interval))
+        page_start = first
+        while page_start <= last:
+            page_end = min(page_start + step * (page_size - 1), last)
+            yield page_start, page_end
+            page_start = page_end + step
+
+    def _fill_page(self, symbol, interval, page_start, page_end):
+        """Fetch one missing range and upsert it; returns the number of candles stored"""
+        start_ms = int(page_start.timestamp() * 1000)
+        end_ms = int(page_end.timestamp() * 1000)
+        df = self.collector.get_klines(symbol, interval, start_time=start_ms, end_time=end_ms)
+        if df is None:
+            raise RuntimeError("request failed")
+        if df.empty:
+            return 0
+        self.collector.store_page(df, symbol, interval)
+        return len(df)
+
+    def fill(self, pairs, start=None, max_workers=8):
+        """
+        Scan and refill gaps for several symbol/interval pairs concurrently
+
+        Parameters:
+        - pairs: iterable of (symbol, interval) tuples
+        - start: optional str/datetime, expected first candle for every pair
+        - max_workers: int, number of pages fetched at the same time
+
+        Returns:
+            dict mapping (symbol, interval) to a summary with the gaps and missing
+            candles found, candles filled, the first filled page start, failed
+            pages and final coverage
+        """
+        pairs = list(pairs)
+        report = {}
+        tasks = []
+        for symbol, interval in pairs:
+            gaps = self.find_gaps(symbol, interval, start=start)
+            report[(symbol, interval)] = {
+                'gaps': len(gaps),
+                'missing': sum(missing for _, _, missing in gaps),
+                'filled': 0,
+                'first_filled': None,
+                'failed_pages': 0,
+            }
+            for first, last, _ in gaps:
+                tasks.extend((symbol, interval, page_start, page_end)
+                             for page_start, page_end in self._page_ranges(interval, first, last))
+
+        print(f"Filling {len(tasks)} missing pages across {len(pairs)} pairs")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._fill_page, *task): task for task in tasks}
+            for future in as_completed(futures):
+                symbol, interval, page_start, page_end = futures[future]
+                summary = report[(symbol, interval)]
+                try:
+                    filled = future.result()
+                    summary['filled'] += filled
+                    if filled and (summary['first_filled'] is None or page_start < summary['first_filled']):
+                        summary['first_filled'] = page_start
+                except Exception as e:
+                    self.collector._record_error('gap_fill', e, symbol, interval,
+                                                 page_start=page_start, page_end=page_end)
+                    summary['failed_pages'] += 1
+
+        for (symbol, interval), summary in report.items():
+            if summary['first_filled'] is None:
+                continue
+            for listener in self._fill_listeners:
+                try:
+                    listener(symbol, interval, summary['first_filled'])
+                except Exception as e:
+                    self.collector._record_error('fill_listener', e, symbol, interval)
+
+        for (symbol, interval), summary in report.items():
+            summary.update(self.coverage(symbol, interval))
+            summary['remaining_gaps'] = len(self.find_gaps(symbol, interval, start=start))
+            print(f"{symbol} ({interval}): {summary['gaps']} gaps / {summary['missing']} missing candles, "
+                  f"{summary['filled']} filled, "
+                  f"{summary['failed_pages']} failed pages, coverage {summary['coverage']:.2%} "
+                  f"({summary['rows']}/{summary['expected']}), {summary['remaining_gaps']} gaps left")
+        return report
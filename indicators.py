@@ -0,0 +1,243 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Candle columns carried into the feature rows, in TFDataExporter order
+BASE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'quote_volume', 'trades']
+
+# Columns produced by TFDataExporter.add_technical_indicators, in the same order
+INDICATOR_COLUMNS = [
+    'sma_7', 'sma_21', 'sma_50', 'ema_12', 'ema_26',
+    'ma_cross_7_21', 'ma_cross_21_50', 'price_to_sma_7', 'price_to_sma_21',
+    'rsi_14', 'macd', 'macd_signal', 'macd_diff',
+    'bb_high', 'bb_mid', 'bb_low', 'bb_width', 'bb_position',
+    'volume_sma_20', 'volume_ratio', 'atr_14', 'stoch_k', 'stoch_d',
+    'roc_5', 'roc_10', 'obv',
+]
+
+FEATURE_COLUMNS = BASE_COLUMNS + INDICATOR_COLUMNS
+
+# Rows handled per sliding-window chunk, bounding the (rows x window) temporaries
+CHUNK_ROWS = 1 << 16
+
+
+def _rolling_mean(csum, window):
+    """Rolling mean from a shared cumulative sum (csum[0] == 0), nan until the window fills"""
+    out = np.full(len(csum) - 1, np.nan)
+    out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def flat_windows(x, window):
+    """
+    Whether the `window` values ending at each row are all equal (False until the window fills)
+
+    Bollinger Bands over such a window have zero width, so bb_position is
+    0/0. Rolling sums and stds only reach zero up to rounding there, so every
+    backend uses this exact test to make bb_position nan (and drop the row)
+    instead of dividing by a rounding residue.
+    """
+    changed = np.concatenate([[1], np.diff(x) != 0]).cumsum()
+    flat = np.zeros(len(x), dtype=bool)
+    flat[window - 1:] = changed[window - 1:] == changed[:len(x) - window + 1]
+    return flat
+
+
+def _chunked_window_reduce(x, window, reduce):
+    """Apply reduce(windows) over sliding windows of x in bounded-memory chunks"""
+    out = np.full(len(x), np.nan)
+    for start in range(window - 1, len(x), CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, len(x))
+        out[start:stop] = reduce(sliding_window_view(x[start - window + 1:stop], window))
+    return out
+
+
+def _linear_filter(u, decay, init):
+    """
+    Solve y[t] = decay * y[t-1] + u[t] with y[-1] = init, vectorised
+
+    The series is cut into blocks short enough that decay**-block stays well
+    inside float64 range. Inside each block the recurrence is a scaled cumulative
+    sum; only the carry from one block to the next is propagated in a Python loop,
+    which runs len(u) / block times.
+    """
+    n = len(u)
+    if n == 0:
+        return np.empty(0)
+
+    block = max(1, min(n, int(18 / -np.log(decay))))
+    n_blocks = -(-n // block)
+    padded = np.zeros(n_blocks * block)
+    padded[:n] = u
+    blocks = padded.reshape(n_blocks, block)
+
+    powers = decay ** np.arange(block)
+    local = np.cumsum(blocks / powers, axis=1) * powers
+
+    carries = np.empty(n_blocks)
+    carry, decay_block, last = init, decay ** block, local[:, -1]
+    for b in range(n_blocks):
+        carries[b] = carry
+        carry = decay_block * carry + last[b]
+
+    local += carries[:, None] * (powers * decay)
+    return local.reshape(-1)[:n]
+
+
+def _ewm(x, alpha, min_periods):
+    """adjust=False exponential moving average matching pandas/ta, nan before min_periods"""
+    out = _linear_filter(alpha * x, 1 - alpha, x[0] if len(x) else 0.0)
+    out[:min_periods - 1] = np.nan
+    return out
+
+
+def _shift_ratio(x, periods):
+    """(x[t] - x[t-periods]) / x[t-periods] * 100, nan for the first rows"""
+    out = np.full(len(x), np.nan)
+    out[periods:] = (x[periods:] - x[:-periods]) / x[:-periods] * 100
+    return out
+
+
+class _ColumnWriter:
+    """Dict-style writer storing each named indicator into its column of a matrix"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.positions = {name: i for i, name in enumerate(INDICATOR_COLUMNS)}
+
+    def __setitem__(self, name, values):
+        self.matrix[:, self.positions[name]] = values
+
+
+def compute_indicators(df, dtype=np.float64):
+    """
+    Compute the full add_technical_indicators feature set with fused NumPy passes
+
+    Rolling means share one cumulative sum per input column, the EMA family
+    (EMA, MACD, RSI, ATR) runs through a blocked linear-recurrence solver, and
+    the windowed min/max/std use chunked sliding-window views. Results match
+    the `ta` implementation to float tolerance, including the final dropna().
+
+    Args:
+        df: DataFrame with open, high, low, close, volume, quote_volume, trades
+        dtype: dtype of the returned indicator columns (kernels run in float64)
+
+    Returns:
+        DataFrame with the input columns plus INDICATOR_COLUMNS, nan rows dropped
+    """
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    volume = df['volume'].to_numpy(dtype=np.float64)
+    n = len(close)
+
+    # Every indicator is written straight into one preallocated block
+    # (column-major, so each column write and the final DataFrame are contiguous)
+    matrix = np.empty((n, len(INDICATOR_COLUMNS)), dtype=dtype, order='F')
+    out = _ColumnWriter(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Shared cumulative sums, offset by the first value to keep them small
+        close_ref = close[0] if n else 0.0
+        close_csum = np.concatenate([[0.0], np.cumsum(close - close_ref)])
+        volume_csum = np.concatenate([[0.0], np.cumsum(volume)])
+
+        # Moving averages
+        sma_7 = _rolling_mean(close_csum, 7) + close_ref
+        sma_21 = _rolling_mean(close_csum, 21) + close_ref
+        sma_50 = _rolling_mean(close_csum, 50) + close_ref
+        ema_12_full = _ewm(close, 2 / 13, 1)
+        ema_26_full = _ewm(close, 2 / 27, 1)
+        out['sma_7'] = sma_7
+        out['sma_21'] = sma_21
+        out['sma_50'] = sma_50
+        out['ema_12'] = np.where(np.arange(n) >= 11, ema_12_full, np.nan)
+        out['ema_26'] = np.where(np.arange(n) >= 25, ema_26_full, np.nan)
+
+        out['ma_cross_7_21'] = sma_7 > sma_21
+        out['ma_cross_21_50'] = sma_21 > sma_50
+        out['price_to_sma_7'] = (close - sma_7) / sma_7
+        out['price_to_sma_21'] = (close - sma_21) / sma_21
+        del sma_7, sma_21, sma_50
+
+        # RSI
+        diff = np.diff(close, prepend=close[:1])
+        avg_up = _ewm(np.maximum(diff, 0.0), 1 / 14, 14)
+        avg_down = _ewm(np.maximum(-diff, 0.0), 1 / 14, 14)
+        out['rsi_14'] = np.where(avg_down == 0, 100.0, 100 - (100 / (1 + avg_up / avg_down)))
+        del diff, avg_up, avg_down
+
+        # MACD, the signal EMA starts at the first valid MACD value
+        macd = ema_12_full - ema_26_full
+        macd[:25] = np.nan
+        macd_signal = np.full(n, np.nan)
+        if n > 25:
+            macd_signal[25:] = _ewm(macd[25:], 2 / 10, 9)
+        out['macd'] = macd
+        out['macd_signal'] = macd_signal
+        out['macd_diff'] = macd - macd_signal
+        del ema_12_full, ema_26_full, macd, macd_signal
+
+        # Bollinger Bands, reusing the shared close cumsum for the middle band
+        bb_mid = _rolling_mean(close_csum, 20) + close_ref
+        std = _chunked_window_reduce(close - close_ref, 20, lambda w: w.std(axis=1))
+        # Flat windows have exactly zero width, and bb_position is 0/0 like in ta
+        flat = flat_windows(close, 20)
+        bb_mid[flat] = close[flat]
+        std[flat] = 0
+        bb_high, bb_low = bb_mid + 2 * std, bb_mid - 2 * std
+        out['bb_high'] = bb_high
+        out['bb_mid'] = bb_mid
+        out['bb_low'] = bb_low
+        out['bb_width'] = (bb_high - bb_low) / bb_mid * 100
+        out['bb_position'] = np.where(flat, np.nan, (close - bb_low) / (bb_high - bb_low))
+        del bb_mid, std, flat, bb_high, bb_low, close_csum
+
+        # Volume
+        volume_sma_20 = _rolling_mean(volume_csum, 20)
+        out['volume_sma_20'] = volume_sma_20
+        out['volume_ratio'] = volume / volume_sma_20
+        del volume_sma_20, volume_csum
+
+        # ATR: zero until seeded with the mean of the first 14 true ranges, then Wilder smoothing
+        prev_close = np.concatenate([close[:1], close[:-1]])
+        true_range = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+        if n:
+            true_range[0] = high[0] - low[0]
+        atr = np.zeros(n)
+        if n >= 14:
+            seed = true_range[:14].mean()
+            atr[13] = seed
+            atr[14:] = _linear_filter(true_range[14:] / 14, 13 / 14, seed)
+        out['atr_14'] = atr
+        del true_range, atr
+
+        # Stochastic oscillator
+        lowest = _chunked_window_reduce(low, 14, lambda w: w.min(axis=1))
+        highest = _chunked_window_reduce(high, 14, lambda w: w.max(axis=1))
+        stoch_k = 100 * (close - lowest) / (highest - lowest)
+        out['stoch_k'] = stoch_k
+        out['stoch_d'] = _chunked_window_reduce(stoch_k, 3, lambda w: w.mean(axis=1))
+
+        # Rate of change
+        out['roc_5'] = _shift_ratio(close, 5)
+        out['roc_10'] = _shift_ratio(close, 10)
+
+        # On-balance volume
+        signed_volume = np.where(close < prev_close, -volume, volume)
+        out['obv'] = np.cumsum(signed_volume)
+
+    # Like the ta path, which replaces infinities before dropna(), keep only finite rows
+    valid = np.isfinite(matrix).all(axis=1) & df.notna().all(axis=1).to_numpy()
+    if not valid.all():
+        # Compact the kept rows to the top of each column in place instead of copying the block
+        kept = int(valid.sum())
+        for i in range(matrix.shape[1]):
+            matrix[:kept, i] = matrix[valid, i]
+        matrix = matrix[:kept]
+        df = df[valid]
+
+    indicators = pd.DataFrame(matrix, index=df.index, columns=INDICATOR_COLUMNS, copy=False)
+    # ta's crossover signals are int columns
+    indicators = indicators.astype({'ma_cross_7_21': np.int64, 'ma_cross_21_50': np.int64})
+    return pd.concat([df, indicators], axis=1)
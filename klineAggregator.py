@@ -0,0 +1,180 @@
+import pandas as pd
+from utils import interval_to_minutes, naive_utc
+
+
+# Interval every derived candle is built from
+BASE_INTERVAL = '1m'
+
+# Binance weekly candles open on Monday; 1970-01-05 is the first Monday after the epoch
+WEEK_ORIGIN = pd.Timestamp('1970-01-05')
+
+# How each kline_data column is folded into a coarser candle
+AGGREGATIONS = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'quote_volume': 'sum',
+    'trades': 'sum',
+}
+
+
+def _check_interval(interval):
+    """Reject intervals that cannot be derived from 1m candles"""
+    if interval == BASE_INTERVAL or interval_to_minutes(interval) <= 1:
+        raise ValueError(f"{interval} is not coarser than {BASE_INTERVAL}")
+    if interval.endswith('M') and interval != '1M':
+        raise ValueError(f"Only 1M is supported for monthly candles, got {interval}")
+
+
+def bucket_start(timestamps, interval):
+    """
+    Open time of the `interval` candle containing each timestamp
+
+    Minute/hour/day buckets are aligned to the epoch, weeks to Monday and
+    1M to calendar months, matching the candles Binance serves.
+
+    Args:
+        timestamps: pd.Timestamp, or a DatetimeIndex/Series of naive UTC times
+    """
+    _check_interval(interval)
+    scalar = isinstance(timestamps, pd.Timestamp)
+    index = pd.DatetimeIndex([timestamps] if scalar else timestamps)
+
+    if interval.endswith('M'):
+        starts = index.to_period('M').to_timestamp()
+    else:
+        step = pd.Timedelta(minutes=interval_to_minutes(interval))
+        origin = WEEK_ORIGIN if interval.endswith('w') else pd.Timestamp(0)
+        starts = origin + ((index - origin) // step) * step
+
+    return starts[0] if scalar else starts
+
+
+def next_bucket(timestamp, interval):
+    """Open time of the candle after the one starting at `timestamp`"""
+    if interval.endswith('M'):
+        return timestamp + pd.DateOffset(months=1)
+    return timestamp + pd.Timedelta(minutes=interval_to_minutes(interval))
+
+
+def resample_klines(df, interval):
+    """
+    Aggregate 1m klines into `interval` candles
+
+    Args:
+        df: DataFrame with a timestamp column and the kline_data value columns
+            (open, high, low, close, volume, quote_volume, trades), sorted by time
+        interval: Target interval, e.g. '5m', '4h', '1w' or '1M'
+
+    Returns:
+        DataFrame with the same columns, one row per candle that has data
+    """
+    if df.empty:
+        return df.copy()
+
+    timestamps = pd.DatetimeIndex(pd.to_datetime(df['timestamp']))
+    aggregations = {col: how for col, how in AGGREGATIONS.items() if col in df.columns}
+    candles = df[list(aggregations)].groupby(bucket_start(timestamps, interval).to_numpy(), sort=True).agg(aggregations)
+    candles.index.name = 'timestamp'
+    return candles.reset_index()
+
+
+def _bucket_sql(interval):
+    """SQL expression bucketing kline_data.timestamp into `interval` candles"""
+    _check_interval(interval)
+    if interval.endswith('M'):
+        return "date_trunc('month', timestamp, 'UTC')"
+    origin = WEEK_ORIGIN if interval.endswith('w') else pd.Timestamp(0)
+    return f"date_bin('{interval_to_minutes(interval)} minutes', timestamp, TIMESTAMPTZ '{origin}+00')"
+
+
+class KlineAggregator:
+    """
+    Builds coarser klines (5m, 1h, 1d, ...) in kline_data from the stored 1m candles
+
+    Candles are aggregated inside PostgreSQL and upserted under the derived
+    interval, so they are read exactly like fetched ones. Only the buckets
+    touched since the last run are recomputed: the derived pair's
+    last_updates watermark marks its newest (possibly still partial) candle,
+    and everything from that candle onwards is rebuilt. date_bin needs
+    PostgreSQL 14 or newer.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+
+    def derive_sql(self, cursor, symbol, interval, since=None, until=None):
+        """
+        Render the upsert of `interval` candles built from 1m rows in [since, until)
+
+        since/until should be candle boundaries so no bucket is rebuilt from
+        part of its minutes. The derived watermark is advanced in the same
+        statement, never moved backwards.
+        """
+        bucket = _bucket_sql(interval)
+        since = pd.Timestamp(since).to_pydatetime() if since is not None else None
+        until = pd.Timestamp(until).to_pydatetime() if until is not None else None
+        return cursor.mogrify(f'''
+            WITH derived AS (
+                INSERT INTO kline_data (symbol, interval, timestamp, open, high, low, close,
+                                        volume, quote_volume, trades)
+                SELECT symbol, %(interval)s, {bucket},
+                       (array_agg(open ORDER BY timestamp))[1], max(high), min(low),
+                       (array_agg(close ORDER BY timestamp DESC))[1],
+                       sum(volume), sum(quote_volume), sum(trades)
+                FROM kline_data
+                WHERE symbol = %(symbol)s AND interval = %(base)s
+                  AND (%(since)s::timestamptz IS NULL OR timestamp >= %(since)s::timestamptz)
+                  AND (%(until)s::timestamptz IS NULL OR timestamp < %(until)s::timestamptz)
+                GROUP BY symbol, {bucket}
+                ON CONFLICT (symbol, interval, timestamp) DO UPDATE SET
+                    open = excluded.open, high = excluded.high, low = excluded.low,
+                    close = excluded.close, volume = excluded.volume,
+                    quote_volume = excluded.quote_volume, trades = excluded.trades
+                RETURNING timestamp
+            )
+            INSERT INTO last_updates (symbol, interval, last_timestamp)
+            SELECT %(symbol)s, %(interval)s, max(timestamp) FROM derived HAVING count(*) > 0
+            ON CONFLICT (symbol, interval)
+            DO UPDATE SET last_timestamp = GREATEST(last_updates.last_timestamp, excluded.last_timestamp);
+        ''', {'symbol': symbol, 'interval': interval, 'base': BASE_INTERVAL, 'since': since, 'until': until})
+
+    def page_sql(self, cursor, df, symbol, intervals):
+        """
+        Render the refresh of every derived interval touched by a page of 1m klines
+
+        Used by CryptoDataCollector.store_page so derived candles are updated
+        in the same transaction as the 1m rows they come from.
+        """
+        first = pd.Timestamp(df['timestamp'].iloc[0])
+        last = pd.Timestamp(df['timestamp'].iloc[-1])
+        return b''.join(
+            self.derive_sql(cursor, symbol, interval, since=bucket_start(first, interval),
+                            until=next_bucket(bucket_start(last, interval), interval))
+            for interval in intervals
+        )
+
+    def update(self, symbol, interval):
+        """
+        Catch a derived interval up with the stored 1m candles
+
+        Rebuilds from the newest derived candle (or from scratch if there is
+        none), e.g. after collecting 1m data without derivation enabled.
+        """
+        since = self.collector.get_last_update_time(symbol, interval)
+        with self.collector._transaction() as cursor:
+            cursor.execute('''
+                SELECT min(timestamp), max(timestamp) FROM kline_data
+                WHERE symbol = %s AND interval = %s AND (%s::timestamptz IS NULL OR timestamp >= %s::timestamptz)
+            ''', (symbol, BASE_INTERVAL, since, since))
+            first, last = cursor.fetchone()
+        if first is None:
+            return
+
+        self.collector.schema.ensure_partitions(bucket_start(naive_utc(first), interval), naive_utc(last))
+        with self.collector._transaction(symbol=symbol, interval=interval) as cursor:
+            cursor.execute(self.derive_sql(cursor, symbol, interval, since=since))
+        print(f"Derived {symbol} ({interval}) from {BASE_INTERVAL} candles"
+              + (f" since {since}" if since is not None else ""))
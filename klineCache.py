@@ -0,0 +1,237 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed when a cache is configured
+    pa = pq = None
+
+
+# Columns mirrored from kline_data; timestamp is stored as int64 milliseconds
+CACHE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'quote_volume', 'trades']
+
+
+def _to_millis(values):
+    """Convert timestamps (strings, datetimes or ms integers) to an int64 ms array"""
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    return pd.to_datetime(values).to_numpy(dtype='datetime64[ms]').astype(np.int64)
+
+
+def _month_of(millis):
+    """'YYYY-MM' partition key of each ms timestamp"""
+    return np.asarray(millis, dtype='datetime64[ms]').astype('datetime64[M]').astype(str)
+
+
+class KlineCache:
+    """
+    Local columnar mirror of kline_data in Parquet files
+
+    Files are partitioned as <root>/symbol=<S>/interval=<I>/month=<YYYY-MM>.parquet
+    with an int64 millisecond timestamp and float64 value columns. Loads open
+    only the months overlapping the requested range and read only the
+    requested columns.
+    """
+
+    def __init__(self, root):
+        if pa is None:
+            raise ImportError("pyarrow is required for KlineCache (pip install pyarrow)")
+        self.root = Path(root)
+
+    def _pair_dir(self, symbol, interval):
+        return self.root / f"symbol={symbol}" / f"interval={interval}"
+
+    def _partitions(self, symbol, interval):
+        """Sorted (month, path) pairs cached for a symbol/interval"""
+        pair_dir = self._pair_dir(symbol, interval)
+        if not pair_dir.exists():
+            return []
+        return sorted((path.stem.split('=', 1)[1], path) for path in pair_dir.glob('month=*.parquet'))
+
+    def last_timestamp(self, symbol, interval):
+        """Latest cached timestamp in ms, or None if nothing is cached"""
+        partitions = self._partitions(symbol, interval)
+        if not partitions:
+            return None
+        timestamps = pq.read_table(partitions[-1][1], columns=['timestamp']).column('timestamp')
+        return int(pa.compute.max(timestamps).as_py())
+
+    def row_count(self, symbol, interval):
+        """Number of cached rows, from the Parquet footers"""
+        return sum(pq.ParquetFile(path).metadata.num_rows for _, path in self._partitions(symbol, interval))
+
+    def month_counts(self, symbol, interval):
+        """Cached rows per month, as {'YYYY-MM': count}, from the Parquet footers"""
+        return {month: pq.ParquetFile(path).metadata.num_rows for month, path in self._partitions(symbol, interval)}
+
+    def write(self, symbol, interval, df, replace=False):
+        """
+        Merge kline rows into their monthly partitions
+
+        Rows already cached for the same timestamp are replaced; with replace=True
+        the touched partitions are overwritten with the new rows only. Each
+        touched partition is rewritten through a temporary file and renamed
+        into place.
+        """
+        if df is None or df.empty:
+            return
+
+        frame = pd.DataFrame({
+            'timestamp': _to_millis(df['timestamp']),
+            **{col: df[col].to_numpy(dtype=np.float64) for col in CACHE_COLUMNS[1:-1]},
+            'trades': df['trades'].to_numpy(dtype=np.int64),
+        })
+        months = _month_of(frame['timestamp'].to_numpy())
+
+        pair_dir = self._pair_dir(symbol, interval)
+        pair_dir.mkdir(parents=True, exist_ok=True)
+        for month in np.unique(months):
+            part = frame[months == month]
+            path = pair_dir / f"month={month}.parquet"
+            if path.exists() and not replace:
+                part = pd.concat([pq.read_table(path).to_pandas(), part])
+            part = part.drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+
+            tmp_path = path.with_suffix('.tmp')
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path)
+            os.replace(tmp_path, path)
+
+    def _versions_path(self, symbol, interval):
+        return self._pair_dir(symbol, interval) / 'versions.json'
+
+    def _read_versions(self, symbol, interval):
+        """Source versions recorded by the last sync: {'version': ..., 'months': {...}}"""
+        path = self._versions_path(symbol, interval)
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def _write_versions(self, symbol, interval, versions):
+        path = self._versions_path(symbol, interval)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(versions, indent=2, sort_keys=True, default=str))
+        os.replace(tmp_path, path)
+
+    def sync(self, symbol, interval, loader, month_versions=None, version=None):
+        """
+        Bring the cache up to date from the source database
+
+        The last cached month is re-read in full (it may have been partial),
+        everything after it is appended. With month_versions, older months are
+        checked too: the source's per-month versions are recorded next to the
+        files (versions.json), and every month whose version changed since it
+        was cached (e.g. a backfill into it) is re-read and replaced. A cache
+        without recorded versions re-reads its older months once.
+
+        With `version`, a cheap version of the whole pair is recorded as well;
+        while it is unchanged the source has nothing new and the sync reads
+        nothing but that version.
+
+        Args:
+            loader: callable(symbol, interval, start, end=None) returning a kline
+                    DataFrame with rows in [start, end) (pandas Timestamps, or
+                    None for unbounded)
+            month_versions: Optional callable(symbol, interval) returning the
+                    source's {'YYYY-MM': version} (e.g. KlineStore.month_counts),
+                    or None when they are unknown
+            version: Optional callable(symbol, interval) returning a version of
+                    the pair that changes with every append or backfill (e.g.
+                    KlineStore.kline_version)
+
+        Returns:
+            Number of rows loaded
+        """
+        last = self.last_timestamp(symbol, interval)
+        start = None
+        if last is not None:
+            start = pd.Timestamp(np.datetime64(last, 'ms').astype('datetime64[M]'))
+
+        recorded = self._read_versions(symbol, interval)
+        pair_version = None
+        if version is not None:
+            # Compared in its JSON form, as it is recorded
+            pair_version = json.loads(json.dumps(version(symbol, interval), default=str))
+            if start is not None and recorded.get('version') == pair_version:
+                return 0
+
+        versions = month_versions(symbol, interval) if month_versions is not None else None
+        loaded = 0
+        if versions is not None and start is not None:
+            recorded_months = recorded.get('months', {})
+            cached = {month for month, _ in self._partitions(symbol, interval)}
+            for month in sorted(cached | set(versions)):
+                month_start = pd.Timestamp(month)
+                if month_start >= start or recorded_months.get(month, -1) == versions.get(month):
+                    continue
+                df = loader(symbol, interval, month_start, month_start + pd.DateOffset(months=1))
+                if df is None or df.empty:
+                    (self._pair_dir(symbol, interval) / f"month={month}.parquet").unlink(missing_ok=True)
+                else:
+                    self.write(symbol, interval, df, replace=True)
+                    loaded += len(df)
+                print(f"Refreshed cached {symbol} ({interval}) month {month}")
+
+        df = loader(symbol, interval, start)
+        self.write(symbol, interval, df)
+        loaded += 0 if df is None else len(df)
+
+        if versions is not None or pair_version is not None:
+            self._write_versions(symbol, interval, {
+                'version': pair_version,
+                'months': versions if versions is not None else recorded.get('months', {}),
+            })
+        return loaded
+
+    def _read_months(self, symbol, interval, start, end, columns):
+        """Yield the Arrow table of every cached month overlapping [start, end), oldest first"""
+        start_ms = int(pd.Timestamp(start).value // 10**6) if start is not None else None
+        end_ms = int(pd.Timestamp(end).value // 10**6) if end is not None else None
+        first_month = str(_month_of(start_ms)) if start_ms is not None else None
+        last_month = str(_month_of(end_ms)) if end_ms is not None else None
+
+        filters = []
+        if start_ms is not None:
+            filters.append(('timestamp', '>=', start_ms))
+        if end_ms is not None:
+            filters.append(('timestamp', '<', end_ms))
+
+        for month, path in self._partitions(symbol, interval):
+            if (first_month is None or month >= first_month) and (last_month is None or month <= last_month):
+                yield pq.read_table(path, columns=['timestamp'] + columns, filters=filters or None)
+
+    @staticmethod
+    def _frame(table):
+        df = table.to_pandas()
+        df.index = pd.DatetimeIndex(df.pop('timestamp').to_numpy().astype('datetime64[ms]'), name='timestamp')
+        return df
+
+    def load(self, symbol, interval, start=None, end=None, columns=None):
+        """
+        Load cached klines for [start, end) as a DataFrame indexed by timestamp
+
+        Args:
+            start, end: Optional range bounds (anything pd.Timestamp accepts)
+            columns: Value columns to read; all of them if None
+        """
+        columns = list(columns) if columns is not None else CACHE_COLUMNS[1:]
+        tables = list(self._read_months(symbol, interval, start, end, columns))
+        if not tables:
+            return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='timestamp'))
+        return self._frame(pa.concat_tables(tables))
+
+    def iter_months(self, symbol, interval, start=None, end=None, columns=None):
+        """Like load, but yield one DataFrame per cached month so only a month is in memory"""
+        columns = list(columns) if columns is not None else CACHE_COLUMNS[1:]
+        for table in self._read_months(symbol, interval, start, end, columns):
+            if table.num_rows:
+                yield self._frame(table)
+
+    def count(self, symbol, interval, start=None, end=None):
+        """Number of cached rows in [start, end); only the timestamp column is read"""
+        if start is None and end is None:
+            return self.row_count(symbol, interval)
+        return sum(table.num_rows for table in self._read_months(symbol, interval, start, end, []))
@@ -0,0 +1,213 @@
+import threading
+import pandas as pd
+
+
+# Monthly partitions are named kline_data_pYYYY_MM
+PARTITION_PREFIX = 'kline_data_p'
+
+# Name the pre-migration table is kept under while its rows are copied
+LEGACY_TABLE = 'kline_data_legacy'
+
+
+# Managed tables; kline_data partitions are added by KlineSchema.ensure_partitions
+SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS kline_data (
+        symbol text NOT NULL,
+        interval text NOT NULL,
+        timestamp timestamptz NOT NULL,
+        open double precision NOT NULL,
+        high double precision NOT NULL,
+        low double precision NOT NULL,
+        close double precision NOT NULL,
+        volume double precision NOT NULL,
+        quote_volume double precision NOT NULL,
+        trades bigint NOT NULL,
+        PRIMARY KEY (symbol, interval, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+    CREATE TABLE IF NOT EXISTS last_updates (
+        symbol text NOT NULL,
+        interval text NOT NULL,
+        last_timestamp timestamptz,
+        PRIMARY KEY (symbol, interval)
+    );
+'''
+
+# Cross-symbol time-range index; built by create() only with a new kline_data
+# and by migrate(), never over an existing table at startup
+BRIN_INDEX_SQL = 'CREATE INDEX IF NOT EXISTS kline_data_timestamp_brin ON kline_data USING brin (timestamp)'
+
+
+def month_starts(start, end):
+    """First instants of every calendar month overlapping [start, end] (naive UTC)"""
+    first = pd.Timestamp(start).to_period('M')
+    last = pd.Timestamp(end).to_period('M')
+    return [period.to_timestamp() for period in pd.period_range(first, last, freq='M')]
+
+
+def partition_name(month):
+    """Table name of the kline_data partition holding `month`"""
+    return f"{PARTITION_PREFIX}{month.year:04d}_{month.month:02d}"
+
+
+class KlineSchema:
+    """
+    Creates and migrates the PostgreSQL tables the collector writes to
+
+    kline_data is range-partitioned by month on timestamp (timestamptz, UTC).
+    Its primary key (symbol, interval, timestamp) serves both the upsert
+    conflict target and the per-pair range scans, and a BRIN index on
+    timestamp keeps cross-symbol time-range scans cheap. Partitions are
+    created on demand before a page is written; each upsert and range query
+    then touches only the partitions of its months, however large the table
+    grows.
+    """
+
+    def __init__(self, store):
+        """
+        Parameters:
+        - store: PostgresStore whose transactions the DDL and migration run in
+        """
+        self.store = store
+        # Months whose partition is known to exist, so writes skip the DDL round trip
+        self._months = set()
+        self._lock = threading.Lock()
+        self.partitioned = None
+
+    def _table_kind(self, cursor, table):
+        """pg_class.relkind of a table on the search_path ('r' plain, 'p' partitioned), or None"""
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def create(self):
+        """
+        Create kline_data and last_updates if they do not exist
+
+        An existing kline_data that is not partitioned is left alone (writes
+        go to it as before, and no index is built on it) until `migrate`
+        converts it.
+
+        Returns:
+            True if kline_data is partitioned
+        """
+        with self.store.transaction() as cursor:
+            created = self._table_kind(cursor, 'kline_data') is None
+            cursor.execute(SCHEMA_SQL)
+            if created:
+                cursor.execute(BRIN_INDEX_SQL)
+            self.partitioned = self._table_kind(cursor, 'kline_data') == 'p'
+        if not self.partitioned:
+            print("kline_data is not partitioned; run `python main.py --migrate` to convert it")
+        return self.partitioned
+
+    def _partition_sql(self, cursor, month):
+        """Render CREATE TABLE for the partition of one month"""
+        upper = month + pd.DateOffset(months=1)
+        return cursor.mogrify(f'''
+            CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF kline_data
+                FOR VALUES FROM (%s::timestamp AT TIME ZONE 'UTC') TO (%s::timestamp AT TIME ZONE 'UTC');
+        ''', (month.to_pydatetime(), upper.to_pydatetime()))
+
+    def ensure_partitions(self, start, end):
+        """
+        Make sure the partitions of every month in [start, end] exist
+
+        Runs in its own short transaction, serialised across processes by an
+        advisory lock, so concurrent writers never race on the DDL. Months
+        already seen by this process cost nothing.
+        """
+        if self.partitioned is None:
+            self.create()
+        if not self.partitioned:
+            return
+
+        months = [month for month in month_starts(start, end) if month not in self._months]
+        if not months:
+            return
+        with self._lock:
+            with self.store.transaction() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext('kline_data_partitions'))")
+                cursor.execute(b''.join(self._partition_sql(cursor, month) for month in months))
+            self._months.update(months)
+
+    def migrate(self, drop_legacy=True):
+        """
+        Convert an existing kline_data/last_updates to the managed layout
+
+        A plain kline_data (with timestamp or text timestamps and any numeric
+        or text value columns) is renamed to kline_data_legacy, the
+        partitioned table is created, and rows are copied over one month per
+        transaction, casting to timestamptz (read as UTC) and double
+        precision; duplicate keys keep the first copy. last_updates is
+        converted in place, and the BRIN index is created on the partitioned
+        table before rows are copied. Interrupted runs can be resumed: months
+        are upserted, and a leftover legacy table is picked up again.
+
+        Returns:
+            Number of rows copied
+        """
+        with self.store.transaction() as cursor:
+            kind = self._table_kind(cursor, 'kline_data')
+            if kind == 'r':
+                cursor.execute(f"ALTER TABLE kline_data RENAME TO {LEGACY_TABLE}")
+                # The old unique constraint's index keeps its name; free it for the new table
+                cursor.execute("""
+                    SELECT indexrelid::regclass::text FROM pg_index
+                    WHERE indrelid = to_regclass(%s)
+                """, (LEGACY_TABLE,))
+                for (index,) in cursor.fetchall():
+                    if not index.startswith(LEGACY_TABLE):
+                        cursor.execute(f"ALTER INDEX {index} RENAME TO {LEGACY_TABLE}_{index.split('.')[-1]}")
+            legacy = self._table_kind(cursor, LEGACY_TABLE) is not None
+
+            cursor.execute('''
+                SELECT data_type FROM information_schema.columns
+                WHERE table_name = 'last_updates' AND column_name = 'last_timestamp'
+                  AND table_schema = current_schema()
+            ''')
+            row = cursor.fetchone()
+            if row and row[0] != 'timestamp with time zone':
+                cursor.execute('''
+                    ALTER TABLE last_updates ALTER COLUMN last_timestamp TYPE timestamptz
+                        USING last_timestamp::timestamp AT TIME ZONE 'UTC'
+                ''')
+                print("Converted last_updates.last_timestamp to timestamptz")
+
+        self.partitioned = None
+        self._months.clear()
+        self.create()
+        with self.store.transaction() as cursor:
+            cursor.execute(BRIN_INDEX_SQL)
+        if not legacy:
+            print("kline_data already uses the managed layout")
+            return 0
+
+        with self.store.transaction() as cursor:
+            cursor.execute(f"SELECT min(timestamp::timestamp), max(timestamp::timestamp) FROM {LEGACY_TABLE}")
+            first, last = cursor.fetchone()
+
+        copied = 0
+        if first is not None:
+            self.ensure_partitions(first, last)
+            for month in month_starts(first, last):
+                upper = month + pd.DateOffset(months=1)
+                with self.store.transaction() as cursor:
+                    cursor.execute(f'''
+                        INSERT INTO kline_data (symbol, interval, timestamp, open, high, low, close,
+                                                volume, quote_volume, trades)
+                        SELECT symbol, interval, timestamp::timestamp AT TIME ZONE 'UTC',
+                               open::double precision, high::double precision, low::double precision,
+                               close::double precision, volume::double precision,
+                               quote_volume::double precision, round(trades::numeric)::bigint
+                        FROM {LEGACY_TABLE}
+                        WHERE timestamp::timestamp >= %s AND timestamp::timestamp < %s
+                        ON CONFLICT (symbol, interval, timestamp) DO NOTHING
+                    ''', (month.to_pydatetime(), upper.to_pydatetime()))
+                    copied += cursor.rowcount
+                print(f"Migrated {month:%Y-%m}: {copied} rows so far")
+
+        if drop_legacy:
+            with self.store.transaction() as cursor:
+                cursor.execute(f"DROP TABLE {LEGACY_TABLE}")
+        print(f"Migration finished: {copied} rows copied into partitioned kline_data")
+        return copied
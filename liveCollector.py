@@ -0,0 +1,162 @@
+import json
+import threading
+import time
+from collections import defaultdict
+import pandas as pd
+import websocket
+
+
+class LiveKlineCollector:
+    """
+    Follows Binance combined kline streams for many symbol/interval pairs over one connection
+
+    Closed candles are buffered and flushed to the database in micro-batches
+    through CryptoDataCollector.store_page. Every time the connection is
+    (re)opened, the gap since each pair's last_updates watermark is backfilled
+    over REST before buffered candles are flushed.
+    """
+
+    def __init__(self, collector, pairs, ws_url="wss://stream.binance.com:9443/stream",
+                 start_date=None, flush_interval=0.5, reconnect_delay=1):
+        """
+        Parameters:
+        - collector: CryptoDataCollector used for REST backfill and storage
+        - pairs: iterable of (symbol, interval) tuples
+        - ws_url: str, combined stream endpoint (point it at a local server for testing)
+        - start_date: str 'YYYY-MM-DD', backfill start for pairs without a watermark
+        - flush_interval: float, seconds between buffer flushes
+        - reconnect_delay: float, seconds to wait before reconnecting
+        """
+        self.collector = collector
+        self.pairs = [(symbol.upper(), interval) for symbol, interval in pairs]
+        self.ws_url = ws_url
+        self.start_date = start_date
+        self.flush_interval = flush_interval
+        self.reconnect_delay = reconnect_delay
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        # Flushing waits while a backfill is running so the watermark only moves forward
+        self._backfill_done = threading.Event()
+        self._backfill_thread = None
+        self._ws = None
+
+    def stream_url(self):
+        """Combined stream URL subscribing to every pair"""
+        streams = '/'.join(f"{symbol.lower()}@kline_{interval}" for symbol, interval in self.pairs)
+        return f"{self.ws_url}?streams={streams}"
+
+    def _parse_candle(self, kline):
+        """Convert a stream kline payload into a get_klines-style row"""
+        return {
+            'timestamp': pd.Timestamp(kline['t'], unit='ms'),
+            'open': float(kline['o']),
+            'high': float(kline['h']),
+            'low': float(kline['l']),
+            'close': float(kline['c']),
+            'volume': float(kline['v']),
+            'close_time': pd.Timestamp(kline['T'], unit='ms'),
+            'quote_volume': float(kline['q']),
+            'trades': int(kline['n']),
+            'taker_buy_base': float(kline['V']),
+            'taker_buy_quote': float(kline['Q']),
+        }
+
+    def _on_message(self, ws, message):
+        """Buffer closed candles; updates of still-open candles are ignored"""
+        try:
+            kline = json.loads(message)['data']['k']
+        except (ValueError, KeyError) as e:
+            print(f"Ignoring unexpected stream message: {e}")
+            return
+        if not kline['x']:
+            return
+
+        with self._buffer_lock:
+            self._buffer.append((kline['s'], kline['i'], self._parse_candle(kline)))
+
+    def _on_open(self, ws):
+        """Backfill every pair from its watermark in the background"""
+        print(f"Connected to {len(self.pairs)} kline streams")
+        if self._backfill_thread is not None and self._backfill_thread.is_alive():
+            return
+        self._backfill_done.clear()
+        self._backfill_thread = threading.Thread(target=self._backfill, daemon=True)
+        self._backfill_thread.start()
+
+    def _backfill(self):
+        """REST-backfill the gap left by a disconnect (or the initial start)"""
+        try:
+            self.collector.collect_many([(symbol, interval, self.start_date) for symbol, interval in self.pairs])
+        finally:
+            self._backfill_done.set()
+
+    def _on_error(self, ws, error):
+        print(f"WebSocket error: {error}")
+
+    def _on_close(self, ws, status_code, message):
+        print(f"WebSocket closed ({status_code}): {message}")
+
+    def flush(self):
+        """
+        Write buffered candles, one store_page call per symbol/interval pair
+
+        Pairs that fail to store are put back in the buffer and retried on the
+        next flush.
+        """
+        with self._buffer_lock:
+            pending, self._buffer = self._buffer, []
+        if not pending:
+            return 0
+
+        grouped = defaultdict(list)
+        for symbol, interval, candle in pending:
+            grouped[(symbol, interval)].append(candle)
+
+        stored = 0
+        for (symbol, interval), candles in grouped.items():
+            df = pd.DataFrame(candles).drop_duplicates('timestamp', keep='last').sort_values('timestamp')
+            try:
+                self.collector.store_page(df, symbol, interval)
+                stored += len(df)
+            except Exception as e:
+                self.collector._record_error('flush', e, symbol, interval)
+                with self._buffer_lock:
+                    self._buffer[:0] = [(symbol, interval, candle) for candle in candles]
+        return stored
+
+    def _flush_loop(self):
+        """Flush the buffer every flush_interval until the collector stops"""
+        while self.collector.is_running:
+            time.sleep(self.flush_interval)
+            if self._backfill_done.is_set():
+                self.flush()
+
+        # Shutting down: close the socket so run_forever returns
+        if self._ws is not None:
+            self._ws.close()
+
+    def run(self):
+        """Stream until the collector is stopped, reconnecting (and backfilling) after drops"""
+        print(f"Starting live collection for {len(self.pairs)} pairs")
+        print("Press Ctrl+C to stop collecting...")
+
+        flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        flusher.start()
+
+        while self.collector.is_running:
+            self._ws = websocket.WebSocketApp(
+                self.stream_url(),
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+            )
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+            if self.collector.is_running:
+                time.sleep(self.reconnect_delay)
+
+        flusher.join()
+        self._backfill_done.wait()
+        self.flush()
+        print("Live collection stopped gracefully")
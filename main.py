@@ -1,16 +1,80 @@
 from dataCollection import CryptoDataCollector
+from liveCollector import LiveKlineCollector
+from gapScanner import GapScanner
+from featureEngine import IncrementalFeatureEngine
+from tradeCollector import AggTradeCollector
+from marketSnapshots import MarketSnapshotCollector
+from metrics import configure_logging, start_metrics_server
+from storage import open_store
 import argparse
 
 parser = argparse.ArgumentParser(description='Crypto Trading Bot')
-parser.add_argument('--interval', default='1h', help='Trading interval')
-parser.add_argument('--symbol', default='BTCUSDT', help='Trading pair symbol')
+parser.add_argument('--interval', nargs='+', default=['1h'], help='Trading interval(s)')
+parser.add_argument('--symbol', nargs='+', default=['BTCUSDT'], help='Trading pair symbol(s)')
 parser.add_argument('--start-date', default='2018-01-01', help='Date from which to start collecting data' )
+parser.add_argument('--live', action='store_true', help='Follow the WebSocket kline streams after backfilling')
+parser.add_argument('--fill-gaps', action='store_true', help='Scan stored klines for missing candles and refill them')
+parser.add_argument('--workers', type=int, default=8, help='Number of symbol/interval jobs fetched concurrently')
+parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port at /metrics')
+parser.add_argument('--derive', nargs='+', default=[], help='Intervals built locally from 1m candles instead of fetched (e.g. 5m 1h 1d)')
+parser.add_argument('--agg-trades', action='store_true', help='Backfill aggregate trades for the symbols instead of klines')
+parser.add_argument('--snapshots', nargs='*', metavar='SYMBOL', help='Store bulk 24h ticker snapshots of these symbols (all symbols if none are given)')
+parser.add_argument('--snapshot-period', type=int, default=60, help='Seconds between ticker snapshots')
+parser.add_argument('--migrate', action='store_true', help='Convert existing kline_data/last_updates to the partitioned layout and exit')
+parser.add_argument('--store', default='postgresql', help='Where klines are stored: postgresql, a SQLite file or a Parquet directory (non-PostgreSQL stores support plain and --live collection only)')
+parser.add_argument('--json-logs', action='store_true', help='Log collector events as JSON lines on stderr')
 
 args = parser.parse_args()
+store = open_store(args.store)
+if getattr(store, 'schema', None) is None:
+    # These modes run SQL against PostgreSQL-only tables through the collector's transactions
+    postgres_only = {'--migrate': args.migrate, '--snapshots': args.snapshots is not None,
+                     '--agg-trades': args.agg_trades, '--fill-gaps': args.fill_gaps, '--derive': bool(args.derive)}
+    for option, used in postgres_only.items():
+        if used:
+            parser.error(f"{option} needs a PostgreSQL store and does not apply to --store {args.store}")
+
+configure_logging(json_logs=args.json_logs)
+if args.metrics_port:
+    start_metrics_server(args.metrics_port)
+
+# Derived intervals are built from 1m candles, so 1m is fetched instead of them
+intervals = args.interval
+if args.derive:
+    intervals = ['1m'] + [interval for interval in args.interval if interval not in args.derive and interval != '1m']
+
+# One job per symbol/interval combination
+jobs = [(symbol, interval, args.start_date) for symbol in args.symbol for interval in intervals]
 
 #initialize collector
-collector = CryptoDataCollector()
+collector = CryptoDataCollector(derived_intervals=args.derive, store=store)
 try:
-    collector.collect_data(interval=args.interval, symbol=args.symbol, start_date=args.start_date)
+    if args.migrate:
+        collector.schema.migrate()
+    else:
+        if collector.schema is not None:
+            collector.schema.create()
+
+        # Bring derived candles up to date with 1m rows stored before derivation was enabled
+        for symbol in args.symbol:
+            for interval in args.derive:
+                collector.aggregator.update(symbol, interval)
+
+        if args.snapshots is not None:
+            MarketSnapshotCollector(collector, symbols=args.snapshots, period_seconds=args.snapshot_period).run()
+        elif args.agg_trades:
+            AggTradeCollector(collector).backfill_many(args.symbol, start_date=args.start_date, max_workers=args.workers)
+        elif args.fill_gaps:
+            pairs = [(symbol, interval) for symbol, interval, _ in jobs]
+            scanner = GapScanner(collector)
+            IncrementalFeatureEngine(collector.store).attach(scanner)
+            scanner.fill(pairs, start=args.start_date, max_workers=args.workers)
+        elif args.live:
+            pairs = [(symbol, interval) for symbol, interval, _ in jobs]
+            LiveKlineCollector(collector, pairs, start_date=args.start_date).run()
+        else:
+            collector.collect_many(jobs, max_workers=args.workers)
 except KeyboardInterrupt:
     print("Collection stopped by user")
+finally:
+    collector.close()
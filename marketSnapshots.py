@@ -0,0 +1,151 @@
+import io
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import metrics
+from binanceClient import TICKER_FIELDS
+
+
+# ticker_snapshots columns besides snapshot_time, in storage order
+SNAPSHOT_COLUMNS = [name for name, _ in TICKER_FIELDS.values()]
+
+
+class MarketSnapshotCollector:
+    """
+    Appends cross-sectional 24h ticker snapshots to the ticker_snapshots table
+
+    Every tick fetches all symbols (or a fixed list) with one bulk
+    /ticker/24hr request, so a whole-market snapshot costs 80 weight instead
+    of two per symbol. Snapshots are stamped with their scheduled time,
+    aligned to multiples of the period, so rows from different symbols line
+    up exactly, and are written with COPY in batches of `flush_every`
+    snapshots.
+    """
+
+    def __init__(self, collector, symbols=None, period_seconds=60, flush_every=1):
+        """
+        Parameters:
+        - collector: CryptoDataCollector providing the HTTP client, pool and shutdown flag
+        - symbols: list of str, pairs to snapshot; None snapshots the whole market
+        - period_seconds: int, seconds between snapshots
+        - flush_every: int, snapshots buffered before they are written
+        """
+        self.collector = collector
+        self.symbols = [symbol.upper() for symbol in symbols] if symbols else None
+        self.period_seconds = period_seconds
+        self.flush_every = flush_every
+        self._pending = []
+
+    def ensure_tables(self):
+        """Create the ticker_snapshots table if it does not exist"""
+        with self.collector._transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS ticker_snapshots (
+                    snapshot_time timestamptz NOT NULL,
+                    symbol text NOT NULL,
+                    last_price double precision,
+                    open_price double precision,
+                    high_price double precision,
+                    low_price double precision,
+                    weighted_avg_price double precision,
+                    price_change_percent double precision,
+                    bid_price double precision,
+                    ask_price double precision,
+                    volume double precision,
+                    quote_volume double precision,
+                    trades bigint,
+                    open_time timestamptz,
+                    close_time timestamptz,
+                    PRIMARY KEY (snapshot_time, symbol)
+                );
+                CREATE INDEX IF NOT EXISTS ticker_snapshots_symbol_time
+                    ON ticker_snapshots (symbol, snapshot_time);
+            ''')
+
+    def snapshot(self, snapshot_time=None):
+        """
+        Fetch one snapshot and queue it for writing
+
+        Returns:
+            Number of symbols in the snapshot (0 if the request failed)
+        """
+        tickers = self.collector.get_24h_tickers(self.symbols)
+        if tickers is None or not len(tickers['symbol']):
+            return 0
+        if snapshot_time is None:
+            snapshot_time = pd.Timestamp.now(tz='UTC').tz_localize(None)
+
+        frame = pd.DataFrame(tickers, copy=False)
+        for column in ('open_time', 'close_time'):
+            frame[column] = frame[column].to_numpy().astype('datetime64[ms]')
+        frame.insert(0, 'snapshot_time', np.datetime64(snapshot_time, 'ms'))
+        self._pending.append(frame)
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+        return len(frame)
+
+    def flush(self):
+        """Write every queued snapshot with one COPY; returns the number of rows written"""
+        if not self._pending:
+            return 0
+        frame = pd.concat(self._pending, ignore_index=True)
+        self._pending = []
+
+        buffer = io.StringIO()
+        frame.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S.%f')
+        buffer.seek(0)
+
+        columns = ','.join(['snapshot_time'] + SNAPSHOT_COLUMNS)
+        try:
+            with self.collector._transaction(interval='ticker') as cursor:
+                cursor.execute('''
+                    CREATE TEMP TABLE IF NOT EXISTS ticker_staging
+                        (LIKE ticker_snapshots INCLUDING DEFAULTS)
+                    ON COMMIT DELETE ROWS
+                ''')
+                cursor.copy_expert(f"COPY ticker_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+                cursor.execute(f'''
+                    INSERT INTO ticker_snapshots ({columns})
+                    SELECT {columns} FROM ticker_staging
+                    ON CONFLICT (snapshot_time, symbol) DO NOTHING
+                ''')
+        except Exception as e:
+            self.collector._record_error('snapshot_store', e, rows=len(frame))
+            return 0
+
+        metrics.SNAPSHOT_ROWS_INSERTED.inc(len(frame))
+        return len(frame)
+
+    def _sleep_until(self, deadline):
+        """Sleep until a wall-clock time, waking every second to honour shutdown"""
+        while self.collector.is_running:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 1.0))
+
+    def run(self, max_snapshots=None):
+        """
+        Take snapshots every period_seconds until shutdown (or max_snapshots are taken)
+
+        Ticks fall on multiples of the period since the epoch; a tick missed
+        because a request ran long is skipped rather than taken late.
+        """
+        self.ensure_tables()
+        scope = f"{len(self.symbols)} symbols" if self.symbols else "all symbols"
+        print(f"Taking 24h ticker snapshots of {scope} every {self.period_seconds}s")
+
+        taken = 0
+        try:
+            while self.collector.is_running and (max_snapshots is None or taken < max_snapshots):
+                tick = (time.time() // self.period_seconds + 1) * self.period_seconds
+                self._sleep_until(tick)
+                if not self.collector.is_running:
+                    break
+                rows = self.snapshot(pd.Timestamp(tick, unit='s'))
+                taken += 1
+                print(f"{datetime.now()}: Snapshot of {rows} symbols at {pd.Timestamp(tick, unit='s')}")
+        finally:
+            self.flush()
+        return taken
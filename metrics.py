@@ -0,0 +1,304 @@
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Latency buckets in seconds, from a fast local round trip to a slow retried request
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value):
+    """Exposition form of a sample value: exact integers, full-precision floats"""
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Metric:
+    """Base of the metric types: a name, help text and values keyed by label values"""
+
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self):
+        """(suffix, label string, value) tuples in exposition order"""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{self.name}{suffix}{labels} {_format_value(value)}" for suffix, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, e.g. rows inserted"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [('', self._format_labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, e.g. weight used in the current window"""
+
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+    def samples(self):
+        with self._lock:
+            return [('', self._format_labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class LagGauge(Gauge):
+    """
+    Seconds between now and the newest timestamp seen for each label set
+
+    The timestamp is stored and the lag computed when scraped, so a pair
+    that stops advancing shows a steadily growing lag instead of a frozen one.
+    """
+
+    def observe(self, timestamp, **labels):
+        """Record a data timestamp (epoch seconds); older ones never move the watermark back"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = max(self._values.get(key, timestamp), timestamp)
+
+    def value(self, **labels):
+        timestamp = self._values.get(self._key(labels))
+        return None if timestamp is None else time.time() - timestamp
+
+    def samples(self):
+        now = time.time()
+        with self._lock:
+            return [('', self._format_labels(key), now - timestamp)
+                    for key, timestamp in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Distribution of observations in cumulative buckets, e.g. request latency"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        """Context manager observing the wall time of the enclosed block"""
+        return _Timer(self, labels)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.0))
+        return sum(counts)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    samples.append(('_bucket', self._format_labels(key, [('le', le)]), cumulative))
+                samples.append(('_sum', self._format_labels(key), total))
+                samples.append(('_count', self._format_labels(key), cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, **self.labels)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=()):
+        return self._register(Gauge, name, help_text, labels)
+
+    def lag_gauge(self, name, help_text, labels=()):
+        return self._register(LagGauge, name, help_text, labels)
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# Process-wide registry the collector modules record into
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'binance_http_request_seconds', 'Latency of Binance REST requests',
+    ('endpoint', 'symbol', 'interval', 'status'))
+HTTP_RETRIES = REGISTRY.counter(
+    'binance_http_retries_total', 'Binance REST requests retried', ('endpoint', 'reason'))
+REQUEST_WEIGHT = REGISTRY.counter(
+    'binance_request_weight_total', 'Request weight spent on Binance REST calls', ('endpoint',))
+USED_WEIGHT = REGISTRY.gauge(
+    'binance_used_weight', 'Weight used in the current window as reported by X-MBX-USED-WEIGHT')
+ROWS_PARSED = REGISTRY.counter(
+    'klines_rows_parsed_total', 'Kline rows parsed from REST responses', ('symbol', 'interval'))
+ROWS_INSERTED = REGISTRY.counter(
+    'klines_rows_inserted_total', 'Kline rows written to kline_data', ('symbol', 'interval'))
+TRADES_PARSED = REGISTRY.counter(
+    'agg_trades_rows_parsed_total', 'Aggregate trades parsed from REST responses', ('symbol',))
+TRADES_INSERTED = REGISTRY.counter(
+    'agg_trades_rows_inserted_total', 'Aggregate trade rows written to agg_trades', ('symbol',))
+SNAPSHOT_ROWS_INSERTED = REGISTRY.counter(
+    'ticker_snapshot_rows_inserted_total', 'Ticker rows written to ticker_snapshots')
+STORE_SECONDS = REGISTRY.histogram(
+    'klines_store_seconds', 'Time to write a page of klines and its watermark', ('symbol', 'interval'))
+DB_COMMIT_SECONDS = REGISTRY.histogram(
+    'db_commit_seconds', 'Latency of database commits, by the pair written (empty labels otherwise)',
+    ('symbol', 'interval'))
+LAG_SECONDS = REGISTRY.lag_gauge(
+    'klines_lag_seconds', 'Seconds between now and the newest stored candle', ('symbol', 'interval'))
+ERRORS = REGISTRY.counter(
+    'collector_errors_total', 'Errors raised while collecting', ('stage', 'symbol', 'interval'))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port, host='0.0.0.0', registry=REGISTRY):
+    """
+    Serve the registry at http://<host>:<port>/metrics from a daemon thread
+
+    Returns the HTTPServer so callers can shut it down.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, event and the event's fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'event': record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Human-readable form of the same records: 'event key=value ...'"""
+
+    def format(self, record):
+        fields = ' '.join(f"{key}={value}" for key, value in getattr(record, 'fields', {}).items())
+        return f"{record.getMessage()} {fields}".rstrip()
+
+
+def log_event(logger, level, event, **fields):
+    """Log `event` with structured fields (rendered as JSON keys by JsonFormatter)"""
+    logger.log(level, event, extra={'fields': fields})
+
+
+def configure_logging(json_logs=False, level=None):
+    """
+    Route collector events to stderr
+
+    Plain mode only shows warnings and errors so it does not repeat the
+    progress lines already printed; JSON mode also emits per-page INFO events.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_logs else KeyValueFormatter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level if level is not None else (logging.INFO if json_logs else logging.WARNING))
@@ -0,0 +1,170 @@
+import threading
+import numpy as np
+import pandas as pd
+from featureEngine import IndicatorState
+from indicators import FEATURE_COLUMNS
+from utils import interval_to_minutes
+
+
+class FeatureRing:
+    """
+    Fixed-size ring of the newest feature rows, readable as one contiguous window
+
+    Every row is written twice, at slot i and i + capacity of a preallocated
+    (2 * capacity, features) array, so the newest `capacity` rows in time
+    order are always the contiguous slice starting at the write position.
+    Appending costs two row writes and reading the window is a view; nothing
+    is allocated after construction.
+    """
+
+    def __init__(self, capacity, n_features, dtype=np.float32):
+        self.capacity = capacity
+        self._buffer = np.full((2 * capacity, n_features), np.nan, dtype=dtype)
+        self._head = 0
+        self.rows = 0
+
+    def append(self, row):
+        self._buffer[self._head] = row
+        self._buffer[self._head + self.capacity] = row
+        self._head = (self._head + 1) % self.capacity
+        self.rows += 1
+
+    def window(self):
+        """
+        Read-only (capacity, features) view of the newest rows, oldest first
+
+        The view is only valid until the next append; copy it to keep it.
+        """
+        view = self._buffer[self._head:self._head + self.capacity]
+        view.flags.writeable = False
+        return view
+
+
+class _PairState:
+    """Indicator state, ring and newest timestamp of one symbol/interval pair"""
+
+    def __init__(self, sequence_length, dtype):
+        self.indicators = IndicatorState()
+        self.ring = FeatureRing(sequence_length, len(FEATURE_COLUMNS), dtype)
+        self.last_timestamp = None
+
+
+class OnlineFeatureService:
+    """
+    In-process feature windows for live inference, updated one candle at a time
+
+    Each tracked pair keeps an IndicatorState, which updates every indicator
+    of TFDataExporter.add_technical_indicators in constant time per candle,
+    and a FeatureRing holding the last `sequence_length` fully warmed-up
+    feature rows (FEATURE_COLUMNS order, like export_to_numpy). Pairs are
+    seeded from the newest `sequence_length + warmup` stored candles and then
+    fed by the collector: attach() registers the service as a page listener,
+    so every page stored by REST backfill or the live stream is applied.
+    Candles at or before a pair's newest timestamp are ignored, so
+    overlapping pages are harmless.
+
+    Recursive indicators (EMAs, Wilder RSI/ATR) converge within the warm-up;
+    OBV is a running total and only differs from a full-history export by a
+    constant offset.
+    """
+
+    def __init__(self, sequence_length=60, warmup=200, dtype=np.float32):
+        """
+        Args:
+            sequence_length: Rows in the window returned by window()
+            warmup: Extra candles replayed when seeding so indicators settle
+            dtype: dtype of the feature rows
+        """
+        self.sequence_length = sequence_length
+        self.warmup = warmup
+        self.dtype = np.dtype(dtype)
+        self._pairs = {}
+        self._lock = threading.Lock()
+
+    def _pair(self, symbol, interval):
+        key = (symbol.upper(), interval)
+        pair = self._pairs.get(key)
+        if pair is None:
+            pair = self._pairs[key] = _PairState(self.sequence_length, self.dtype)
+        return pair
+
+    def update(self, symbol, interval, timestamp, open_, high, low, close, volume, quote_volume, trades):
+        """
+        Apply one closed candle
+
+        Returns:
+            True if the pair's window is complete (see window())
+        """
+        with self._lock:
+            pair = self._pair(symbol, interval)
+            timestamp = pd.Timestamp(timestamp)
+            if pair.last_timestamp is not None and timestamp <= pair.last_timestamp:
+                return pair.ring.rows >= self.sequence_length
+            pair.last_timestamp = timestamp
+
+            values = pair.indicators.update(high, low, close, volume)
+            # Rows still warming up are skipped, like dropna() in the exporter
+            if not any(v != v for v in values):
+                pair.ring.append([open_, high, low, close, volume, quote_volume, trades, *values])
+            return pair.ring.rows >= self.sequence_length
+
+    def update_frame(self, df, symbol, interval):
+        """Apply a page of candles (a get_klines-style DataFrame sorted by timestamp)"""
+        columns = [df[col].to_numpy() for col in ('timestamp', 'open', 'high', 'low', 'close',
+                                                  'volume', 'quote_volume', 'trades')]
+        for timestamp, *values in zip(*columns):
+            self.update(symbol, interval, timestamp, *(float(v) for v in values))
+
+    def on_page(self, df, symbol, interval):
+        """Page listener for CryptoDataCollector: apply pages of tracked pairs"""
+        if (symbol.upper(), interval) in self._pairs:
+            self.update_frame(df, symbol, interval)
+
+    def seed(self, collector, symbol, interval):
+        """
+        Track a pair and warm it up from its newest stored candles
+
+        The candles are read from the collector's store with read_range, from
+        twice `sequence_length + warmup` intervals before the pair's watermark
+        (leaving room for gaps), and the newest of them are replayed.
+
+        Returns:
+            Number of candles replayed
+        """
+        symbol = symbol.upper()
+        count = self.sequence_length + self.warmup
+        last = collector.store.last_timestamp(symbol, interval)
+        start = None
+        if last is not None:
+            start = last - 2 * count * pd.Timedelta(minutes=interval_to_minutes(interval))
+        df = collector.store.read_range(symbol, interval, start=start).tail(count)
+
+        with self._lock:
+            self._pair(symbol, interval)
+        if len(df):
+            self.update_frame(df, symbol, interval)
+        return len(df)
+
+    def attach(self, collector, pairs):
+        """Seed every (symbol, interval) pair and subscribe to the collector's stored pages"""
+        for symbol, interval in pairs:
+            replayed = self.seed(collector, symbol, interval)
+            print(f"Seeded online features for {symbol} ({interval}) from {replayed} candles")
+        collector.add_page_listener(self.on_page)
+
+    def window(self, symbol, interval):
+        """
+        Current (sequence_length, features) window of a pair, without copying
+
+        Returns None until sequence_length warmed-up candles have been seen.
+        The view is read-only and only valid until the pair's next update.
+        """
+        pair = self._pairs.get((symbol.upper(), interval))
+        if pair is None or pair.ring.rows < self.sequence_length:
+            return None
+        return pair.ring.window()
+
+    def last_timestamp(self, symbol, interval):
+        """Open time of the newest candle applied to a pair, or None"""
+        pair = self._pairs.get((symbol.upper(), interval))
+        return None if pair is None else pair.last_timestamp
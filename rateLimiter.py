@@ -0,0 +1,89 @@
+import threading
+import time
+
+
+# Request weight of the Binance REST endpoints used by this project
+# (see https://binance-docs.github.io/apidocs/spot/en/#limits)
+REQUEST_WEIGHTS = {
+    'klines': 2,
+    'trades': 25,
+    'aggTrades': 4,
+    'ticker/24hr': 2,
+}
+
+
+def ticker_24hr_weight(n_symbols=None):
+    """
+    Weight of one /ticker/24hr request for n_symbols symbols (None: the whole market)
+
+    A single symbol and lists of up to 20 cost 2, up to 100 cost 40, and
+    larger lists or the all-market request cost 80.
+    """
+    if n_symbols is None or n_symbols > 100:
+        return 80
+    if n_symbols > 20:
+        return 40
+    return REQUEST_WEIGHTS['ticker/24hr']
+
+
+class WeightRateLimiter:
+    """
+    Token bucket shared by every thread talking to the Binance REST API.
+
+    Tokens are units of request weight. The bucket holds up to `weight_limit`
+    tokens (minus a safety margin) and refills continuously at
+    weight_limit / window_seconds tokens per second. After every response the
+    bucket is reconciled with the weight Binance reports as already used, so
+    requests made by other processes sharing the same IP are accounted for.
+    """
+
+    def __init__(self, weight_limit=6000, window_seconds=60, safety_margin=0.1):
+        self.weight_limit = weight_limit
+        self.capacity = weight_limit * (1 - safety_margin)
+        self.refill_rate = weight_limit / window_seconds
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Add the tokens accumulated since the last refill (lock must be held)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def acquire(self, weight=1):
+        """Block until `weight` tokens are available, then consume them"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.updated_at < self.paused_until:
+                    wait = self.paused_until - self.updated_at
+                elif self.tokens >= weight:
+                    self.tokens -= weight
+                    return
+                else:
+                    wait = (weight - self.tokens) / self.refill_rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hold every caller for `seconds`, e.g. after a 429 with Retry-After"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = min(self.tokens, 0)
+
+    def update_from_headers(self, headers):
+        """
+        Reconcile the bucket with the X-MBX-USED-WEIGHT response header
+
+        Parameters:
+        - headers: mapping of response headers (case-insensitive, as returned by requests)
+        """
+        used = headers.get('X-MBX-USED-WEIGHT-1M') or headers.get('X-MBX-USED-WEIGHT')
+        if used is None:
+            return
+
+        with self._lock:
+            self._refill()
+            # Never hand out more than the server says is left in its window
+            self.tokens = min(self.tokens, self.capacity - int(used))
@@ -0,0 +1,623 @@
+import io
+import itertools
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from psycopg2.pool import ThreadedConnectionPool
+import metrics
+from config import DatabaseConfig
+from klineCache import KlineCache
+from klineSchema import KlineSchema
+from utils import naive_utc
+
+
+# Columns of kline_data filled from a get_klines page (besides symbol and interval)
+KLINE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'quote_volume', 'trades']
+
+# Structured dtype of a kline row, as read by read_range
+KLINE_RECORD = np.dtype([('timestamp', 'datetime64[ms]')] + [(name, np.float64) for name in KLINE_COLUMNS[1:-1]]
+                        + [('trades', np.int64)])
+
+# agg_trades columns read to build trade bars
+AGG_TRADE_READ_COLUMNS = ['time', 'price', 'qty', 'first_trade_id', 'last_trade_id']
+
+# Text layout of timestamps in SQLite (and of watermarks in every backend)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def open_store(location):
+    """
+    Open the kline store a location string names
+
+    - 'postgresql' or 'postgres': PostgreSQL configured by DatabaseConfig (.env)
+    - 'postgresql://...': PostgreSQL at that connection URI
+    - 'parquet:<dir>', or an existing directory: Parquet files under <dir>
+    - 'sqlite:<path>', or any other path: SQLite database file
+
+    A KlineStore instance is returned unchanged.
+    """
+    if isinstance(location, KlineStore):
+        return location
+    location = str(location)
+    if location in ('postgres', 'postgresql'):
+        return PostgresStore()
+    if location.startswith(('postgres://', 'postgresql://')):
+        return PostgresStore(dsn=location)
+    if location.startswith('parquet:'):
+        return ParquetStore(location[len('parquet:'):])
+    if location.startswith('sqlite:'):
+        return SQLiteStore(location[len('sqlite:'):])
+    if os.path.isdir(location):
+        return ParquetStore(location)
+    return SQLiteStore(location)
+
+
+class KlineStore:
+    """
+    Storage interface shared by CryptoDataCollector and TFDataExporter
+
+    Writes are page-sized bulk upserts of kline rows plus the pair's
+    last_updates watermark; reads stream a [start, end) range as chunks of
+    typed records. Each backend implements them with its fastest native
+    mechanism. `location` is a string open_store() turns back into an
+    equivalent store, e.g. in a worker process.
+    """
+
+    location = None
+
+    @property
+    def identity(self):
+        """
+        String naming the stored data itself rather than how to reach it, for
+        keys of caches that may be shared by several stores
+        """
+        return self.location
+
+    def write_page(self, df, symbol, interval, watermark=True, **options):
+        """
+        Upsert a page of klines (a get_klines-style DataFrame) and, by default,
+        advance the pair's watermark to its last timestamp, never backwards
+        """
+        raise NotImplementedError
+
+    def prepare_range(self, start, end):
+        """Get ready for writes with timestamps in [start, end] (e.g. create partitions)"""
+
+    def last_timestamp(self, symbol, interval):
+        """Watermark of a pair as a naive UTC pd.Timestamp, or None"""
+        raise NotImplementedError
+
+    def set_last_timestamp(self, symbol, interval, timestamp):
+        """Overwrite the watermark of a pair"""
+        raise NotImplementedError
+
+    def has_klines(self, symbol, interval):
+        """Whether any kline rows are stored for a pair"""
+        raise NotImplementedError
+
+    def kline_version(self, symbol, interval):
+        """(newest timestamp, row count) of a pair; changes with every append or backfill"""
+        raise NotImplementedError
+
+    def month_counts(self, symbol, interval):
+        """Row count of a pair per UTC calendar month, as {'YYYY-MM': count}"""
+        raise NotImplementedError
+
+    def iter_chunks(self, symbol, interval, record, start=None, end=None, chunk_rows=100000, count=False):
+        """
+        Yield the pair's rows in [start, end), ordered by timestamp, as structured
+        arrays of dtype `record` (fields named after KLINE_COLUMNS) of at most
+        chunk_rows rows. With count=True the row count is yielded first, taken
+        from the same snapshot as the rows.
+        """
+        raise NotImplementedError
+
+    def read_range(self, symbol, interval, start=None, end=None, chunk_rows=100000):
+        """The pair's rows in [start, end) as a DataFrame of KLINE_COLUMNS (naive UTC timestamps)"""
+        chunks = list(self.iter_chunks(symbol, interval, KLINE_RECORD, start, end, chunk_rows=chunk_rows))
+        rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=KLINE_RECORD)
+        return pd.DataFrame({name: rows[name] for name in KLINE_COLUMNS})
+
+    def read_agg_trades(self, symbol, record, start_ms=None, end_ms=None, chunk_rows=100000):
+        """A symbol's aggregate trades with time in [start_ms, end_ms) as one structured array"""
+        raise NotImplementedError(f"{type(self).__name__} does not store aggregate trades")
+
+    def agg_trades_version(self, symbol):
+        """(newest agg_id, trade count) of a symbol's aggregate trades"""
+        raise NotImplementedError(f"{type(self).__name__} does not store aggregate trades")
+
+    def transaction(self, isolation=None, symbol='', interval=''):
+        """
+        Raw SQL transaction; only PostgreSQL-only features (derivation, gap scans, ...) need it
+
+        symbol and interval label the commit latency of writes made for one pair.
+        """
+        raise NotImplementedError(f"This feature needs the PostgreSQL store, not {type(self).__name__}")
+
+    def close(self):
+        """Release connections held by the store"""
+
+
+class PostgresStore(KlineStore):
+    """
+    PostgreSQL kline store: COPY into a staging table merged with one upsert
+
+    Owns the collector's thread-safe connection pool and the managed schema
+    (KlineSchema). Range reads stream through a server-side cursor inside a
+    REPEATABLE READ transaction.
+    """
+
+    def __init__(self, db_config=None, dsn=None):
+        self.db_config = db_config or DatabaseConfig()
+        self.dsn = dsn
+        self.location = dsn or 'postgresql'
+        self.schema = KlineSchema(self)
+        # Connection pool shared by all collection threads, created lazily
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises when exhausted; make extra threads wait instead
+        self._pool_slots = threading.BoundedSemaphore(self.db_config.DB_POOL_MAX)
+
+    @property
+    def identity(self):
+        """The DSN, or the configured database and search_path (no password)"""
+        if self.dsn is not None:
+            return self.dsn
+        config = self.db_config
+        return f"postgresql://{config.DB_USER}@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}" \
+               f"?search_path={config.DB_SCHEMA or ''}"
+
+    def _get_pool(self):
+        """Create the connection pool on first use"""
+        with self._pool_lock:
+            if self._pool is None:
+                if self.dsn is not None:
+                    params = {'dsn': self.dsn, 'options': '-c timezone=UTC'}
+                else:
+                    params = self.db_config.get_connection_dict()
+                self._pool = ThreadedConnectionPool(self.db_config.DB_POOL_MIN, self.db_config.DB_POOL_MAX, **params)
+            return self._pool
+
+    @contextmanager
+    def transaction(self, isolation=None, symbol='', interval=''):
+        """
+        Borrow a pooled connection and run the enclosed statements in one transaction
+
+        Commits on success, rolls back and re-raises on error. The commit is
+        timed in DB_COMMIT_SECONDS under the symbol and interval labels (empty
+        for transactions that are not about one pair).
+        """
+        pool = self._get_pool()
+        with self._pool_slots:
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cursor:
+                    if isolation is not None:
+                        cursor.execute(f"SET TRANSACTION ISOLATION LEVEL {isolation}")
+                    yield cursor
+                with metrics.DB_COMMIT_SECONDS.time(symbol=symbol, interval=interval):
+                    conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                # Broken connections are discarded instead of being handed out again
+                pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+    def insert_klines_sql(self, cursor, df, symbol, interval):
+        """Render a single multi-row INSERT statement for a page of klines"""
+        # Create copy and select needed columns first
+        df_to_store = df[['timestamp', 'open', 'high', 'low', 'close', 'volume',
+                        'quote_volume', 'trades']].copy()
+
+        # Then convert timestamp to string
+        df_to_store['timestamp'] = df_to_store['timestamp'].dt.strftime(TIMESTAMP_FORMAT)
+
+        # psycopg2 cannot adapt NumPy scalars; hand it Python objects
+        df_to_store = df_to_store.apply(lambda x: x.astype(object) if x.name != 'timestamp' else x)
+
+        # Add symbol and interval columns
+        df_to_store['symbol'] = symbol
+        df_to_store['interval'] = interval
+
+        records = df_to_store.to_records(index=False)
+
+        row_template = '(' + ','.join(['%s'] * len(df_to_store.columns)) + ')'
+        values = b','.join(cursor.mogrify(row_template, tuple(record)) for record in records)
+        return f"INSERT INTO kline_data ({','.join(df_to_store.columns)}) VALUES ".encode() + values + b';'
+
+    def copy_klines_sql(self, cursor, df, symbol, interval):
+        """
+        Stream a page of klines into a staging table with COPY and render its merge into kline_data
+
+        Values are written with full float precision, and rows that already exist
+        for (symbol, interval, timestamp) are overwritten, so re-collecting a
+        range never creates duplicates.
+        """
+        buffer = io.StringIO()
+        df[KLINE_COLUMNS].assign(symbol=symbol, interval=interval).to_csv(
+            buffer, index=False, header=False, date_format=TIMESTAMP_FORMAT
+        )
+        buffer.seek(0)
+
+        # One staging table per pooled connection, emptied at every commit
+        cursor.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS kline_staging
+                (LIKE kline_data INCLUDING DEFAULTS)
+            ON COMMIT DELETE ROWS
+        ''')
+        columns = ','.join(KLINE_COLUMNS + ['symbol', 'interval'])
+        cursor.copy_expert(f"COPY kline_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+        updates = ', '.join(f"{col} = excluded.{col}" for col in KLINE_COLUMNS[1:])
+        return f'''
+            INSERT INTO kline_data ({columns})
+            SELECT {columns} FROM kline_staging
+            ON CONFLICT (symbol, interval, timestamp)
+            DO UPDATE SET {updates};
+        '''.encode()
+
+    def last_time_sql(self, cursor, symbol, interval, timestamp, monotonic=False):
+        """
+        Render the upsert of the last stored timestamp for a symbol/interval pair
+
+        With monotonic=True the watermark is never moved backwards, so pages
+        written out of order (live stream vs. REST backfill) cannot rewind it.
+        """
+        if isinstance(timestamp, pd.Timestamp):
+            timestamp = timestamp.strftime(TIMESTAMP_FORMAT)
+
+        new_value = 'GREATEST(last_updates.last_timestamp, excluded.last_timestamp)' if monotonic else 'excluded.last_timestamp'
+        return cursor.mogrify(f'''
+            INSERT INTO
+                last_updates (symbol, interval, last_timestamp)
+            VALUES
+                (%s, %s, %s)
+            ON CONFLICT
+                (symbol, interval)
+            DO UPDATE SET
+                last_timestamp = {new_value};
+        ''', (symbol, interval, timestamp))
+
+    def write_page(self, df, symbol, interval, watermark=True, method='copy', extra_sql=None):
+        """
+        Args:
+            method: 'copy' for COPY + upsert, 'insert' for the plain multi-row INSERT
+            extra_sql: Optional callable(cursor) rendering statements to run in
+                       the same transaction (e.g. derived candles)
+        """
+        with self.transaction(symbol=symbol, interval=interval) as cursor:
+            if method == 'copy':
+                sql = self.copy_klines_sql(cursor, df, symbol, interval)
+            else:
+                sql = self.insert_klines_sql(cursor, df, symbol, interval)
+            if watermark:
+                sql += self.last_time_sql(cursor, symbol, interval, df['timestamp'].iloc[-1], monotonic=True)
+            if extra_sql is not None:
+                sql += extra_sql(cursor)
+            cursor.execute(sql)
+
+    def prepare_range(self, start, end):
+        self.schema.ensure_partitions(start, end)
+
+    def last_timestamp(self, symbol, interval):
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT last_timestamp
+                FROM last_updates
+                WHERE symbol = %s AND interval = %s
+            ''', (symbol, interval))
+            result = cursor.fetchone()
+        return naive_utc(result[0]) if result else None
+
+    def set_last_timestamp(self, symbol, interval, timestamp):
+        with self.transaction() as cursor:
+            cursor.execute(self.last_time_sql(cursor, symbol, interval, timestamp))
+
+    def has_klines(self, symbol, interval):
+        with self.transaction() as cursor:
+            cursor.execute("SELECT 1 FROM kline_data WHERE symbol = %s AND interval = %s LIMIT 1", (symbol, interval))
+            return cursor.fetchone() is not None
+
+    def kline_version(self, symbol, interval):
+        with self.transaction() as cursor:
+            cursor.execute("SELECT max(timestamp), count(*) FROM kline_data WHERE symbol = %s AND interval = %s",
+                           (symbol, interval))
+            return cursor.fetchone()
+
+    def month_counts(self, symbol, interval):
+        with self.transaction() as cursor:
+            cursor.execute('''
+                SELECT to_char(timestamp AT TIME ZONE 'UTC', 'YYYY-MM') AS month, count(*)
+                FROM kline_data
+                WHERE symbol = %s AND interval = %s
+                GROUP BY month
+            ''', (symbol, interval))
+            return dict(cursor.fetchall())
+
+    def _stream(self, cursor, query, params, record, chunk_rows):
+        """Run query on a server-side cursor of the same connection and yield structured chunks"""
+        with cursor.connection.cursor(name='kline_store_read') as rows:
+            rows.itersize = chunk_rows
+            rows.execute(query, params)
+            while True:
+                chunk = np.fromiter(itertools.islice(rows, chunk_rows), dtype=record)
+                if not len(chunk):
+                    break
+                yield chunk
+
+    def iter_chunks(self, symbol, interval, record, start=None, end=None, chunk_rows=100000, count=False):
+        where = '''
+            WHERE symbol = %(symbol)s AND interval = %(interval)s
+              AND (%(start)s::timestamptz IS NULL OR timestamp >= %(start)s::timestamptz)
+              AND (%(end)s::timestamptz IS NULL OR timestamp < %(end)s::timestamptz)
+        '''
+        params = {
+            'symbol': symbol, 'interval': interval,
+            'start': pd.Timestamp(start).to_pydatetime() if start is not None else None,
+            'end': pd.Timestamp(end).to_pydatetime() if end is not None else None,
+        }
+        # Timestamps leave the server as naive UTC, which NumPy parses directly
+        columns = ', '.join("timestamp AT TIME ZONE 'UTC'" if name == 'timestamp' else name
+                            for name in record.names)
+        with self.transaction(isolation='REPEATABLE READ') as cursor:
+            if count:
+                cursor.execute(f"SELECT count(*) FROM kline_data {where}", params)
+                yield cursor.fetchone()[0]
+            yield from self._stream(cursor, f"SELECT {columns} FROM kline_data {where} ORDER BY timestamp",
+                                    params, record, chunk_rows)
+
+    def read_agg_trades(self, symbol, record, start_ms=None, end_ms=None, chunk_rows=100000):
+        with self.transaction() as cursor:
+            chunks = list(self._stream(cursor, f'''
+                SELECT {', '.join(record.names)}
+                FROM agg_trades
+                WHERE symbol = %(symbol)s
+                  AND (%(start)s::bigint IS NULL OR time >= %(start)s::bigint)
+                  AND (%(end)s::bigint IS NULL OR time < %(end)s::bigint)
+                ORDER BY agg_id
+            ''', {'symbol': symbol, 'start': start_ms, 'end': end_ms}, record, chunk_rows))
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=record)
+
+    def agg_trades_version(self, symbol):
+        with self.transaction() as cursor:
+            cursor.execute("SELECT max(agg_id), count(*) FROM agg_trades WHERE symbol = %s", (symbol,))
+            return cursor.fetchone()
+
+
+class SQLiteStore(KlineStore):
+    """
+    SQLite kline store: executemany upserts in WAL mode
+
+    WAL lets exports read while a collector writes. Timestamps are stored as
+    'YYYY-MM-DD HH:MM:SS' text (naive UTC), and range reads parse rows with
+    np.fromiter straight from the cursor.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.location = self.path
+        self._tables_ready = False
+
+    @property
+    def identity(self):
+        """Absolute database path, so a relative path names the same file from any directory"""
+        return self.path if self.path == ':memory:' else os.path.abspath(self.path)
+
+    def _connect(self, **kwargs):
+        conn = sqlite3.connect(self.path, timeout=30, **kwargs)
+        if not self._tables_ready:
+            self._create_tables(conn)
+        return conn
+
+    def _create_tables(self, conn):
+        """Switch the database to WAL and create the tables if they do not exist"""
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS kline_data (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL,
+                volume REAL, quote_volume REAL, trades INTEGER,
+                PRIMARY KEY (symbol, interval, timestamp)
+            );
+            CREATE TABLE IF NOT EXISTS last_updates (
+                symbol TEXT NOT NULL,
+                interval TEXT NOT NULL,
+                last_timestamp TEXT,
+                PRIMARY KEY (symbol, interval)
+            );
+        ''')
+        self._tables_ready = True
+
+    def write_page(self, df, symbol, interval, watermark=True, **options):
+        timestamps = df['timestamp'].dt.strftime(TIMESTAMP_FORMAT)
+        rows = zip(itertools.repeat(symbol), itertools.repeat(interval), timestamps.tolist(),
+                   *(df[col].tolist() for col in KLINE_COLUMNS[1:]))
+        columns = ', '.join(['symbol', 'interval'] + KLINE_COLUMNS)
+        updates = ', '.join(f"{col} = excluded.{col}" for col in KLINE_COLUMNS[1:])
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.executemany(f'''
+                    INSERT INTO kline_data ({columns}) VALUES ({', '.join('?' * (len(KLINE_COLUMNS) + 2))})
+                    ON CONFLICT (symbol, interval, timestamp) DO UPDATE SET {updates}
+                ''', rows)
+                if watermark:
+                    conn.execute('''
+                        INSERT INTO last_updates (symbol, interval, last_timestamp) VALUES (?, ?, ?)
+                        ON CONFLICT (symbol, interval)
+                        DO UPDATE SET last_timestamp = max(coalesce(last_timestamp, excluded.last_timestamp),
+                                                           excluded.last_timestamp)
+                    ''', (symbol, interval, timestamps.iloc[-1]))
+        finally:
+            conn.close()
+
+    def last_timestamp(self, symbol, interval):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT last_timestamp FROM last_updates WHERE symbol = ? AND interval = ?",
+                               (symbol, interval)).fetchone()
+        finally:
+            conn.close()
+        return pd.Timestamp(row[0]) if row and row[0] is not None else None
+
+    def set_last_timestamp(self, symbol, interval, timestamp):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''
+                    INSERT INTO last_updates (symbol, interval, last_timestamp) VALUES (?, ?, ?)
+                    ON CONFLICT (symbol, interval) DO UPDATE SET last_timestamp = excluded.last_timestamp
+                ''', (symbol, interval, pd.Timestamp(timestamp).strftime(TIMESTAMP_FORMAT)))
+        finally:
+            conn.close()
+
+    def has_klines(self, symbol, interval):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT 1 FROM kline_data WHERE symbol = ? AND interval = ? LIMIT 1",
+                                (symbol, interval)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def kline_version(self, symbol, interval):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT max(timestamp), count(*) FROM kline_data WHERE symbol = ? AND interval = ?",
+                                (symbol, interval)).fetchone()
+        finally:
+            conn.close()
+
+    def month_counts(self, symbol, interval):
+        conn = self._connect()
+        try:
+            return dict(conn.execute('''
+                SELECT substr(timestamp, 1, 7) AS month, count(*)
+                FROM kline_data
+                WHERE symbol = ? AND interval = ?
+                GROUP BY month
+            ''', (symbol, interval)).fetchall())
+        finally:
+            conn.close()
+
+    def iter_chunks(self, symbol, interval, record, start=None, end=None, chunk_rows=100000, count=False):
+        conn = self._connect(isolation_level=None)
+        where = """
+            WHERE symbol = ? AND interval = ?
+              AND (? IS NULL OR timestamp >= ?)
+              AND (? IS NULL OR timestamp < ?)
+        """
+        start = pd.Timestamp(start).strftime(TIMESTAMP_FORMAT) if start is not None else None
+        end = pd.Timestamp(end).strftime(TIMESTAMP_FORMAT) if end is not None else None
+        params = (symbol, interval, start, start, end, end)
+
+        try:
+            # One read transaction so the count and the rows see the same snapshot
+            conn.execute("BEGIN")
+            if count:
+                yield conn.execute(f"SELECT count(*) FROM kline_data {where}", params).fetchone()[0]
+
+            cursor = conn.execute(f"""
+                SELECT {', '.join(record.names)}
+                FROM kline_data {where}
+                ORDER BY timestamp
+            """, params)
+            while True:
+                chunk = np.fromiter(itertools.islice(cursor, chunk_rows), dtype=record)
+                if not len(chunk):
+                    break
+                yield chunk
+        finally:
+            conn.close()
+
+
+class ParquetStore(KlineStore):
+    """
+    Parquet kline store: monthly columnar files (the KlineCache layout)
+
+    Range reads open only the overlapping months and the requested columns.
+    Every write rewrites the touched monthly files, so large pages (bulk
+    loads, exports) suit it better than a stream of small live pages.
+    Watermarks are kept in last_updates.json next to the data.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.location = f"parquet:{self.root}"
+        self.cache = KlineCache(self.root)
+        self._lock = threading.Lock()
+
+    @property
+    def identity(self):
+        """Absolute root directory"""
+        return f"parquet:{self.root.resolve()}"
+
+    def _watermarks(self):
+        path = self.root / 'last_updates.json'
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def _save_watermarks(self, watermarks):
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / 'last_updates.json'
+        tmp_path = path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(watermarks, indent=2, sort_keys=True))
+        os.replace(tmp_path, path)
+
+    def write_page(self, df, symbol, interval, watermark=True, **options):
+        with self._lock:
+            self.cache.write(symbol, interval, df)
+            if watermark:
+                watermarks = self._watermarks()
+                key = f"{symbol}/{interval}"
+                last = pd.Timestamp(df['timestamp'].iloc[-1]).strftime(TIMESTAMP_FORMAT)
+                watermarks[key] = max(watermarks.get(key, last), last)
+                self._save_watermarks(watermarks)
+
+    def last_timestamp(self, symbol, interval):
+        value = self._watermarks().get(f"{symbol}/{interval}")
+        return pd.Timestamp(value) if value is not None else None
+
+    def set_last_timestamp(self, symbol, interval, timestamp):
+        with self._lock:
+            watermarks = self._watermarks()
+            watermarks[f"{symbol}/{interval}"] = pd.Timestamp(timestamp).strftime(TIMESTAMP_FORMAT)
+            self._save_watermarks(watermarks)
+
+    def has_klines(self, symbol, interval):
+        return self.cache.last_timestamp(symbol, interval) is not None
+
+    def kline_version(self, symbol, interval):
+        return self.cache.last_timestamp(symbol, interval), self.cache.row_count(symbol, interval)
+
+    def month_counts(self, symbol, interval):
+        return self.cache.month_counts(symbol, interval)
+
+    def iter_chunks(self, symbol, interval, record, start=None, end=None, chunk_rows=100000, count=False):
+        # One monthly file at a time, so memory stays at a month whatever the range
+        columns = [name for name in record.names if name != 'timestamp']
+        if count:
+            yield self.cache.count(symbol, interval, start=start, end=end)
+        for df in self.cache.iter_months(symbol, interval, start=start, end=end, columns=columns):
+            rows = np.empty(len(df), dtype=record)
+            rows['timestamp'] = df.index.to_numpy().astype(record['timestamp'])
+            for name in columns:
+                rows[name] = df[name].to_numpy()
+            del df
+            for offset in range(0, len(rows), chunk_rows):
+                yield rows[offset:offset + chunk_rows]
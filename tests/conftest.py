@@ -0,0 +1,61 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# The modules live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _random_klines(n, start='2021-03-01', seed=0, flat=None, gap=None):
+    """
+    Random-walk klines shaped like CryptoDataCollector.get_klines output
+
+    Args:
+        flat: Optional (start, stop) row range where open and close are frozen
+              at the close before it (high and low still move), as on an
+              illiquid pair quoting around a stale last price
+        gap: Optional (start, stop) row range whose candles are left out,
+             as if they were never collected
+    """
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.0005, n)) * close
+    df = pd.DataFrame({
+        'timestamp': pd.date_range(start, periods=n, freq='1min'),
+        'open': open_,
+        'high': np.maximum(open_, close) + spread,
+        'low': np.minimum(open_, close) - spread,
+        'close': close,
+        'volume': rng.gamma(2.0, 5.0, n),
+        'trades': rng.integers(100, 5000, n),
+    })
+    if flat is not None:
+        rows = slice(flat[0], flat[1] - 1)
+        price = df['close'].iloc[flat[0] - 1]
+        df.loc[rows, ['open', 'close']] = price
+        df.loc[rows, 'high'] = price + spread[flat[0]:flat[1]]
+        df.loc[rows, 'low'] = price - spread[flat[0]:flat[1]]
+    df.insert(6, 'quote_volume', df['volume'] * df['close'])
+    if gap is not None:
+        df = df.drop(index=range(*gap)).reset_index(drop=True)
+    return df
+
+
+@pytest.fixture
+def make_klines():
+    """Factory fixture building random-walk klines, see _random_klines"""
+    return _random_klines
+
+
+@pytest.fixture
+def reference_indicators():
+    """Factory fixture computing a kline frame's indicators through TFDataExporter"""
+    from tfDataExporter import TFDataExporter
+
+    def compute(df, backend='ta'):
+        return TFDataExporter(':memory:', indicator_backend=backend).add_technical_indicators(
+            df.set_index('timestamp'))
+    return compute
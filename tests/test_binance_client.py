@@ -0,0 +1,107 @@
+import types
+import numpy as np
+import pytest
+import requests
+import binanceClient
+from binanceClient import BinanceClient, klines_to_dataframe, parse_klines
+
+# Two /klines rows as Binance sends them: ids and times as ints, values as decimal strings
+PAYLOAD = [
+    [1614556800000, "49500.01", "49650.00", "49400.10", "49600.55", "12.5", 1614556859999,
+     "619500.25", 431, "6.25", "309750.12", "0"],
+    [1614556860000, "49600.55", "49700.00", "49550.00", "49690.00", "8.125", 1614556919999,
+     "403640.63", 215, "4.0", "198760.0", "0"],
+]
+
+
+class FakeLimiter:
+    def __init__(self):
+        self.acquired, self.pauses = [], []
+
+    def acquire(self, weight=1):
+        self.acquired.append(weight)
+
+    def pause(self, seconds):
+        self.pauses.append(seconds)
+
+    def update_from_headers(self, headers):
+        pass
+
+
+def _response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return response
+
+
+def _client(responses, **options):
+    client = BinanceClient(base_url='https://api.test/v3', rate_limiter=FakeLimiter(), **options)
+    queue = list(responses)
+
+    def get(url, params=None, timeout=None):
+        outcome = queue.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    client.session = types.SimpleNamespace(get=get, close=lambda: None)
+    return client
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(binanceClient.time, 'sleep', calls.append)
+    return calls
+
+
+def test_parse_klines_types_every_column():
+    columns = parse_klines(PAYLOAD)
+
+    assert columns['timestamp'].dtype == columns['close_time'].dtype == columns['trades'].dtype == np.int64
+    assert columns['timestamp'].tolist() == [1614556800000, 1614556860000]
+    assert columns['trades'].tolist() == [431, 215]
+    assert columns['close'].dtype == np.float64
+    assert columns['close'].tolist() == [49600.55, 49690.0]
+    assert columns['quote_volume'].tolist() == [619500.25, 403640.63]
+    assert columns['taker_buy_quote'].tolist() == [309750.12, 198760.0]
+
+    df = klines_to_dataframe(columns)
+    assert str(df['timestamp'].iloc[1]) == '2021-03-01 00:01:00'
+    assert str(df['close_time'].iloc[0]) == '2021-03-01 00:00:59.999000'
+
+
+def test_parse_klines_of_an_empty_page():
+    columns = parse_klines([])
+    assert set(columns) == set(parse_klines(PAYLOAD))
+    assert all(len(column) == 0 for column in columns.values())
+    assert klines_to_dataframe(columns).empty
+
+
+def test_retry_after_pauses_the_limiter(sleeps):
+    client = _client([_response(429, {'Retry-After': '7'}), _response(200)])
+    assert client.get('klines', {'symbol': 'BTCUSDT'}, weight=2).status_code == 200
+    assert client.rate_limiter.pauses == [7.0]
+    assert client.rate_limiter.acquired == [2, 2]
+    assert sleeps == []
+
+
+def test_server_errors_back_off_exponentially(sleeps, monkeypatch):
+    monkeypatch.setattr(binanceClient.random, 'random', lambda: 1.0)
+    client = _client([_response(503), _response(502, {'Retry-After': 'soon'}),
+                      requests.exceptions.ConnectionError(), _response(200)], backoff=0.5, max_backoff=1.5)
+    assert client.get('klines').status_code == 200
+    # An unparsable Retry-After falls back to the backoff, which is capped at max_backoff
+    assert sleeps == [0.5, 1.0, 1.5]
+    assert client.rate_limiter.pauses == []
+
+
+def test_retries_are_exhausted(sleeps):
+    client = _client([_response(500)] * 3, max_retries=2)
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.get('klines')
+    assert len(sleeps) == 2
+
+    client = _client([requests.exceptions.Timeout()] * 2, max_retries=1)
+    with pytest.raises(requests.exceptions.Timeout):
+        client.get('klines')
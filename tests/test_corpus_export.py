@@ -0,0 +1,20 @@
+import json
+from storage import SQLiteStore
+from tfDataExporter import TFDataExporter
+
+
+def test_export_corpus_records_empty_pairs(tmp_path, make_klines):
+    store = SQLiteStore(tmp_path / 'klines.db')
+    store.write_page(make_klines(600), 'BTCUSDT', '1m')
+    store.write_page(make_klines(80, seed=1), 'ETHUSDT', '1m')
+
+    exporter = TFDataExporter(store.location, indicator_backend='numpy')
+    manifest_path = exporter.export_corpus([('BTCUSDT', '1m'), ('ETHUSDT', '1m'), ('XRPUSDT', '1m')],
+                                           tmp_path / 'corpus', sequence_length=40, max_workers=2)
+    manifest = json.loads(manifest_path.read_text())
+
+    assert [(entry['symbol'], entry['interval']) for entry in manifest['pairs']] == [('BTCUSDT', '1m')]
+    assert manifest['windows'] == manifest['pairs'][0]['windows'] > 0
+    assert [(entry['symbol'], entry['rows']) for entry in manifest['skipped']] == [('ETHUSDT', 31), ('XRPUSDT', 0)]
+    assert manifest['skipped'][1]['reason'] == 'no data'
+    assert manifest['failed'] == []
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+from datasetPrep import WindowView, range_moments, walk_forward_splits
+from utils import sliding_windows
+
+
+@pytest.mark.parametrize('normalization', [None, 'zscore', 'relative'])
+def test_window_view_integer_index_matches_slice(normalization):
+    rng = np.random.default_rng(0)
+    matrix = (100 + rng.normal(0, 1, (200, 5)).cumsum(axis=0)).astype(np.float32)
+    windows, targets = sliding_windows(matrix, 20, target_idx=3)
+    (mean, std), = range_moments(matrix, [(0, 150)])
+    view = WindowView(windows, targets, 3, normalization, mean, std, relative_idx=[0, 3])
+
+    X, y = view[7]
+    assert X.shape == (20, 5) and np.ndim(y) == 0
+    X_batch, y_batch = view[7:8]
+    assert np.array_equal(X, X_batch[0]) and y == y_batch[0]
+    assert np.array_equal(view[np.int64(-1)][0], view[len(view) - 1:][0][0])
+
+    with pytest.raises(TypeError):
+        view[1.5]
+
+
+def _matrix(rows=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    matrix = (30000 + rng.normal(0, 10, (rows, 5)).cumsum(axis=0)).astype(np.float32)
+    matrix[:, 4] = 7  # a constant column
+    return matrix
+
+
+@pytest.mark.parametrize('train_windows', [None, 200])
+def test_walk_forward_splits_keep_windows_apart(train_windows):
+    n_windows, sequence_length, n_folds = 1000, 30, 4
+    folds = walk_forward_splits(n_windows, sequence_length, n_folds, train_windows=train_windows)
+    block = (n_windows - 2 * sequence_length) // (n_folds + 4)
+
+    assert len(folds) == n_folds and folds[-1]['test'].stop == n_windows
+    for previous, fold in zip(folds, folds[1:]):
+        assert fold['test'].start == previous['test'].stop
+    for fold in folds:
+        train, val, test = fold['train'], fold['val'], fold['test']
+        assert val.stop - val.start == test.stop - test.start == block
+        assert val.start - train.stop == test.start - val.stop == sequence_length
+        if train_windows is not None:
+            assert train.stop - train.start == train_windows
+        else:
+            assert train.start == 0
+        # Rows (inputs and target) read by each range, recomputed from the window definition
+        rows = {name: set((np.arange(part.start, part.stop)[:, None] + np.arange(sequence_length + 1)).ravel())
+                for name, part in fold.items()}
+        assert not rows['train'] & rows['val'] and not rows['val'] & rows['test']
+
+
+def test_walk_forward_splits_reject_too_little_data():
+    with pytest.raises(ValueError):
+        walk_forward_splits(60, 30)
+    with pytest.raises(ValueError):
+        walk_forward_splits(1000, 30, val_windows=400, test_windows=400)
+
+
+def test_range_moments_match_numpy():
+    matrix = _matrix()
+    ranges = [(0, 600), (100, 700), (650, 1000), (333, 334)]
+    # Blocks smaller than the ranges, with boundaries falling inside them
+    for (mean, std), (start, stop) in zip(range_moments(matrix, ranges, chunk_rows=128), ranges):
+        rows = matrix[start:stop].astype(np.float64)
+        expected_std = rows.std(axis=0)
+        expected_std[expected_std == 0] = 1
+        assert np.allclose(mean, rows.mean(axis=0), rtol=1e-12, atol=0)
+        assert np.allclose(std, expected_std, rtol=1e-6, atol=0)
+        assert std[4] == 1
+
+
+@pytest.mark.parametrize('normalization', [None, 'zscore', 'relative'])
+def test_denormalize_targets_undo_the_normalization(normalization):
+    matrix = _matrix()
+    windows, targets = sliding_windows(matrix, 30, target_idx=3)
+    (mean, std), = range_moments(matrix, [(0, 600)])
+    view = WindowView(windows, targets, 3, normalization, mean, std, relative_idx=[0, 1, 2, 3])
+
+    idx = np.array([0, 5, 400, len(view) - 1])
+    _, y = view[idx]
+    if normalization == 'zscore':
+        assert np.allclose(y, (targets[idx] - mean[3]) / std[3], rtol=1e-4)
+    elif normalization == 'relative':
+        assert np.allclose(y, targets[idx] / matrix[idx + 29, 3] - 1, atol=1e-6)
+    assert np.allclose(view.denormalize_targets(y, idx), targets[idx], rtol=1e-6, atol=0)
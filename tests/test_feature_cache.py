@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from featureCache import FeatureCache, frame_bytes
+
+
+def _frame(rows, value=0.0):
+    return pd.DataFrame({'close': np.full(rows, value)},
+                        index=pd.date_range('2021-03-01', periods=rows, freq='1min', name='timestamp'))
+
+
+def test_least_recently_used_frames_are_evicted_first():
+    frames = {key: _frame(100, i) for i, key in enumerate('abc')}
+    cache = FeatureCache(max_bytes=2 * frame_bytes(frames['a']))
+    cache.put('a', frames['a'])
+    cache.put('b', frames['b'])
+    assert cache.get('a') is frames['a']  # 'b' is now the least recently used
+
+    cache.put('c', frames['c'])
+    assert cache.get('b') is None
+    assert cache.get('a') is frames['a'] and cache.get('c') is frames['c']
+    assert cache.nbytes == 2 * frame_bytes(frames['a'])
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_memory_stays_within_the_byte_budget():
+    budget = frame_bytes(_frame(250))
+    cache = FeatureCache(max_bytes=budget)
+    for i, rows in enumerate([100, 100, 40, 200, 30, 300, 10]):
+        cache.put(i, _frame(rows))
+        assert cache.nbytes <= budget
+        assert cache.nbytes == sum(frame_bytes(df) for df in cache._frames.values())
+    # A frame larger than the whole budget is not kept at all, nor does it evict anything
+    assert 5 not in cache._frames and 4 in cache._frames
+
+    cache.put(6, _frame(10, 1.0))
+    assert cache.nbytes == sum(frame_bytes(df) for df in cache._frames.values())
+    cache.clear()
+    assert cache.nbytes == 0 and cache.get(6) is None
+
+
+def test_disk_tier_serves_evicted_and_earlier_frames(tmp_path):
+    pytest.importorskip('pyarrow')
+    df = _frame(100, 2.5)
+    cache = FeatureCache(max_bytes=0, disk_dir=tmp_path)
+    cache.put(('BTCUSDT', '1m', 'default'), df)
+    assert cache.nbytes == 0
+
+    restarted = FeatureCache(disk_dir=tmp_path)
+    cached = restarted.get(('BTCUSDT', '1m', 'default'))
+    pd.testing.assert_frame_equal(cached, df, check_freq=False)
+    assert restarted.disk_hits == 1
+    assert restarted.get(('BTCUSDT', '1m', 'default')) is cached
+    assert restarted.get(('ETHUSDT', '1m', 'default')) is None
+
+
+def test_exporters_sharing_a_disk_tier_keep_their_stores_apart(tmp_path, make_klines):
+    pytest.importorskip('pyarrow')
+    from storage import SQLiteStore
+    from tfDataExporter import TFDataExporter
+
+    closes = []
+    for seed, name in enumerate(('a.db', 'b.db')):
+        # Same pair, row count and newest timestamp, so the same data version
+        SQLiteStore(tmp_path / name).write_page(make_klines(300, seed=seed), 'BTCUSDT', '1m')
+        exporter = TFDataExporter(tmp_path / name, indicator_backend='numpy', feature_cache_dir=tmp_path / 'features')
+        closes.append(exporter.load_features('BTCUSDT', '1m')['close'].to_numpy())
+        assert exporter.feature_cache.disk_hits == 0
+    assert not np.array_equal(*closes)
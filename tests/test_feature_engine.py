@@ -0,0 +1,36 @@
+import json
+import types
+import numpy as np
+import pandas as pd
+import pytest
+from featureEngine import IndicatorState, compute_features
+from indicators import FEATURE_COLUMNS
+
+
+@pytest.mark.parametrize('split', [1500, 1225])
+def test_incremental_features_match_full_recompute(split, make_klines, reference_indicators):
+    # A 40-candle flat stretch (split inside it at 1225) and 10 missing candles
+    df = make_klines(3000, flat=(1200, 1240), gap=(2000, 2010))
+    rows = list(df.itertuples(index=False, name=None))
+
+    first, state = compute_features(rows[:split])
+    # The state is persisted as jsonb between runs, which has no nan
+    state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict(), allow_nan=False)))
+    second, _ = compute_features(rows[split:], state)
+    result = pd.DataFrame(first + second, columns=['timestamp'] + FEATURE_COLUMNS).set_index('timestamp')
+
+    expected = reference_indicators(df)
+
+    assert result.index.equals(expected.index)
+    result, expected = result[FEATURE_COLUMNS].to_numpy(dtype=float), expected[FEATURE_COLUMNS].to_numpy(dtype=float)
+    scale = np.abs(expected).max(axis=0) + 1e-12
+    assert np.max(np.abs(result - expected) / scale) < 1e-8
+
+
+def test_rows_with_infinite_features_are_skipped():
+    outputs = iter([[1.0, 2.0], [float('inf'), 2.0], [1.0, float('-inf')], [1.0, float('nan')], [3.0, 4.0]])
+    state = types.SimpleNamespace(update=lambda high, low, close, volume: next(outputs))
+    rows = [(i, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1) for i in range(5)]
+
+    features, _ = compute_features(rows, state)
+    assert [row[0] for row in features] == [0, 4]
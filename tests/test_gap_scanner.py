@@ -0,0 +1,47 @@
+import types
+import pandas as pd
+from gapScanner import GapScanner, interval_sql
+
+
+def _scanner(errors):
+    collector = types.SimpleNamespace(
+        get_klines=lambda symbol, interval, start_time, end_time: pd.DataFrame({'timestamp': [start_time]}),
+        store_page=lambda df, symbol, interval: None,
+        _record_error=lambda kind, error, symbol, interval, **context: errors.append((kind, symbol)),
+    )
+    scanner = GapScanner(collector)
+    gaps = {'BTCUSDT': [(pd.Timestamp('2021-01-03'), pd.Timestamp('2021-01-03 01:00'), 2),
+                        (pd.Timestamp('2021-01-01'), pd.Timestamp('2021-01-01 05:00'), 6)],
+            'ETHUSDT': []}
+    scanner.find_gaps = lambda symbol, interval, start=None: gaps[symbol]
+    scanner.coverage = lambda symbol, interval: {'rows': 1, 'expected': 1, 'coverage': 1.0,
+                                                 'first': None, 'last': None}
+    return scanner
+
+
+def test_interval_sql():
+    assert interval_sql('15m') == '15 minutes'
+    assert interval_sql('1d') == '1440 minutes'
+    assert interval_sql('1M') == '1 months'
+
+
+def test_page_ranges_split_inclusive_gaps():
+    ranges = list(GapScanner(None)._page_ranges('1h', pd.Timestamp('2021-01-01'), pd.Timestamp('2021-01-01 04:00'),
+                                                page_size=2))
+    assert ranges == [(pd.Timestamp('2021-01-01 00:00'), pd.Timestamp('2021-01-01 01:00')),
+                      (pd.Timestamp('2021-01-01 02:00'), pd.Timestamp('2021-01-01 03:00')),
+                      (pd.Timestamp('2021-01-01 04:00'), pd.Timestamp('2021-01-01 04:00'))]
+
+
+def test_fill_listeners_get_the_first_filled_candle():
+    errors, calls = [], []
+    scanner = _scanner(errors)
+    scanner.add_fill_listener(lambda *args: calls.append(args))
+    scanner.add_fill_listener(lambda *args: 1 / 0)
+
+    report = scanner.fill([('BTCUSDT', '1h'), ('ETHUSDT', '1h')], max_workers=2)
+
+    assert report[('BTCUSDT', '1h')]['filled'] == 2  # one page per gap, one candle per page
+    assert report[('ETHUSDT', '1h')]['first_filled'] is None
+    assert calls == [('BTCUSDT', '1h', pd.Timestamp('2021-01-01'))]
+    assert errors == [('fill_listener', 'BTCUSDT')]
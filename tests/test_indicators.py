@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from indicators import flat_windows
+
+
+def test_flat_windows():
+    x = np.array([1.0, 1.0, 1.0, 2.0, 2.0, 2.0, 2.0])
+    assert flat_windows(x, 3).tolist() == [False, False, True, False, False, True, True]
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_numpy_backend_matches_ta(seed, make_klines, reference_indicators):
+    df = make_klines(3000, seed=seed, flat=(1200, 1240), gap=(2000, 2010))
+    expected = reference_indicators(df, 'ta')
+    result = reference_indicators(df, 'numpy')
+
+    assert result.index.equals(expected.index)
+    assert (result.dtypes == expected.dtypes).all()
+    assert np.isfinite(result.to_numpy(dtype=float)).all()
+    scale = np.abs(expected.to_numpy(dtype=float)).max(axis=0) + 1e-12
+    assert np.max(np.abs(result.to_numpy(dtype=float) - expected.to_numpy(dtype=float)) / scale) < 1e-8
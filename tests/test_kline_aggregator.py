@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from klineAggregator import bucket_start, next_bucket, resample_klines
+
+
+@pytest.mark.parametrize('interval, timestamp, expected', [
+    ('5m', '2021-03-01 00:04:59', '2021-03-01 00:00'),
+    ('4h', '2021-02-28 23:59', '2021-02-28 20:00'),
+    ('1d', '2021-03-01 00:00', '2021-03-01'),
+    # 2021-03-01 is a Monday
+    ('1w', '2021-02-28 23:59', '2021-02-22'),
+    ('1w', '2021-03-01 00:00', '2021-03-01'),
+    ('1w', '2021-03-07 23:59', '2021-03-01'),
+    ('1M', '2021-02-28 23:59', '2021-02-01'),
+    ('1M', '2021-03-01 00:00', '2021-03-01'),
+    ('1M', '2020-12-31 23:59', '2020-12-01'),
+])
+def test_bucket_start(interval, timestamp, expected):
+    assert bucket_start(pd.Timestamp(timestamp), interval) == pd.Timestamp(expected)
+
+
+def test_next_bucket_follows_calendar_months():
+    assert next_bucket(pd.Timestamp('2021-01-01'), '1M') == pd.Timestamp('2021-02-01')
+    assert next_bucket(pd.Timestamp('2021-02-22'), '1w') == pd.Timestamp('2021-03-01')
+
+
+@pytest.mark.parametrize('interval', ['1m', '3M'])
+def test_rejects_intervals_it_cannot_derive(interval):
+    with pytest.raises(ValueError):
+        bucket_start(pd.Timestamp('2021-03-01'), interval)
+
+
+@pytest.mark.parametrize('interval', ['1h', '1w', '1M'])
+def test_resample_across_week_and_month_edges(make_klines, interval):
+    # Tuesday 2021-02-23 to Wednesday 2021-03-10, with a missing stretch
+    df = make_klines(20000, start='2021-02-23', gap=(7000, 7600))
+    result = resample_klines(df, interval)
+
+    starts = bucket_start(pd.DatetimeIndex(df['timestamp']), interval)
+    assert result['timestamp'].tolist() == sorted(set(starts))
+    for row in result.itertuples(index=False):
+        rows = df[starts == row.timestamp]
+        assert row.open == rows['open'].iloc[0] and row.close == rows['close'].iloc[-1]
+        assert row.high == rows['high'].max() and row.low == rows['low'].min()
+        assert np.isclose(row.volume, rows['volume'].sum()) and row.trades == rows['trades'].sum()
+    assert result['trades'].sum() == df['trades'].sum()
+
+
+def test_resample_of_an_empty_frame():
+    df = pd.DataFrame({'timestamp': pd.DatetimeIndex([]), 'close': []})
+    assert resample_klines(df, '1h').empty
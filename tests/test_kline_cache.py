@@ -0,0 +1,59 @@
+import pandas as pd
+from klineCache import KlineCache
+from storage import SQLiteStore
+
+
+def _loader(store):
+    def load(symbol, interval, start, end=None):
+        return store.read_range(symbol, interval, start, end)
+    return load
+
+
+def test_sync_refreshes_backfilled_months(tmp_path, make_klines):
+    store = SQLiteStore(tmp_path / 'klines.db')
+    cache = KlineCache(tmp_path / 'cache')
+    df = make_klines(6000, start='2021-02-26')
+    # February is stored with a hole, March in full
+    store.write_page(pd.concat([df.iloc[:1000], df.iloc[1500:]]), 'BTCUSDT', '1m')
+
+    cache.sync('BTCUSDT', '1m', _loader(store), store.month_counts)
+    assert cache.month_counts('BTCUSDT', '1m') == store.month_counts('BTCUSDT', '1m')
+
+    store.write_page(df.iloc[1000:1500], 'BTCUSDT', '1m', watermark=False)
+    # Without versions only the last month is re-read, so February stays stale
+    cache.sync('BTCUSDT', '1m', _loader(store))
+    assert cache.row_count('BTCUSDT', '1m') == len(df) - 500
+
+    assert cache.sync('BTCUSDT', '1m', _loader(store), store.month_counts) > 0
+    assert cache.month_counts('BTCUSDT', '1m') == store.month_counts('BTCUSDT', '1m')
+    cached = cache.load('BTCUSDT', '1m')
+    assert cached.index.equals(pd.DatetimeIndex(df['timestamp'].astype('datetime64[ms]'), name='timestamp'))
+    assert (cached['close'].to_numpy() == df['close'].to_numpy()).all()
+
+
+def test_sync_reads_nothing_while_the_version_is_unchanged(tmp_path, make_klines):
+    store = SQLiteStore(tmp_path / 'klines.db')
+    cache = KlineCache(tmp_path / 'cache')
+    df = make_klines(6000, start='2021-02-26')
+    store.write_page(pd.concat([df.iloc[:1000], df.iloc[1500:]]), 'BTCUSDT', '1m')
+    calls = []
+
+    def month_counts(symbol, interval):
+        calls.append('month_counts')
+        return store.month_counts(symbol, interval)
+
+    def load(symbol, interval, start, end=None):
+        calls.append('load')
+        return store.read_range(symbol, interval, start, end)
+
+    def sync():
+        calls.clear()
+        return cache.sync('BTCUSDT', '1m', load, month_counts, store.kline_version)
+
+    assert sync() == len(df) - 500
+    assert sync() == 0 and calls == []
+
+    store.write_page(df.iloc[1000:1500], 'BTCUSDT', '1m', watermark=False)
+    assert sync() > 0 and calls[0] == 'month_counts'
+    assert cache.row_count('BTCUSDT', '1m') == len(df)
+    assert sync() == 0 and calls == []
@@ -0,0 +1,73 @@
+import json
+import logging
+import urllib.request
+import pytest
+from metrics import JsonFormatter, MetricsRegistry, start_metrics_server
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    rows = registry.counter('rows_total', 'Rows written', ('symbol', 'interval'))
+    weight = registry.gauge('used_weight', 'Weight used')
+    rows.inc(500, symbol='ETHUSDT', interval='1m')
+    rows.inc(2, symbol='BTCUSDT', interval='1h')
+    rows.inc(3, symbol='BTCUSDT', interval='1h')
+    weight.set(0.25)
+
+    assert registry.render() == (
+        '# HELP rows_total Rows written\n'
+        '# TYPE rows_total counter\n'
+        'rows_total{symbol="BTCUSDT",interval="1h"} 5\n'
+        'rows_total{symbol="ETHUSDT",interval="1m"} 500\n'
+        '# HELP used_weight Weight used\n'
+        '# TYPE used_weight gauge\n'
+        'used_weight 0.25\n'
+    )
+    assert registry.counter('rows_total', 'Ignored on re-registration') is rows
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('request_seconds', 'Latency', ('status',), buckets=(0.5, 0.1, 1))
+    for value in (0.05, 0.1, 0.3, 0.75, 4):
+        latency.observe(value, status=200)
+
+    assert registry.render().splitlines()[2:] == [
+        'request_seconds_bucket{status="200",le="0.1"} 2',
+        'request_seconds_bucket{status="200",le="0.5"} 3',
+        'request_seconds_bucket{status="200",le="1"} 4',
+        'request_seconds_bucket{status="200",le="+Inf"} 5',
+        'request_seconds_sum{status="200"} 5.2',
+        'request_seconds_count{status="200"} 5',
+    ]
+    assert latency.count(status=200) == 5
+
+
+def test_label_values_are_escaped_and_checked():
+    registry = MetricsRegistry()
+    errors = registry.counter('errors_total', 'Errors', ('stage',))
+    errors.inc(stage='say "hi"\\\n')
+    assert registry.render().splitlines()[-1] == r'errors_total{stage="say \"hi\"\\\n"} 1'
+    with pytest.raises(ValueError):
+        errors.inc(symbol='BTCUSDT')
+
+
+def test_metrics_server_serves_the_registry():
+    registry = MetricsRegistry()
+    registry.counter('pages_total', 'Pages').inc(3)
+    server = start_metrics_server(0, host='127.0.0.1', registry=registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert response.read().decode() == registry.render()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_json_log_lines_carry_the_event_fields():
+    record = logging.LogRecord('collector', logging.WARNING, __file__, 1, 'request_retry', None, None)
+    record.fields = {'endpoint': 'klines', 'status': 429}
+    entry = json.loads(JsonFormatter().format(record))
+    assert (entry['level'], entry['event'], entry['endpoint'], entry['status']) == \
+        ('warning', 'request_retry', 'klines', 429)
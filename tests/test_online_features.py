@@ -0,0 +1,22 @@
+import types
+import numpy as np
+from indicators import FEATURE_COLUMNS
+from onlineFeatures import OnlineFeatureService
+from storage import SQLiteStore
+
+
+def test_seed_replays_the_newest_stored_candles(tmp_path, make_klines, reference_indicators):
+    store = SQLiteStore(tmp_path / 'klines.db')
+    df = make_klines(3000, gap=(2900, 2920))
+    store.write_page(df, 'BTCUSDT', '1m')
+
+    service = OnlineFeatureService(sequence_length=60, warmup=200, dtype=np.float64)
+    assert service.seed(types.SimpleNamespace(store=store), 'btcusdt', '1m') == 260
+    assert service.last_timestamp('BTCUSDT', '1m') == df['timestamp'].iloc[-1]
+
+    expected = reference_indicators(df)
+    # Windowed indicators do not depend on history before the warm-up
+    columns = [FEATURE_COLUMNS.index(col) for col in ('sma_50', 'bb_position', 'volume_ratio', 'stoch_k')]
+    window = service.window('BTCUSDT', '1m')[:, columns]
+    expected = expected[FEATURE_COLUMNS].to_numpy()[-60:, columns]
+    assert np.allclose(window, expected, rtol=1e-8, atol=0)
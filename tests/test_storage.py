@@ -0,0 +1,146 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from storage import KLINE_COLUMNS, KLINE_RECORD, ParquetStore, PostgresStore, SQLiteStore
+
+SYMBOL, INTERVAL = 'TESTUSDT', '1m'
+
+
+def _clear_postgres(store):
+    with store.transaction() as cursor:
+        cursor.execute("DELETE FROM kline_data WHERE symbol = %s", (SYMBOL,))
+        cursor.execute("DELETE FROM last_updates WHERE symbol = %s", (SYMBOL,))
+
+
+@pytest.fixture(params=['sqlite', 'parquet', 'postgresql'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        yield SQLiteStore(tmp_path / 'klines.db')
+    elif request.param == 'parquet':
+        yield ParquetStore(tmp_path / 'klines')
+    else:
+        dsn = os.getenv('KLINE_TEST_DSN')
+        if not dsn:
+            pytest.skip("set KLINE_TEST_DSN to run the PostgreSQL store tests")
+        store = PostgresStore(dsn=dsn)
+        store.schema.create()
+        _clear_postgres(store)
+        yield store
+        _clear_postgres(store)
+        store.close()
+
+
+@pytest.fixture
+def klines(make_klines):
+    # Crosses the February/March month boundary (and Parquet file boundary)
+    df = make_klines(6000, start='2021-02-26')
+    df['timestamp'] = df['timestamp'].astype('datetime64[ms]')
+    return df
+
+
+def _write(store, df, **options):
+    store.prepare_range(df['timestamp'].iloc[0], df['timestamp'].iloc[-1])
+    store.write_page(df, SYMBOL, INTERVAL, **options)
+
+
+def _assert_rows_equal(result, expected):
+    expected = expected.reset_index(drop=True)
+    assert result['timestamp'].to_numpy().astype('datetime64[ms]').tolist() == \
+        expected['timestamp'].to_numpy().astype('datetime64[ms]').tolist()
+    for name in KLINE_COLUMNS[1:]:
+        assert np.array_equal(result[name].to_numpy(), expected[name].to_numpy()), name
+
+
+def test_write_page_is_idempotent(store, klines):
+    df = klines
+    pages = [df.iloc[i:i + 1000] for i in range(0, len(df), 1000)]
+    for page in pages:
+        _write(store, page)
+    _write(store, pages[2])
+    _write(store, df)
+
+    assert store.kline_version(SYMBOL, INTERVAL)[1] == len(df)
+    _assert_rows_equal(store.read_range(SYMBOL, INTERVAL), df)
+
+
+def test_watermark_never_moves_backwards(store, klines):
+    df = klines
+    assert store.last_timestamp(SYMBOL, INTERVAL) is None
+
+    _write(store, df.iloc[3000:])
+    _write(store, df.iloc[:3000])
+    assert store.last_timestamp(SYMBOL, INTERVAL) == df['timestamp'].iloc[-1]
+
+    # Writes that leave the watermark alone, and explicit overwrites
+    store.set_last_timestamp(SYMBOL, INTERVAL, df['timestamp'].iloc[100])
+    _write(store, df.iloc[:50], watermark=False)
+    assert store.last_timestamp(SYMBOL, INTERVAL) == df['timestamp'].iloc[100]
+    _write(store, df.iloc[:200])
+    assert store.last_timestamp(SYMBOL, INTERVAL) == df['timestamp'].iloc[199]
+
+
+def test_sqlite_watermark_replaces_null(tmp_path, klines):
+    store = SQLiteStore(tmp_path / 'klines.db')
+    df = klines.iloc[:10]
+    conn = store._connect()
+    with conn:
+        conn.execute("INSERT INTO last_updates VALUES (?, ?, NULL)", (SYMBOL, INTERVAL))
+    conn.close()
+
+    store.write_page(df, SYMBOL, INTERVAL)
+    assert store.last_timestamp(SYMBOL, INTERVAL) == df['timestamp'].iloc[-1]
+
+
+@pytest.mark.parametrize('bounds', [(None, None), (1500, 4500), (None, 2000), (5999, None)])
+def test_read_range_matches_iter_chunks(store, klines, bounds):
+    df = klines
+    _write(store, df)
+    start, end = (df['timestamp'].iloc[i] if i is not None else None for i in bounds)
+    expected = df.iloc[slice(*bounds)]
+
+    chunks = store.iter_chunks(SYMBOL, INTERVAL, KLINE_RECORD, start, end, chunk_rows=700, count=True)
+    n = next(chunks)
+    chunks = list(chunks)
+    assert all(len(chunk) <= 700 for chunk in chunks)
+    rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=KLINE_RECORD)
+    assert n == len(rows) == len(expected)
+    _assert_rows_equal(pd.DataFrame({name: rows[name] for name in KLINE_COLUMNS}), expected)
+    _assert_rows_equal(store.read_range(SYMBOL, INTERVAL, start, end), expected)
+
+
+def test_read_range_of_unknown_pair_is_empty(store):
+    result = store.read_range('NONEUSDT', INTERVAL)
+    assert result.empty and list(result.columns) == KLINE_COLUMNS
+
+
+def test_versions_change_on_append_and_backfill(store, klines):
+    df = klines
+    assert not store.has_klines(SYMBOL, INTERVAL)
+
+    # Leave a hole in the older (February) month
+    _write(store, pd.concat([df.iloc[:1000], df.iloc[1500:5000]]))
+    assert store.has_klines(SYMBOL, INTERVAL)
+    versions = [store.kline_version(SYMBOL, INTERVAL)]
+
+    _write(store, df.iloc[5000:])
+    versions.append(store.kline_version(SYMBOL, INTERVAL))
+    _write(store, df.iloc[1000:1500], watermark=False)
+    versions.append(store.kline_version(SYMBOL, INTERVAL))
+    _write(store, df.iloc[1000:1500], watermark=False)
+    versions.append(store.kline_version(SYMBOL, INTERVAL))
+
+    assert versions[0] != versions[1] != versions[2]
+    assert versions[2] == versions[3]
+    assert versions[2][1] == len(df)
+    counts = store.month_counts(SYMBOL, INTERVAL)
+    assert counts == df['timestamp'].dt.strftime('%Y-%m').value_counts().to_dict()
+
+
+def test_only_postgres_stores_aggregate_trades(tmp_path):
+    record = np.dtype([('time', np.int64), ('price', np.float64)])
+    for store in (SQLiteStore(tmp_path / 'klines.db'), ParquetStore(tmp_path / 'klines')):
+        with pytest.raises(NotImplementedError):
+            store.agg_trades_version(SYMBOL)
+        with pytest.raises(NotImplementedError):
+            store.read_agg_trades(SYMBOL, record)
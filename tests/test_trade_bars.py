@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+from tradeBars import DAY_MS, bar_ids, is_bar_spec, parse_bar_spec, trades_to_bars
+
+MIDNIGHT = 1614556800000  # 2021-03-01 00:00 UTC
+
+
+def _trades(n, seed=0):
+    """Random aggregated trades over about two days, sorted by time"""
+    rng = np.random.default_rng(seed)
+    time = MIDNIGHT - DAY_MS // 2 + np.sort(rng.integers(0, 2 * DAY_MS, n))
+    covered = rng.integers(1, 6, n)
+    last = np.cumsum(covered)
+    return {
+        'time': time,
+        'price': 30000 * np.exp(np.cumsum(rng.normal(0, 0.0005, n))),
+        'qty': rng.gamma(1.5, 0.2, n),
+        'first_trade_id': last - covered + 1,
+        'last_trade_id': last,
+    }
+
+
+def test_parse_bar_spec():
+    assert parse_bar_spec('time:1h') == ('time', 3600000)
+    assert parse_bar_spec('volume:25.5') == ('volume', 25.5)
+    assert parse_bar_spec('tick:1000') == ('tick', 1000)
+    for spec in ('range:5', 'volume', 'tick:', '1h'):
+        with pytest.raises(ValueError):
+            parse_bar_spec(spec)
+    assert is_bar_spec('tick:1000') and not is_bar_spec('1h')
+
+
+def test_volume_bars_close_on_the_trade_reaching_the_threshold():
+    trades = {'time': MIDNIGHT + np.arange(5), 'qty': np.array([4.0, 6.0, 15.0, 1.0, 3.0])}
+    ids = bar_ids(trades, 'volume:10') - ((MIDNIGHT // DAY_MS) << 32)
+    # Running totals 4, 10, 25, 26, 29: the trade overshooting to 25 opens the 20-30 bar
+    assert ids.tolist() == [0, 0, 2, 2, 2]
+
+
+def test_tick_bars_restart_at_midnight():
+    time = np.array([-3, -2, -1, 0, 1, 2, 3]) * 1000 + MIDNIGHT
+    trades = {'time': time, 'first_trade_id': np.arange(7), 'last_trade_id': np.arange(7)}
+    ids = bar_ids(trades, 'tick:2')
+    day = MIDNIGHT // DAY_MS
+    assert (ids - (time // DAY_MS << 32)).tolist() == [0, 0, 1, 0, 0, 1, 1]
+    assert (ids >> 32).tolist() == [day - 1] * 3 + [day] * 4
+    assert (np.diff(ids) >= 0).all()
+
+
+@pytest.mark.parametrize('spec', ['time:15m', 'volume:3', 'tick:40'])
+def test_trades_to_bars_matches_a_groupby(spec):
+    trades = _trades(5000)
+    bars = trades_to_bars(trades, spec)
+
+    df = pd.DataFrame(trades).assign(bar=bar_ids(trades, spec), quote=lambda d: d['price'] * d['qty'],
+                                     count=lambda d: d['last_trade_id'] - d['first_trade_id'] + 1)
+    expected = df.groupby('bar').agg(first_time=('time', 'first'), open=('price', 'first'), high=('price', 'max'),
+                                     low=('price', 'min'), close=('price', 'last'), volume=('qty', 'sum'),
+                                     quote_volume=('quote', 'sum'), trades=('count', 'sum'))
+    assert len(bars) == len(expected)
+    for name in ('open', 'high', 'low', 'close', 'trades'):
+        assert (bars[name].to_numpy() == expected[name].to_numpy()).all(), name
+    for name in ('volume', 'quote_volume'):
+        assert np.allclose(bars[name].to_numpy(), expected[name].to_numpy(), rtol=1e-12), name
+
+    timestamps = bars['timestamp'].to_numpy().astype(np.int64)
+    if spec.startswith('time'):
+        assert (timestamps % 900000 == 0).all()
+        assert (timestamps <= expected['first_time'].to_numpy()).all()
+    else:
+        assert (timestamps == expected['first_time'].to_numpy()).all()
+
+
+@pytest.mark.parametrize('spec', ['volume:3', 'tick:40'])
+def test_bars_do_not_depend_on_earlier_days(spec):
+    trades = _trades(5000, seed=1)
+    later = {name: column[trades['time'] >= MIDNIGHT] for name, column in trades.items()}
+    bars = trades_to_bars(trades, spec)
+    assert trades_to_bars(later, spec).equals(bars[bars['timestamp'] >= pd.Timestamp(MIDNIGHT, unit='ms')]
+                                              .reset_index(drop=True))
+
+
+def test_no_trades_give_no_bars():
+    empty = {name: np.empty(0) for name in ('time', 'price', 'qty', 'first_trade_id', 'last_trade_id')}
+    assert trades_to_bars(empty, 'tick:10').empty
@@ -1,35 +1,263 @@
 import pandas as pd
 import numpy as np
-import sqlite3
 import ta
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from utils import feature_matrix, sliding_windows
+from indicators import compute_indicators, flat_windows, BASE_COLUMNS, INDICATOR_COLUMNS
+from klineCache import KlineCache
+from featureCache import FeatureCache
+from storage import open_store
+from klineAggregator import BASE_INTERVAL, bucket_start, next_bucket, resample_klines
+from tradeBars import DAY_MS, is_bar_spec, parse_bar_spec, trades_to_bars
+from datasetPrep import PRICE_LEVEL_COLUMNS, WindowView, range_moments, walk_forward_splits
+
+# Price/volume columns of kline_data, loaded with the exporter's float dtype
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'quote_volume']
+
+# Shard file formats written by export_corpus
+CORPUS_FORMATS = {'npz': '.npz', 'tfrecord': '.tfrecord.gz'}
+
+
+def _shard_slices(n_rows, rows_per_shard, sequence_length):
+    """
+    (start, stop) row ranges of the shards a feature matrix is cut into
+
+    Each shard holds rows_per_shard windows: its rows plus the sequence_length
+    rows that follow, so every window and its target lie inside one shard.
+    """
+    n_windows = max(n_rows - sequence_length, 0)
+    return [(start, min(start + rows_per_shard + sequence_length, n_rows))
+            for start in range(0, n_windows, rows_per_shard)]
+
+
+def _export_pair(settings, symbol, interval, *args):
+    """Process pool entry point: write one pair's corpus shards with a fresh exporter"""
+    # A worker's exporter serves one pair, so only the disk tier of the feature cache can pay off
+    return TFDataExporter(**{**settings, 'feature_cache_bytes': 0})._write_pair_shards(symbol, interval, *args)
+
 
 class TFDataExporter:
-    def __init__(self, database_path="crypto_data.db"):
+    def __init__(self, database_path="crypto_data.db", indicator_backend='ta', cache_dir=None,
+                 dtype=None, chunk_rows=100000, feature_cache_bytes=256 * 2**20, feature_cache_dir=None):
+        """
+        Args:
+            database_path: Kline store to read from: a SQLite database path,
+                           'postgresql' (or a postgresql:// URI), or a
+                           Parquet directory (see storage.open_store)
+            indicator_backend: 'ta' for the ta library, 'numpy' for the fused
+                               kernels in indicators.py
+            cache_dir: Optional directory of a Parquet KlineCache; when set, data
+                       is synced into it and loaded from it instead of SQL
+            dtype: Float dtype policy. None loads float64 columns and builds
+                   float32 sequences; np.float32 or np.float64 is applied to
+                   loaded columns, indicators and sequences alike
+            chunk_rows: Rows fetched from the database per chunk
+            feature_cache_bytes: Memory budget of the feature-frame cache (see
+                                 load_features); 0 disables the memory tier
+            feature_cache_dir: Optional directory of its on-disk Parquet tier
+        """
+        if indicator_backend not in ('ta', 'numpy'):
+            raise ValueError(f"Unknown indicator backend: {indicator_backend}")
         self.db_path = database_path
+        self.store = open_store(database_path)
+        self.indicator_backend = indicator_backend
+        self.cache_dir = cache_dir
+        self.cache = KlineCache(cache_dir) if cache_dir is not None else None
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self.chunk_rows = chunk_rows
+        self.feature_cache_bytes = feature_cache_bytes
+        self.feature_cache_dir = feature_cache_dir
+        self.feature_cache = FeatureCache(feature_cache_bytes, feature_cache_dir)
 
-    def fetch_data_to_dataframe(self, symbol, interval):
-        """Fetch all data from database into a pandas DataFrame"""
-        conn = sqlite3.connect(self.db_path)
-        
-        query = """
-            SELECT timestamp, open, high, low, close, volume, quote_volume, trades
-            FROM kline_data
-            WHERE symbol = ? AND interval = ?
-            ORDER BY timestamp
+    def _settings(self):
+        """Constructor arguments reproducing this exporter in a worker process"""
+        return {
+            'database_path': self.store.location,
+            'indicator_backend': self.indicator_backend,
+            'cache_dir': self.cache_dir,
+            'dtype': self.dtype,
+            'chunk_rows': self.chunk_rows,
+            'feature_cache_bytes': self.feature_cache_bytes,
+            'feature_cache_dir': self.feature_cache_dir,
+        }
+
+    def _column_dtype(self):
+        """dtype of loaded price and indicator columns"""
+        return self.dtype if self.dtype is not None else np.dtype(np.float64)
+
+    def _sequence_dtype(self, dtype=None):
+        """dtype of feature matrices: an explicit argument wins, then the policy, then float32"""
+        if dtype is not None:
+            return dtype
+        return self.dtype if self.dtype is not None else np.float32
+
+    def _read_klines(self, symbol, interval, start=None, end=None):
         """
-        
-        df = pd.read_sql_query(query, conn, params=(symbol, interval))
-        conn.close()
-        
-        # Convert timestamp to datetime if needed
-        df['timestamp'] = pd.to_datetime(df['timestamp'])
-        df.set_index('timestamp', inplace=True)
+        Read kline rows in [start, end) from the database
+
+        Intervals with no stored rows are derived from the 1m candles (see
+        _derive_klines), so coarser timeframes need not be collected. Bar
+        specs such as 'volume:50' or 'tick:1000' are built from the stored
+        aggregate trades instead (see _trade_bars).
+        """
+        if is_bar_spec(interval):
+            return self._trade_bars(symbol, interval, start, end)
+        if interval != BASE_INTERVAL and not self._has_klines(symbol, interval):
+            return self._derive_klines(symbol, interval, start, end)
+        return self._query_klines(symbol, interval, start, end)
+
+    def _month_versions(self, symbol, interval):
+        """
+        Per-month row counts of the stored rows an interval is read from, so the
+        cache can spot backfilled months; None for trade bars
+        """
+        if is_bar_spec(interval):
+            return None
+        if interval != BASE_INTERVAL and not self._has_klines(symbol, interval):
+            interval = BASE_INTERVAL
+        return self.store.month_counts(symbol, interval)
+
+    def _has_klines(self, symbol, interval):
+        """Whether any kline rows are stored for a symbol/interval pair"""
+        return self.store.has_klines(symbol, interval)
+
+    def _derive_klines(self, symbol, interval, start=None, end=None):
+        """
+        Build the `interval` candles overlapping [start, end) from the stored 1m rows
+
+        The range is widened to whole candles before reading, so the first and
+        last candles are aggregated from all of their minutes (the first one
+        may open before `start`).
+        """
+        if start is not None:
+            start = bucket_start(pd.Timestamp(start), interval)
+        until = None
+        if end is not None:
+            until = bucket_start(pd.Timestamp(end), interval)
+            if until < pd.Timestamp(end):
+                until = next_bucket(until, interval)
+
+        candles = resample_klines(self._query_klines(symbol, BASE_INTERVAL, start, until), interval)
+        if end is not None:
+            candles = candles[candles['timestamp'] < pd.Timestamp(end)]
+        return candles
+
+    def _trade_bars(self, symbol, spec, start=None, end=None):
+        """
+        Build the bars of a bar spec opening in [start, end) from the stored aggregate trades
+
+        Trades are read from the start of the bar (time bars) or UTC day
+        (volume and tick bars) containing `start`, up to the end of the one
+        containing `end`, so every returned bar is complete and identical to
+        the bar built from the whole history.
+        """
+        kind, size = parse_bar_spec(spec)
+        unit = size if kind == 'time' else DAY_MS
+        start_ms = end_ms = None
+        if start is not None:
+            start_ms = pd.Timestamp(start).value // 10**6 // unit * unit
+        if end is not None:
+            end_ms = -(-(pd.Timestamp(end).value // 10**6) // unit) * unit
+
+        record = np.dtype([('time', np.int64), ('price', np.float64), ('qty', np.float64),
+                           ('first_trade_id', np.int64), ('last_trade_id', np.int64)])
+        trades = self.store.read_agg_trades(symbol, record, start_ms, end_ms, self.chunk_rows)
+        bars = trades_to_bars({name: trades[name] for name in record.names}, spec)
+        if end is not None:
+            bars = bars[bars['timestamp'] < pd.Timestamp(end)].reset_index(drop=True)
+        return bars.astype({name: self._column_dtype() for name in PRICE_COLUMNS})
+
+    def _kline_record_dtype(self):
+        """Structured dtype one kline_data row is parsed into"""
+        return np.dtype([('timestamp', 'datetime64[ms]')]
+                        + [(name, self._column_dtype()) for name in PRICE_COLUMNS]
+                        + [('trades', np.int64)])
+
+    def _iter_kline_chunks(self, symbol, interval, start=None, end=None, count=False):
+        """
+        Run the kline range query against the store and yield chunks of typed records
+
+        Rows are parsed straight into structured arrays of at most chunk_rows
+        records, so no per-row Python objects outlive a chunk. With count=True
+        the matching row count is yielded first, read from the same snapshot
+        as the rows.
+        """
+        return self.store.iter_chunks(symbol, interval, self._kline_record_dtype(), start, end,
+                                      chunk_rows=self.chunk_rows, count=count)
+
+    def _frame(self, columns):
+        """Wrap typed kline columns in the DataFrame layout returned by _read_klines"""
+        return pd.DataFrame({name: columns[name] for name in ['timestamp'] + PRICE_COLUMNS + ['trades']},
+                            copy=False)
+
+    def iter_klines(self, symbol, interval, start=None, end=None):
+        """
+        Yield stored kline rows in [start, end) as DataFrames of at most chunk_rows
+
+        For processing histories that do not fit in memory one chunk at a time.
+        """
+        for chunk in self._iter_kline_chunks(symbol, interval, start, end):
+            yield self._frame({name: np.ascontiguousarray(chunk[name]) for name in chunk.dtype.names})
+
+    def _query_klines(self, symbol, interval, start=None, end=None):
+        """
+        Read stored kline rows in [start, end) into preallocated typed columns
+
+        The row count is queried first so every chunk is copied straight into
+        its final place; peak memory is the result plus one chunk.
+        """
+        chunks = self._iter_kline_chunks(symbol, interval, start, end, count=True)
+        n = next(chunks)
+        record = self._kline_record_dtype()
+        columns = {name: np.empty(n, dtype=record[name]) for name in record.names}
+
+        filled = 0
+        for chunk in chunks:
+            stop = filled + len(chunk)
+            for name in record.names:
+                columns[name][filled:stop] = chunk[name]
+            filled = stop
+
+        return self._frame(columns)
+
+    def fetch_data_to_dataframe(self, symbol, interval, start=None, end=None, columns=None):
+        """
+        Fetch data from database into a pandas DataFrame
+
+        Rows are read in chunks into preallocated columns of the exporter's
+        dtype (see __init__), so loading never holds the whole result as
+        Python objects.
+
+        Args:
+            symbol: Trading pair symbol
+            interval: Time interval
+            start, end: Optional [start, end) time range
+            columns: Value columns to load; all of them if None
+        """
+        if self.cache is not None:
+            # Pull new rows into the columnar cache (only the pair's version is read
+            # while it is unchanged), then read only what is needed
+            self.cache.sync(symbol, interval, self._read_klines, self._month_versions, self._data_version)
+            df = self.cache.load(symbol, interval, start=start, end=end, columns=columns)
+            if self.dtype is not None:
+                df = df.astype({col: self.dtype for col in df.columns if df[col].dtype.kind == 'f'})
+        else:
+            df = self._read_klines(symbol, interval, start, end).set_index('timestamp')
+            if columns is not None:
+                df = df[list(columns)]
         
         print(f"Loaded {len(df)} records for {symbol} at {interval} interval")
         return df
 
     def add_technical_indicators(self, df):
         """Add technical indicators to the dataframe"""
+        if self.indicator_backend == 'numpy':
+            df = compute_indicators(df, dtype=self._column_dtype())
+            print(f"Added technical indicators. Remaining records after dropna: {len(df)}")
+            return df
+
         df = df.copy()  # Don't modify original
         
         # Moving Averages
@@ -63,8 +291,10 @@ class TFDataExporter:
         df['bb_low'] = bollinger.bollinger_lband()
         df['bb_width'] = bollinger.bollinger_wband()
         
-        # Bollinger Band Position (where price is relative to bands)
+        # Bollinger Band Position (where price is relative to bands); 0/0 over flat windows,
+        # whatever rounding residue pandas' rolling std leaves there
         df['bb_position'] = (df['close'] - df['bb_low']) / (df['bb_high'] - df['bb_low'])
+        df.loc[flat_windows(df['close'].to_numpy(), 20), 'bb_position'] = np.nan
         
         # Volume indicators
         df['volume_sma_20'] = ta.trend.sma_indicator(df['volume'], window=20)
@@ -85,35 +315,68 @@ class TFDataExporter:
         # On-Balance Volume
         df['obv'] = ta.volume.on_balance_volume(df['close'], df['volume'])
         
-        # Drop NaN values that result from indicator calculations
-        df = df.dropna()
+        # Drop NaN values that result from indicator calculations (and any infinities)
+        df = df.replace([np.inf, -np.inf], np.nan).dropna()
+        if self.dtype is not None:
+            # ta computes in float64; apply the dtype policy to the new columns
+            df = df.astype({col: self.dtype for col in df.columns if df[col].dtype.kind == 'f'})
         
         print(f"Added technical indicators. Remaining records after dropna: {len(df)}")
         return df
 
-    def export_to_numpy(self, symbol, interval, sequence_length=60, 
-                       add_indicators=True, feature_columns=None):
+    def _data_version(self, symbol, interval):
         """
-        Export data as numpy arrays ready for TensorFlow
-        
-        Args:
-            symbol: Trading pair symbol
-            interval: Time interval
-            sequence_length: Length of input sequences
-            add_indicators: Whether to add technical indicators
-            feature_columns: List of column names to use as features. 
-                           If None, uses all numeric columns except timestamp
+        (newest timestamp, row count) of the stored rows a pair is built from
+
+        Reads the pair itself, the 1m candles of a derived interval, or the
+        aggregate trades of a bar spec. Any append or backfill changes it.
+        """
+        if is_bar_spec(interval):
+            return self.store.agg_trades_version(symbol)
+        if interval != BASE_INTERVAL and not self._has_klines(symbol, interval):
+            interval = BASE_INTERVAL
+        return self.store.kline_version(symbol, interval)
+
+    def _feature_frame(self, symbol, interval, add_indicators=True):
         """
-        # Fetch data into DataFrame
+        Full feature frame of a pair (klines plus indicators), through the feature cache
+
+        The cache key holds the store, the pair, the indicator set (backend
+        or none), the dtype policy and the data version, so new or backfilled
+        rows produce a fresh entry instead of a stale hit, and exporters
+        sharing a feature_cache_dir never read each other's frames.
+        """
+        indicator_set = self.indicator_backend if add_indicators else None
+        dtype = self.dtype.name if self.dtype is not None else None
+        key = (self.store.identity, symbol, interval, indicator_set, dtype, self._data_version(symbol, interval))
+
+        df = self.feature_cache.get(key)
+        if df is not None:
+            print(f"Reusing cached features for {symbol} at {interval} interval")
+            return df
+
         df = self.fetch_data_to_dataframe(symbol, interval)
-        
         if df.empty:
-            print("No data found!")
-            return None, None
-        
-        # Add technical indicators if requested
+            return df
         if add_indicators:
             df = self.add_technical_indicators(df)
+        self.feature_cache.put(key, df)
+        return df
+
+    def load_features(self, symbol, interval, add_indicators=True, feature_columns=None):
+        """
+        Load a symbol/interval pair and return the DataFrame of selected feature columns
+        
+        The full feature frame comes from the feature cache when the stored
+        data has not changed since it was computed, so repeated exports of a
+        pair skip loading and indicators. Returns None if no data is stored
+        for the pair.
+        """
+        df = self._feature_frame(symbol, interval, add_indicators)
+        
+        if df.empty:
+            print("No data found!")
+            return None
         
         # Select feature columns
         if feature_columns is None:
@@ -124,7 +387,30 @@ class TFDataExporter:
         print(f"Using {len(feature_columns)} features: {feature_columns}")
         
         # Extract features for modeling
-        df_features = df[feature_columns]
+        return df[feature_columns]
+
+    def export_to_numpy(self, symbol, interval, sequence_length=60, 
+                       add_indicators=True, feature_columns=None):
+        """
+        Export data as numpy arrays ready for TensorFlow
+        
+        Args:
+            symbol: Trading pair symbol
+            interval: Time interval
+            sequence_length: Length of input sequences
+            add_indicators: Whether to add technical indicators
+            feature_columns: List of column names to use as features. 
+                           If None, uses all numeric columns except timestamp
+
+        Returns:
+            X: Read-only window view (see create_sequences), float32 unless
+               the dtype policy says otherwise; call np.array(X) only if a
+               writable copy is really needed
+            y: Next close price for each window
+        """
+        df_features = self.load_features(symbol, interval, add_indicators, feature_columns)
+        if df_features is None:
+            return None, None
         
         # Create sequences
         sequences, targets = self.create_sequences(
@@ -135,49 +421,400 @@ class TFDataExporter:
         if sequences is None:
             return None, None
             
-        return np.array(sequences), np.array(targets)
+        return sequences, targets
 
-    def create_sequences(self, df, sequence_length=60):
+    def create_sequences(self, df, sequence_length=60, dtype=None):
         """
         Create sequences from dataframe
         
+        The features are copied once into a contiguous matrix; the returned
+        sequences are a read-only strided view over it, so memory stays
+        O(rows x features) regardless of sequence_length.
+
         Args:
             df: DataFrame with features
             sequence_length: Number of time steps in each sequence
+            dtype: dtype of the underlying feature matrix; defaults to the
+                   exporter's dtype policy (float32 if none is set)
             
         Returns:
-            sequences: Input sequences (X)
-            targets: Target values (y) - next close price
+            sequences: Input sequences (X), shape (n, sequence_length, features)
+            targets: Target values (y) - next close price, shape (n,)
         """
-        data = df.values
-        sequences = []
-        targets = []
-        
-        # Get the index of 'close' column for the target
-        if 'close' in df.columns:
-            close_idx = df.columns.get_loc('close')
-        else:
-            print("Warning: 'close' column not found. Using first column as target.")
-            close_idx = 0
-        
-        for i in range(len(data) - sequence_length):
-            # Input sequence
-            seq = data[i:i + sequence_length]
-            # Target is the next close price
-            target = data[i + sequence_length, close_idx]
-            
-            sequences.append(seq)
-            targets.append(target)
+        close_idx = self._target_index(df.columns)
+        matrix = feature_matrix(df, dtype=self._sequence_dtype(dtype))
+        sequences, targets = sliding_windows(matrix, sequence_length, target_idx=close_idx)
         
         print(f"Created {len(sequences)} sequences of length {sequence_length}")
         return sequences, targets
 
-    def get_feature_names(self, symbol, interval, add_indicators=True):
-        """Helper function to see what features will be used"""
-        df = self.fetch_data_to_dataframe(symbol, interval)
-        if add_indicators:
-            df = self.add_technical_indicators(df)
-        return df.columns.tolist()
+    def _target_index(self, columns):
+        """Get the index of the 'close' column used as the target"""
+        columns = list(columns)
+        if 'close' in columns:
+            return columns.index('close')
+        print("Warning: 'close' column not found. Using first column as target.")
+        return 0
+
+    def _iter_window_batches(self, windows, targets, batch_size, shuffle, rng):
+        """Yield (X, y) mini-batches copied out of a window view"""
+        order = rng.permutation(len(windows)) if shuffle else np.arange(len(windows))
+        for start in range(0, len(order), batch_size):
+            # Sorted indices keep the gather reading the base matrix front to back
+            idx = np.sort(order[start:start + batch_size])
+            yield windows[idx], targets[idx]
+
+    def iter_batches(self, symbol, interval, sequence_length=60, batch_size=256,
+                     shuffle=True, seed=None, add_indicators=True, feature_columns=None,
+                     dtype=None):
+        """
+        Yield (X, y) mini-batches of windows for a symbol/interval pair
+        
+        Only the base feature matrix is held in memory; each batch is gathered
+        from the strided window view, so memory beyond the base matrix is
+        bounded by batch_size. Usable with tf.data.Dataset.from_generator.
+
+        Args:
+            symbol: Trading pair symbol
+            interval: Time interval
+            sequence_length: Length of input sequences
+            batch_size: Number of windows per batch
+            shuffle: Whether to visit the windows in random order
+            seed: Seed for the shuffle
+            add_indicators: Whether to add technical indicators
+            feature_columns: List of column names to use as features
+            dtype: dtype of the feature matrix; defaults to the dtype policy
+        """
+        df_features = self.load_features(symbol, interval, add_indicators, feature_columns)
+        if df_features is None:
+            return
+
+        matrix = feature_matrix(df_features, dtype=self._sequence_dtype(dtype))
+        windows, targets = sliding_windows(matrix, sequence_length, self._target_index(df_features.columns))
+        yield from self._iter_window_batches(windows, targets, batch_size, shuffle, np.random.default_rng(seed))
+
+    def prepare_dataset(self, symbol, interval, sequence_length=60, normalization='zscore', n_folds=5,
+                        val_windows=None, test_windows=None, train_windows=None, add_indicators=True,
+                        feature_columns=None, dtype=None):
+        """
+        Build normalised walk-forward train/validation/test splits over the window view
+
+        The features are copied once into the base matrix, as in
+        export_to_numpy. Normalisation statistics of every fold are then
+        fitted on that fold's training rows only, all folds together in one
+        streaming pass over the matrix (see datasetPrep.range_moments), so
+        nothing after a fold's training span leaks into its scaling. Splits
+        are WindowViews over slices of the window view: no window is copied
+        or scaled until a batch is gathered from them.
+
+        Args:
+            symbol: Trading pair symbol
+            interval: Time interval
+            sequence_length: Length of input sequences
+            normalization: 'zscore', 'relative' or None (see datasetPrep.WindowView)
+            n_folds, val_windows, test_windows, train_windows: Walk-forward
+                layout (see datasetPrep.walk_forward_splits)
+            add_indicators: Whether to add technical indicators
+            feature_columns: List of column names to use as features
+            dtype: dtype of the feature matrix; defaults to the dtype policy
+
+        Returns:
+            List of folds, oldest first, each a dict with 'train', 'val' and
+            'test' WindowViews; None if there is no data
+        """
+        df_features = self.load_features(symbol, interval, add_indicators, feature_columns)
+        if df_features is None:
+            return None
+
+        columns = list(df_features.columns)
+        target_idx = self._target_index(columns)
+        matrix = feature_matrix(df_features, dtype=self._sequence_dtype(dtype))
+        windows, targets = sliding_windows(matrix, sequence_length, target_idx)
+        folds = walk_forward_splits(len(windows), sequence_length, n_folds, val_windows, test_windows, train_windows)
+
+        # A fold trains on the rows of its training windows and their targets
+        train_rows = [(fold['train'].start, fold['train'].stop + sequence_length) for fold in folds]
+        moments = range_moments(matrix, train_rows) if normalization is not None else [(None, None)] * len(folds)
+        relative_idx = [i for i, name in enumerate(columns) if name in PRICE_LEVEL_COLUMNS]
+
+        prepared = []
+        for fold, (mean, std) in zip(folds, moments):
+            prepared.append({
+                part: WindowView(windows[span], targets[span], target_idx, normalization, mean, std, relative_idx)
+                for part, span in fold.items()
+            })
+            print(f"Fold {len(prepared) - 1}: train {fold['train'].start}-{fold['train'].stop}, "
+                  f"val {fold['val'].start}-{fold['val'].stop}, test {fold['test'].start}-{fold['test'].stop}")
+        return prepared
+
+    def export_shards(self, symbol, interval, output_dir, rows_per_shard=100000,
+                      sequence_length=60, add_indicators=True, feature_columns=None,
+                      dtype=None):
+        """
+        Write the base feature matrix to a directory of memory-mappable .npy shards
+        
+        Each shard holds rows_per_shard rows plus the sequence_length rows that
+        follow it, so every window (and its target) lies entirely inside one shard
+        and no window is repeated. A manifest.json describes the layout.
+
+        Args:
+            symbol: Trading pair symbol
+            interval: Time interval
+            output_dir: Directory to write shards and manifest to
+            rows_per_shard: Number of windows each shard provides
+            sequence_length: Length of input sequences the shards are cut for
+            add_indicators: Whether to add technical indicators
+            feature_columns: List of column names to use as features
+            dtype: dtype of the stored matrix; defaults to the dtype policy
+
+        Returns:
+            Path to the manifest, or None if there is no data
+        """
+        df_features = self.load_features(symbol, interval, add_indicators, feature_columns)
+        if df_features is None:
+            return None
+
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        matrix = feature_matrix(df_features, dtype=self._sequence_dtype(dtype))
+        n_windows = max(len(matrix) - sequence_length, 0)
+        shards = []
+        for shard_idx, (start, stop) in enumerate(_shard_slices(len(matrix), rows_per_shard, sequence_length)):
+            name = f"shard_{shard_idx:05d}.npy"
+            shard = np.lib.format.open_memmap(output_dir / name, mode='w+', dtype=matrix.dtype,
+                                              shape=(stop - start, matrix.shape[1]))
+            shard[:] = matrix[start:stop]
+            shard.flush()
+            del shard
+            shards.append({'file': name, 'rows': stop - start, 'windows': stop - start - sequence_length})
+
+        manifest = {
+            'symbol': symbol,
+            'interval': interval,
+            'features': list(df_features.columns),
+            'target_index': self._target_index(df_features.columns),
+            'sequence_length': sequence_length,
+            'dtype': matrix.dtype.name,
+            'shards': shards,
+        }
+        manifest_path = output_dir / 'manifest.json'
+        manifest_path.write_text(json.dumps(manifest, indent=2))
+
+        print(f"Wrote {len(shards)} shards with {n_windows} windows to {output_dir}")
+        return manifest_path
+
+    def iter_shard_batches(self, shard_dir, batch_size=256, shuffle=True, seed=None):
+        """
+        Yield (X, y) mini-batches lazily from a directory written by export_shards
+        
+        Shards are opened memory-mapped and windowed in place, one at a time.
+        With shuffle, shard order and window order within each shard are
+        randomised; memory use is bounded by batch_size.
+        """
+        shard_dir = Path(shard_dir)
+        manifest = json.loads((shard_dir / 'manifest.json').read_text())
+        rng = np.random.default_rng(seed)
+
+        shards = manifest['shards']
+        order = rng.permutation(len(shards)) if shuffle else range(len(shards))
+        for shard_idx in order:
+            matrix = np.load(shard_dir / shards[shard_idx]['file'], mmap_mode='r')
+            windows, targets = sliding_windows(matrix, manifest['sequence_length'], manifest['target_index'])
+            yield from self._iter_window_batches(windows, targets, batch_size, shuffle, rng)
+
+    def shard_dataset(self, shard_dir, batch_size=256, shuffle=True, seed=None):
+        """
+        Wrap iter_shard_batches in a tf.data.Dataset
+        
+        TensorFlow is imported lazily so the rest of the exporter works without it.
+        """
+        import tensorflow as tf
+
+        manifest = json.loads((Path(shard_dir) / 'manifest.json').read_text())
+        dtype = tf.as_dtype(manifest['dtype'])
+        signature = (
+            tf.TensorSpec(shape=(None, manifest['sequence_length'], len(manifest['features'])), dtype=dtype),
+            tf.TensorSpec(shape=(None,), dtype=dtype),
+        )
+        return tf.data.Dataset.from_generator(
+            lambda: self.iter_shard_batches(shard_dir, batch_size, shuffle, seed),
+            output_signature=signature,
+        )
+
+    def _write_shard(self, path, block, file_format):
+        """
+        Write one block of feature rows as a compressed .npz or a GZIP TFRecord
+
+        A TFRecord shard holds one tf.train.Example with the raw matrix bytes
+        and its shape. TensorFlow is imported only for that format.
+        """
+        if file_format == 'npz':
+            np.savez_compressed(path, features=block)
+            return
+
+        import tensorflow as tf
+
+        example = tf.train.Example(features=tf.train.Features(feature={
+            'features': tf.train.Feature(bytes_list=tf.train.BytesList(value=[np.ascontiguousarray(block).tobytes()])),
+            'shape': tf.train.Feature(int64_list=tf.train.Int64List(value=list(block.shape))),
+        }))
+        with tf.io.TFRecordWriter(str(path), options='GZIP') as writer:
+            writer.write(example.SerializeToString())
+
+    def _read_shard(self, path, file_format, dtype):
+        """Load the feature rows of a shard written by _write_shard"""
+        if file_format == 'npz':
+            with np.load(path) as shard:
+                return shard['features']
+
+        import tensorflow as tf
+
+        for record in tf.data.TFRecordDataset(str(path), compression_type='GZIP'):
+            features = tf.train.Example.FromString(record.numpy()).features.feature
+            shape = tuple(features['shape'].int64_list.value)
+            return np.frombuffer(features['features'].bytes_list.value[0], dtype=dtype).reshape(shape)
+
+    def _write_pair_shards(self, symbol, interval, output_dir, file_format, rows_per_shard,
+                           sequence_length, add_indicators, feature_columns, dtype):
+        """Load, add indicators, and write one pair's shards; returns its manifest entry"""
+        entry = {'symbol': symbol, 'interval': interval, 'rows': 0, 'windows': 0, 'shards': []}
+        df_features = self.load_features(symbol, interval, add_indicators, feature_columns)
+        if df_features is None:
+            return entry
+
+        matrix = feature_matrix(df_features, dtype=dtype)
+        entry['features'] = list(df_features.columns)
+        entry['target_index'] = self._target_index(df_features.columns)
+        entry['rows'] = len(matrix)
+        del df_features
+
+        for shard_idx, (start, stop) in enumerate(_shard_slices(len(matrix), rows_per_shard, sequence_length)):
+            name = f"{symbol}_{interval}_{shard_idx:05d}{CORPUS_FORMATS[file_format]}"
+            self._write_shard(Path(output_dir) / name, matrix[start:stop], file_format)
+            entry['shards'].append({'file': name, 'rows': stop - start, 'windows': stop - start - sequence_length})
+        entry['windows'] = sum(shard['windows'] for shard in entry['shards'])
+        return entry
+
+    def export_corpus(self, pairs, output_dir, file_format='npz', rows_per_shard=100000,
+                      sequence_length=60, add_indicators=True, feature_columns=None,
+                      dtype=None, max_workers=None):
+        """
+        Export many symbol/interval pairs into one sharded training corpus in parallel
+
+        Each pair is loaded, given indicators and cut into shards in its own
+        worker process (a fresh exporter with this one's settings), so the
+        CPU-bound work scales with the number of cores. Shards are laid out
+        as in export_shards but written as compressed .npz or GZIP TFRecord
+        files; manifest.json lists every pair's shards, row and window counts
+        and the shared feature names, plus the pairs skipped for having no
+        data or too few rows for a window, and the pairs that failed.
+
+        Args:
+            pairs: Iterable of (symbol, interval) tuples
+            output_dir: Directory to write shards and manifest to
+            file_format: 'npz' or 'tfrecord' (needs TensorFlow)
+            rows_per_shard: Number of windows each shard provides
+            sequence_length: Length of input sequences the shards are cut for
+            add_indicators: Whether to add technical indicators
+            feature_columns: List of column names to use as features
+            dtype: dtype of the stored matrices; defaults to the dtype policy
+            max_workers: Worker processes; defaults to the number of CPUs
+
+        Returns:
+            Path to the manifest
+        """
+        if file_format not in CORPUS_FORMATS:
+            raise ValueError(f"Unknown corpus format: {file_format}")
+        pairs = list(pairs)
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        dtype = np.dtype(self._sequence_dtype(dtype))
+
+        entries, failed = {}, []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_export_pair, self._settings(), symbol, interval, output_dir, file_format,
+                                rows_per_shard, sequence_length, add_indicators, feature_columns, dtype):
+                (symbol, interval)
+                for symbol, interval in pairs
+            }
+            for future, pair in futures.items():
+                try:
+                    entries[pair] = future.result()
+                except Exception as e:
+                    print(f"Error exporting {pair[0]} ({pair[1]}): {e}")
+                    failed.append({'symbol': pair[0], 'interval': pair[1], 'error': str(e)})
+
+        # Every pair must share the feature layout of the first non-empty one
+        features = next((entries[pair]['features'] for pair in pairs
+                         if pair in entries and entries[pair]['rows']), None)
+        exported, skipped = [], []
+        for pair in pairs:
+            if pair not in entries:
+                continue
+            entry = entries[pair]
+            entry_features = entry.pop('features', None)
+            entry.pop('target_index', None)
+            if entry['rows'] and entry_features != features:
+                print(f"Skipping {entry['symbol']} ({entry['interval']}): features differ from the corpus")
+                failed.append({'symbol': entry['symbol'], 'interval': entry['interval'], 'error': 'feature mismatch'})
+            elif not entry['shards']:
+                reason = 'no data' if not entry['rows'] else f"{entry['rows']} rows are too few for one window"
+                print(f"Skipping {entry['symbol']} ({entry['interval']}): {reason}")
+                skipped.append({'symbol': entry['symbol'], 'interval': entry['interval'],
+                                'rows': entry['rows'], 'reason': reason})
+            else:
+                exported.append(entry)
+
+        manifest = {
+            'format': file_format,
+            'features': features,
+            'target_index': self._target_index(features) if features else None,
+            'sequence_length': sequence_length,
+            'dtype': dtype.name,
+            'rows': sum(entry['rows'] for entry in exported),
+            'windows': sum(entry['windows'] for entry in exported),
+            'pairs': exported,
+            'skipped': skipped,
+            'failed': failed,
+        }
+        manifest_path = output_dir / 'manifest.json'
+        manifest_path.write_text(json.dumps(manifest, indent=2))
+
+        print(f"Exported {manifest['windows']} windows from {len(exported)} pairs "
+              f"({len(skipped)} skipped, {len(failed)} failed) to {output_dir}")
+        return manifest_path
+
+    def iter_corpus_batches(self, corpus_dir, batch_size=256, shuffle=True, seed=None):
+        """
+        Yield (X, y) mini-batches from a corpus written by export_corpus
+
+        Shards are loaded one at a time and windowed in place; with shuffle,
+        shard order across all pairs and window order within a shard are
+        randomised.
+        """
+        corpus_dir = Path(corpus_dir)
+        manifest = json.loads((corpus_dir / 'manifest.json').read_text())
+        rng = np.random.default_rng(seed)
+
+        shards = [shard['file'] for entry in manifest['pairs'] for shard in entry['shards']]
+        order = rng.permutation(len(shards)) if shuffle else range(len(shards))
+        for shard_idx in order:
+            matrix = self._read_shard(corpus_dir / shards[shard_idx], manifest['format'], manifest['dtype'])
+            windows, targets = sliding_windows(matrix, manifest['sequence_length'], manifest['target_index'])
+            yield from self._iter_window_batches(windows, targets, batch_size, shuffle, rng)
+
+    @staticmethod
+    def get_feature_names(symbol=None, interval=None, add_indicators=True):
+        """
+        Feature columns load_features returns by default, in order
+
+        Answered from the static column lists, without reading any data;
+        symbol and interval are accepted for compatibility and ignored, as
+        every pair has the same columns.
+        """
+        return BASE_COLUMNS + (INDICATOR_COLUMNS if add_indicators else [])
 
 
 # Example usage:
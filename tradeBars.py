@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+from utils import interval_to_minutes
+
+
+# Bar kinds built from aggregated trades
+BAR_KINDS = ('time', 'volume', 'tick')
+
+DAY_MS = 86400000
+
+
+def parse_bar_spec(spec):
+    """
+    Split a bar spec such as 'time:1m', 'volume:25.5' or 'tick:1000' into (kind, size)
+
+    Returns:
+        (kind, size) with size in ms for time bars, base-asset quantity for
+        volume bars and number of trades for tick bars
+    """
+    kind, _, size = spec.partition(':')
+    if kind not in BAR_KINDS or not size:
+        raise ValueError(f"Invalid bar spec {spec!r}; expected one of "
+                         + ", ".join(f"'{k}:<size>'" for k in BAR_KINDS))
+    if kind == 'time':
+        return kind, interval_to_minutes(size) * 60000
+    if kind == 'tick':
+        return kind, int(size)
+    return kind, float(size)
+
+
+def is_bar_spec(interval):
+    """Whether an interval argument names trade bars rather than stored klines"""
+    return ':' in interval
+
+
+def bar_ids(trades, spec):
+    """
+    Bar number of every trade, non-decreasing in time
+
+    Time bars are aligned to the epoch like klines. Volume and tick bars
+    restart at every UTC midnight, so a bar never depends on trades before
+    the start of its day; loading any day-aligned range gives the same bars
+    as loading the whole history.
+    """
+    kind, size = parse_bar_spec(spec)
+    time = trades['time']
+    if kind == 'time':
+        return time // size
+
+    day = time // DAY_MS
+    if kind == 'volume':
+        amount = trades['qty']
+    else:
+        # An aggregated trade stands for every trade id it covers
+        amount = trades['last_trade_id'] - trades['first_trade_id'] + 1
+    cumulative = np.cumsum(amount)
+
+    # Restart the running total at each new day
+    day_starts = np.flatnonzero(np.diff(day, prepend=day[0] - 1))
+    before_day = np.repeat(cumulative[day_starts] - amount[day_starts],
+                           np.diff(np.append(day_starts, len(day))))
+    within_day = cumulative - before_day
+    # A bar closes on the trade that reaches the threshold
+    bar_in_day = np.ceil(within_day / size).astype(np.int64) - 1
+    return (day << 32) + np.maximum(bar_in_day, 0)
+
+
+def trades_to_bars(trades, spec):
+    """
+    Aggregate trades into kline-compatible bars with segmented NumPy reductions
+
+    Args:
+        trades: dict or DataFrame with time (ms), price, qty, first_trade_id and
+                last_trade_id columns, sorted by time
+        spec: bar spec, see parse_bar_spec
+
+    Returns:
+        DataFrame with timestamp (open time of the bar: the bucket start for
+        time bars, the first trade otherwise), open, high, low, close, volume,
+        quote_volume and trades
+    """
+    time = np.asarray(trades['time'], dtype=np.int64)
+    if not len(time):
+        return pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume',
+                                     'quote_volume', 'trades'])
+
+    columns = {
+        'time': time,
+        'qty': np.asarray(trades['qty'], dtype=np.float64),
+        'first_trade_id': np.asarray(trades['first_trade_id'], dtype=np.int64),
+        'last_trade_id': np.asarray(trades['last_trade_id'], dtype=np.int64),
+    }
+    price = np.asarray(trades['price'], dtype=np.float64)
+    ids = bar_ids(columns, spec)
+
+    starts = np.flatnonzero(np.diff(ids, prepend=ids[0] - 1))
+    ends = np.append(starts[1:], len(ids)) - 1
+
+    kind, size = parse_bar_spec(spec)
+    open_time = ids[starts] * size if kind == 'time' else time[starts]
+    return pd.DataFrame({
+        'timestamp': open_time.astype('datetime64[ms]'),
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends],
+        'volume': np.add.reduceat(columns['qty'], starts),
+        'quote_volume': np.add.reduceat(price * columns['qty'], starts),
+        'trades': np.add.reduceat(columns['last_trade_id'] - columns['first_trade_id'] + 1, starts),
+    })
@@ -0,0 +1,221 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pandas as pd
+import metrics
+from binanceClient import parse_agg_trades, AGG_TRADE_FIELDS
+from rateLimiter import REQUEST_WEIGHTS
+
+
+# agg_trades columns besides symbol, in storage order
+TRADE_COLUMNS = [name for name, _ in AGG_TRADE_FIELDS.values()]
+
+HOUR_MS = 3600000
+
+
+class AggTradeCollector:
+    """
+    Backfills the full /aggTrades history of symbols into the agg_trades table
+
+    Pages are walked forward with the fromId cursor from the last stored
+    aggregate trade id, so an interrupted backfill resumes where it stopped.
+    Each symbol runs in its own worker thread behind the collector's shared
+    rate limiter, and pages are bulk-loaded with COPY into a compact typed
+    table (bigint ids and ms times, double prices, boolean maker flag).
+    """
+
+    def __init__(self, collector, page_size=1000):
+        """
+        Parameters:
+        - collector: CryptoDataCollector providing the HTTP client, pool and shutdown flag
+        - page_size: int, trades per request (max 1000)
+        """
+        self.collector = collector
+        self.page_size = page_size
+
+    def ensure_tables(self):
+        """Create the agg_trades table if it does not exist"""
+        with self.collector._transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS agg_trades (
+                    symbol text NOT NULL,
+                    agg_id bigint NOT NULL,
+                    price double precision NOT NULL,
+                    qty double precision NOT NULL,
+                    first_trade_id bigint NOT NULL,
+                    last_trade_id bigint NOT NULL,
+                    time bigint NOT NULL,
+                    is_buyer_maker boolean NOT NULL,
+                    PRIMARY KEY (symbol, agg_id)
+                )
+            ''')
+
+    def get_agg_trades(self, symbol, from_id=None, start_time=None, end_time=None, limit=None):
+        """
+        Fetch one page of aggregate trades
+
+        Parameters:
+        - symbol: str, trading pair (e.g., 'BTCUSDT')
+        - from_id: int, first aggregate trade id to return (optional)
+        - start_time, end_time: int, ms time window of at most one hour (optional)
+        - limit: int, trades to return instead of page_size (optional)
+
+        Returns:
+            dict of typed columns (see parse_agg_trades)
+        """
+        params = {'symbol': symbol.upper(), 'limit': limit or self.page_size}
+        if from_id is not None:
+            params['fromId'] = from_id
+        if start_time is not None:
+            params['startTime'] = start_time
+        if end_time is not None:
+            params['endTime'] = end_time
+
+        response = self.collector.client.get('aggTrades', params, REQUEST_WEIGHTS['aggTrades'])
+        trades = parse_agg_trades(response.json())
+        metrics.TRADES_PARSED.inc(len(trades['agg_id']), symbol=params['symbol'])
+        return trades
+
+    def last_agg_id(self, symbol):
+        """Highest stored aggregate trade id for a symbol, or None"""
+        with self.collector._transaction() as cursor:
+            cursor.execute("SELECT max(agg_id) FROM agg_trades WHERE symbol = %s", (symbol,))
+            return cursor.fetchone()[0]
+
+    def _first_id_after(self, symbol, start_time):
+        """Id of the single trade /aggTrades returns for startTime=start_time, or None"""
+        trades = self.get_agg_trades(symbol, start_time=start_time, limit=1)
+        return int(trades['agg_id'][0]) if len(trades['agg_id']) else None
+
+    def _first_id_at(self, symbol, start_time):
+        """
+        Id of the first aggregate trade at or after start_time (ms)
+
+        A lone startTime with limit=1 returns the first trade from that time
+        on. Should that come back empty (a server may only look an hour
+        ahead), the first hourly kline with trades is looked up instead,
+        1000 hours per /klines request, and only its hour is searched, so a
+        quiet stretch is not stepped over one hour per request. Returns None
+        if there is no trade between start_time and now.
+        """
+        found = self._first_id_after(symbol, start_time)
+        if found is not None:
+            return found
+
+        now = int(time.time() * 1000)
+        while start_time < now and self.collector.is_running:
+            klines = self.collector.get_klines(symbol, '1h', start_time=start_time)
+            if klines is None or klines.empty:
+                return None
+            active = klines['timestamp'][klines['trades'] > 0]
+            if len(active):
+                open_time = int(active.iloc[0].value // 10**6)
+                trades = self.get_agg_trades(symbol, start_time=max(open_time, start_time),
+                                             end_time=open_time + HOUR_MS - 1, limit=1)
+                if len(trades['agg_id']):
+                    return int(trades['agg_id'][0])
+                start_time = open_time + HOUR_MS
+            else:
+                start_time = int(klines['timestamp'].iloc[-1].value // 10**6) + HOUR_MS
+        return None
+
+    def store_trades(self, symbol, trades):
+        """
+        Bulk-insert a page of typed trade columns with COPY
+
+        Trades already stored (same symbol and agg_id) are skipped, so
+        overlapping pages are harmless.
+        """
+        n = len(trades['agg_id'])
+        if not n:
+            return
+
+        buffer = io.StringIO()
+        pd.DataFrame({'symbol': symbol, **trades}).to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+
+        columns = ','.join(['symbol'] + TRADE_COLUMNS)
+        with self.collector._transaction(symbol=symbol, interval='aggTrades') as cursor:
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS agg_trade_staging
+                    (LIKE agg_trades INCLUDING DEFAULTS)
+                ON COMMIT DELETE ROWS
+            ''')
+            cursor.copy_expert(f"COPY agg_trade_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f'''
+                INSERT INTO agg_trades ({columns})
+                SELECT {columns} FROM agg_trade_staging
+                ON CONFLICT (symbol, agg_id) DO NOTHING
+            ''')
+        metrics.TRADES_INSERTED.inc(n, symbol=symbol)
+
+    def backfill(self, symbol, start_date=None, sleep_time=10):
+        """
+        Page through a symbol's aggregate trades until caught up with the present
+
+        Parameters:
+        - symbol: str, trading pair (e.g., 'BTCUSDT')
+        - start_date: str 'YYYY-MM-DD', where to start if nothing is stored yet
+          (defaults to 24 hours ago)
+        - sleep_time: int, seconds to back off after an error
+
+        Returns:
+            Number of trades stored
+        """
+        symbol = symbol.upper()
+        last_id = self.last_agg_id(symbol)
+        if last_id is not None:
+            from_id = last_id + 1
+            print(f"Continuing {symbol} aggTrades from id {from_id}")
+        else:
+            start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else datetime.now() - timedelta(days=1)
+            from_id = self._first_id_at(symbol, int(start.timestamp() * 1000))
+            if from_id is None:
+                print(f"No aggTrades for {symbol} since {start}")
+                return 0
+            print(f"Starting {symbol} aggTrades from {start} (id {from_id})")
+
+        stored = 0
+        while self.collector.is_running:
+            try:
+                trades = self.get_agg_trades(symbol, from_id=from_id)
+                n = len(trades['agg_id'])
+                self.store_trades(symbol, trades)
+            except Exception as e:
+                self.collector._record_error('agg_trades', e, symbol, 'aggTrades', from_id=from_id)
+                if self.collector.is_running:
+                    time.sleep(sleep_time)
+                continue
+
+            stored += n
+            if n:
+                from_id = int(trades['agg_id'][-1]) + 1
+                print(f"{datetime.now()}: Stored {n} aggTrades for {symbol} "
+                      f"up to {pd.Timestamp(int(trades['time'][-1]), unit='ms')}")
+            if n < self.page_size:
+                break
+
+        print(f"aggTrades backfill finished for {symbol}: {stored} trades stored")
+        return stored
+
+    def backfill_many(self, symbols, start_date=None, max_workers=8):
+        """
+        Backfill several symbols concurrently, one worker thread per symbol
+
+        Returns:
+            dict mapping symbol to the number of trades stored
+        """
+        self.ensure_tables()
+        symbols = [symbol.upper() for symbol in symbols]
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.backfill, symbol, start_date): symbol for symbol in symbols}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    results[symbol] = future.result()
+                except Exception as e:
+                    self.collector._record_error('agg_trades', e, symbol, 'aggTrades')
+                    results[symbol] = 0
+        return results
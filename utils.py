@@ -1,25 +1,69 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# Rows copied per block when filling a feature matrix column by column
+FILL_ROWS = 1 << 14
+
+
+def feature_matrix(df, columns=None, dtype=np.float32):
+    """
+    Copy the selected DataFrame columns into one C-contiguous (rows x features) matrix
+
+    This is the only copy the windowing path makes; every window is a view into it.
+    Columns are written straight into the preallocated matrix, a block of
+    rows at a time to stay cache friendly, so no intermediate full-size
+    array is built.
+    """
+    if columns is None:
+        columns = list(df.columns)
+    arrays = [df[column].to_numpy() for column in columns]
+    matrix = np.empty((len(df), len(columns)), dtype=dtype)
+    for start in range(0, len(df), FILL_ROWS):
+        stop = start + FILL_ROWS
+        for i, values in enumerate(arrays):
+            matrix[start:stop, i] = values[start:stop]
+    return matrix
+
+
+def sliding_windows(matrix, sequence_length, target_idx=None):
+    """
+    Build zero-copy input windows and aligned targets over a feature matrix
+
+    Args:
+        matrix: 2D array (rows x features)
+        sequence_length: Number of time steps in each window
+        target_idx: Column holding the target; None returns no targets
+
+    Returns:
+        windows: Read-only strided view of shape (n, sequence_length, features)
+                 where n = rows - sequence_length
+        targets: View of shape (n,) with the target column of the row following
+                 each window (None if target_idx is None)
+    """
+    n_windows = len(matrix) - sequence_length
+    if n_windows <= 0:
+        windows = np.empty((0, sequence_length, matrix.shape[1]), dtype=matrix.dtype)
+        targets = np.empty(0, dtype=matrix.dtype) if target_idx is not None else None
+        return windows, targets
+
+    # sliding_window_view appends the window axis last; swap it in front of the
+    # features so each window reads as (time, features). Both steps are views.
+    windows = sliding_window_view(matrix[:-1], sequence_length, axis=0).swapaxes(1, 2)
+
+    targets = matrix[sequence_length:, target_idx] if target_idx is not None else None
+    return windows, targets
+
+
 def create_sequences(df, sequence_length=60):
     """Create sequences for time series prediction"""
-    sequences = []
-    targets = []
-    
     # Use relevant features
     features = ['open', 'high', 'low', 'close', 'volume', 'quote_volume']
-    
-    # Create sequences only if we have enough data
-    if len(df) <= sequence_length:
-        return sequences, targets
-        
-    for i in range(len(df) - sequence_length):
-        # Create sequence
-        sequence = df[features].iloc[i:(i + sequence_length)].values
-        # Target could be next closing price
-        target = df['close'].iloc[i + sequence_length]
-        
-        sequences.append(sequence)
-        targets.append(target)
-    
-    return sequences, targets
+
+    # Target is the next closing price
+    matrix = feature_matrix(df, features)
+    return sliding_windows(matrix, sequence_length, target_idx=features.index('close'))
 
 
 def interval_to_minutes(interval):
@@ -27,4 +71,9 @@ def interval_to_minutes(interval):
         units = {'m': 1, 'h': 60, 'd': 1440, 'w': 10080, 'M': 43200}
         unit = interval[-1]
         number = int(interval[:-1])
-        return number * units[unit]
\ No newline at end of file
+        return number * units[unit]
+
+
+def naive_utc(value):
+    """pd.Timestamp in naive UTC from a timestamptz value (zone-aware) or a naive UTC one"""
+    return pd.to_datetime(value, utc=True).tz_localize(None)